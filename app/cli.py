@@ -0,0 +1,111 @@
+"""
+Command line interface for ingesting a directory of PDF files offline.
+
+Every PDF file in the directory and its subdirectories is stored like an
+upload, so files already known to the application (by their content hash)
+are skipped without being parsed. The new documents are then parsed and
+embedded over a process pool, while the vector store is written by this
+process only, or are queued to the bulk ingestion lane of the celery workers.
+
+Usage:
+    python -m app.cli /path/to/archive --workers 8
+    python -m app.cli /path/to/archive --queue
+"""
+
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app.config import app_config
+from app.models import BulkUploadResult, BulkUploadStatus, IngestionLane, IngestionState
+from app.services.document_service import store_multiple_documents
+from app.services.status_service import set_progress, set_state
+from app.tasks import embed_pdf, start_ingestion, store_pdf
+from app.utils import init_dirs
+from app.utils.logger import logger
+
+
+def ingest(documents: list[BulkUploadResult], workers: int) -> list[str]:
+    """Parses and embeds stored documents over a process pool, saving each
+    one to the vector store as soon as it is embedded.
+
+    Args:
+        documents (list[BulkUploadResult]): The stored documents.
+        workers (int): Number of processes.
+
+    Returns:
+        list[str]: The IDs of the documents that could not be ingested.
+    """
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(embed_pdf, document.pdf_id): document
+            for document in documents
+        }
+        for future in as_completed(futures):
+            document = futures[future]
+            try:
+                store_pdf(document.pdf_id, *future.result())
+                print(f"ready      {document.pdf_id}  {document.filename}")
+            except Exception as e:
+                logger.exception(e)
+                failed.append(document.pdf_id)
+                print(f"failed     {document.pdf_id}  {document.filename}: {e}")
+    return failed
+
+
+def enqueue(documents: list[BulkUploadResult]) -> None:
+    """Queues stored documents to the bulk lane of the celery workers.
+
+    Args:
+        documents (list[BulkUploadResult]): The stored documents.
+    """
+    for document in documents:
+        set_state(document.pdf_id, IngestionState.QUEUED)
+        task = start_ingestion(document.pdf_id, IngestionLane.BULK)
+        set_progress(document.pdf_id, task_id=task.id, lane=IngestionLane.BULK.value)
+        print(f"queued     {document.pdf_id}  {document.filename}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("directory", type=str, help="directory of PDF files")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=app_config.bulk_ingestion_workers,
+        help="number of processes storing, parsing and embedding the files",
+    )
+    parser.add_argument(
+        "--queue",
+        action="store_true",
+        help="queue the documents to the celery workers instead of ingesting them",
+    )
+    args = parser.parse_args()
+
+    init_dirs(app_config.vectorstore_path, app_config.tmp_path, app_config.pdf_path)
+
+    results = store_multiple_documents(args.directory, max_workers=args.workers)
+    stored = [r for r in results if r.status == BulkUploadStatus.STORED]
+    for result in results:
+        if result.status == BulkUploadStatus.DUPLICATE:
+            print(f"duplicate  {result.pdf_id}  {result.filename}")
+        elif result.status == BulkUploadStatus.REJECTED:
+            print(f"rejected   {result.filename}: {result.error}")
+
+    failed = []
+    if args.queue:
+        enqueue(stored)
+    elif stored:
+        failed = ingest(stored, args.workers)
+
+    counts = {status.value: 0 for status in BulkUploadStatus}
+    for result in results:
+        counts[result.status.value] += 1
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
+    if failed:
+        print(f"{len(failed)} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -70,7 +70,16 @@ class AppConfig(_ReadOnlySettings):
         allowed_origins (list[str]): List of allowed origins for CORS.
         max_file_size (int): Maximum allowed file size in bytes.
         max_filename_length (int): Maximum length for filenames.
+        upload_chunk_size (int): Size of the chunks uploads are streamed to disk
+            and hashed in, bounding the memory used per upload.
+        max_bulk_files (int): Maximum number of PDF files accepted by a single
+            bulk upload, counting the files inside zip archives.
+        max_bulk_upload_size (int): Maximum size of a zip archive in a bulk upload
+            in bytes. Every PDF inside it is still limited by `max_file_size`.
+        bulk_ingestion_workers (int): Number of processes used to store and
+            ingest the files of a directory with the bulk ingestion CLI.
         message_character_limit (int): Character limit for messages.
+        max_chat_documents (int): Maximum number of documents in a multi-document chat.
         api_version (str): API version string.
         loguru_rotation (str): Rotation setting for log files, determining at
             which size the logs will be split.
@@ -81,6 +90,118 @@ class AppConfig(_ReadOnlySettings):
         cache_expiry (int): Redis cache expiry time. Caches are elongated each
             time a cache hit occurs, allowing more frequently accessed data
             to be stored on the database longer.
+        qa_semantic_cache_enabled (bool): Answer queries from the cached answer of
+            a similar past query of the same document when there is no exact match.
+        qa_semantic_cache_threshold (float): Minimum cosine similarity of the query
+            embeddings for a semantic QA cache hit.
+        qa_semantic_cache_size (int): Maximum number of past queries kept in the
+            semantic index of a document, the oldest are dropped first.
+        qa_semantic_cache_sample_rate (float): Fraction of the semantic hits sampled
+            for review of false hits.
+        qa_semantic_cache_samples (int): Number of recent sampled semantic hits kept.
+        qa_local_cache_size (int): Maximum number of answers kept in the in-process
+            cache of each worker in front of Redis. 0 disables the in-process cache.
+        qa_local_cache_ttl (int): Time to live of an answer in the in-process cache
+            in seconds. Bounds how long a worker may serve an answer invalidated
+            while its invalidation message was missed.
+        history_max_turns (int): Maximum number of most recent turns of a chat
+            passed verbatim to the LLM.
+        history_token_budget (int): Maximum estimated number of tokens of the
+            turns passed verbatim to the LLM. Older turns are dropped first.
+        history_summary_enabled (bool): Replace the turns which no longer fit the
+            verbatim history with a rolling summary, refreshed in the background.
+        history_summary_max_words (int): Length limit of the rolling summary
+            given to the LLM writing it.
+        query_rewrite_mode (str): When the question is rewritten into a standalone
+            question from the chat history before retrieval, "always" on every
+            turn, or "adaptive" to skip the rewrite on the first turn and for
+            questions which are clearly standalone, and otherwise retrieve with
+            the raw question while the rewrite runs.
+        query_rewrite_min_terms (int): Minimum number of content words of a
+            question without words referring to earlier turns (e.g. "it",
+            "that") to consider it standalone.
+        query_rewrite_min_overlap (float): Minimum overlap of the content words
+            of the raw and the rewritten question to reuse the retrieval of the
+            raw question.
+        context_compression_enabled (bool): Compress the retrieved chunks before
+            the LLM call, merging overlapping or adjacent chunks of a page and
+            dropping near-duplicate chunks.
+        context_token_budget (int): Maximum estimated number of tokens of the
+            retrieved context passed to the LLM. The lowest ranked chunks are
+            trimmed first. 0 disables the budget.
+        context_dedup_threshold (float): Minimum fraction of the word trigrams of
+            a chunk found in higher ranked chunks to drop it as a near-duplicate.
+        full_context_max_tokens (int): Documents whose whole text is estimated
+            at most this many tokens are answered with their whole text as the
+            context, skipping the question rewrite and retrieval. Only documents
+            fitting a single ingestion window qualify. 0 disables the mode.
+        rag_chain_cache_size (int): Maximum number of per-document RAG chains
+            kept in memory. Least recently used chains are evicted first.
+        rag_chain_cache_ttl (int): Time to live of a cached RAG chain in seconds.
+            Bounds how long a worker may serve a stale vectorstore handle after
+            the document is re-ingested by another process.
+        extraction_engine (str): Text extraction engine, "pymupdf" to read the
+            text layer with an Unstructured fallback for pages without one, or
+            "unstructured" to run Unstructured on the whole document.
+        extraction_parallel_min_pages (int): Documents with at least this many
+            pages are extracted over a process pool. 0 disables parallelism.
+        extraction_workers (int): Number of processes used for parallel extraction.
+        extraction_min_page_chars (int): Pages with fewer non-whitespace characters
+            are considered to have no text layer and use the fallback engine.
+        embedding_batch_size (int): Number of chunks sent per embedding request.
+        embedding_max_concurrency (int): Maximum number of embedding requests
+            in flight per document.
+        embedding_max_retries (int): Retries of a batch on rate limit (429) and
+            server (5xx) errors.
+        embedding_backoff_base (float): Upper bound of the first retry delay in
+            seconds, doubled on each retry with full jitter.
+        embedding_backoff_max (float): Upper bound of a single retry delay in seconds.
+        embedding_cache_enabled (bool): Cache embeddings by model and text, so
+            unchanged chunks and repeated queries are not embedded again.
+        embedding_cache_redis (bool): Share cached embeddings between containers
+            through Redis, in addition to the local disk cache.
+        embedding_cache_expiry (int): Expiry of the Redis cached embeddings in seconds.
+        ingestion_parse_queue (str): Base name of the Celery queues of the CPU-bound
+            parsing stage, suffixed with the ingestion lane, e.g. "parsing.fast".
+        ingestion_embed_queue (str): Base name of the Celery queues of the I/O-bound
+            embedding stage, suffixed with the ingestion lane, e.g. "embedding.bulk".
+        ingestion_store_queue (str): Base name of the Celery queues of the vector store
+            upsert stage, suffixed with the ingestion lane, e.g. "storing.fast".
+        ingestion_fast_lane_max_pages (int): Documents with at most this many pages
+            and at most `ingestion_fast_lane_max_bytes` bytes are ingested through
+            the fast lane queues, larger ones through the bulk lane queues.
+        ingestion_fast_lane_max_bytes (int): Size limit of fast lane documents in bytes.
+        ingestion_wait_samples (int): Number of recent queue wait times kept per lane.
+        ingestion_embedding_task_size (int): Minimum number of chunks parsed, embedded
+            and upserted per ingestion step, rounded up to whole pages. Bounds the
+            chunks held in memory, and smaller steps spread a document over more
+            embedding subtasks.
+        ingestion_partial_min_pages (int): Documents become queryable, flagged as
+            partial, once the chunks of this many pages are indexed, while the
+            remaining pages are still being ingested. 0 disables partial documents.
+        vector_backend (str): Vector store backend, "chroma" for a Chroma collection
+            per document, or "numpy" for a memory-mapped matrix per document
+            searched by brute force, which is faster for small documents.
+        retrieval_mode (str): Chat retrieval mode, "vector" for vector search only,
+            or "hybrid" to fuse the BM25 and vector results of a document with
+            reciprocal rank fusion. Documents without a lexical index use vector
+            search only.
+        hybrid_rrf_k (int): Rank offset of the reciprocal rank fusion, damping
+            the weight of the top ranks of each result list.
+        hybrid_lexical_min_coverage (float): Minimum IDF weighted fraction of the
+            query terms the best BM25 match must contain to answer from the
+            lexical results alone, skipping the query embedding call.
+        hybrid_lexical_min_margin (float): Minimum ratio of the best to the second
+            best BM25 score to answer from the lexical results alone.
+        search_max_documents (int): Number of documents whose chunks are searched
+            by a library-wide search, picked by their centroids in the router index.
+        search_max_results (int): Maximum number of chunks returned by a
+            library-wide search.
+        search_router_oversampling (int): Centroids fetched from the router index
+            per document searched, since a document has a centroid per
+            ingestion window.
+        blocking_io_workers (int): Size of the thread pool used to run blocking
+            calls (vector store setup, file hashing, re-ingestion) off the event loop.
         is_testing (bool): True if the pytest module is called to dynamically determine if tests are running.
     """
 
@@ -90,11 +211,65 @@ class AppConfig(_ReadOnlySettings):
     ]
     max_file_size: int = 10 * 1024**2  # 10 MB
     max_filename_length: int = 255
+    upload_chunk_size: int = 1024**2  # 1 MB
+    max_bulk_files: int = 1000
+    max_bulk_upload_size: int = 500 * 1024**2  # 500 MB
+    bulk_ingestion_workers: int = 4
     message_character_limit: int = 2000
+    max_chat_documents: int = 10
     api_version: str = "v1"
     loguru_rotation: str = "10 MB"
     loguru_retention_size: int = 0.5 * 1024**3  # 500 MB
     cache_expiry: int = 86400  # 24 hours
+    qa_semantic_cache_enabled: bool = True
+    qa_semantic_cache_threshold: float = 0.95
+    qa_semantic_cache_size: int = 200
+    qa_semantic_cache_sample_rate: float = 0.05
+    qa_semantic_cache_samples: int = 100
+    qa_local_cache_size: int = 1024
+    qa_local_cache_ttl: int = 60
+    history_max_turns: int = 10
+    history_token_budget: int = 2000
+    history_summary_enabled: bool = True
+    history_summary_max_words: int = 200
+    query_rewrite_mode: str = "adaptive"
+    query_rewrite_min_terms: int = 3
+    query_rewrite_min_overlap: float = 0.8
+    context_compression_enabled: bool = True
+    context_token_budget: int = 1000
+    context_dedup_threshold: float = 0.9
+    full_context_max_tokens: int = 8000
+    rag_chain_cache_size: int = 64
+    rag_chain_cache_ttl: int = 3600  # 1 hour
+    extraction_engine: str = "pymupdf"
+    extraction_parallel_min_pages: int = 500
+    extraction_workers: int = 4
+    extraction_min_page_chars: int = 1
+    embedding_batch_size: int = 100  # gemini batch limit
+    embedding_max_concurrency: int = 4
+    embedding_max_retries: int = 5
+    embedding_backoff_base: float = 1.0
+    embedding_backoff_max: float = 30.0
+    embedding_cache_enabled: bool = True
+    embedding_cache_redis: bool = False
+    embedding_cache_expiry: int = 7 * 86400  # 7 days
+    ingestion_parse_queue: str = "parsing"
+    ingestion_embed_queue: str = "embedding"
+    ingestion_store_queue: str = "storing"
+    ingestion_embedding_task_size: int = 200
+    ingestion_partial_min_pages: int = 20
+    ingestion_fast_lane_max_pages: int = 50
+    ingestion_fast_lane_max_bytes: int = 2 * 1024**2  # 2 MB
+    ingestion_wait_samples: int = 100
+    vector_backend: str = "chroma"
+    retrieval_mode: str = "hybrid"
+    hybrid_rrf_k: int = 60
+    hybrid_lexical_min_coverage: float = 1.0
+    hybrid_lexical_min_margin: float = 1.5
+    search_max_documents: int = 5
+    search_max_results: int = 50
+    search_router_oversampling: int = 4
+    blocking_io_workers: int = 8
     is_testing: bool = "pytest" in sys.modules
     default_history: list[tuple] = [
         (
@@ -131,10 +306,33 @@ class AppConfig(_ReadOnlySettings):
     def chroma_path(self) -> Path:
         return self.data_path / "chroma_db"
 
+    @property
+    def numpy_vector_path(self) -> Path:
+        return self.data_path / "numpy_db"
+
+    @property
+    def vectorstore_path(self) -> Path:
+        """Directory of the selected vector store backend."""
+        if self.vector_backend == "numpy":
+            return self.numpy_vector_path
+        return self.chroma_path
+
+    @property
+    def lexical_path(self) -> Path:
+        return self.data_path / "lexical_db"
+
+    @property
+    def document_text_path(self) -> Path:
+        return self.data_path / "text"
+
     @property
     def history_path(self) -> Path:
         return self.data_path / "history"
 
+    @property
+    def embedding_cache_path(self) -> Path:
+        return self.data_path / "embeddings"
+
     @property
     def tmp_path(self) -> Path:
         return self.data_path / ".tmp"
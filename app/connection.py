@@ -2,6 +2,7 @@
 This module handles database connections
 """
 
+import redis as sync_redis
 import redis.asyncio as redis
 from app.config import env_config
 
@@ -9,3 +10,8 @@ from app.config import env_config
 redis_connection: redis.Redis = redis.from_url(
     str(env_config.redis_url), encoding="utf8"
 )
+
+# blocking client for code running outside of the event loop (e.g. celery tasks)
+sync_redis_connection: sync_redis.Redis = sync_redis.from_url(
+    str(env_config.redis_url), encoding="utf8"
+)
@@ -17,9 +17,27 @@ dependency_map = {
     "upload_pdf_file": [
         {"func": RateLimiter(times=1, seconds=2), "conditions": [IS_NOT_TESTING]}
     ],
+    "upload_pdf_files": [
+        {"func": RateLimiter(times=1, seconds=10), "conditions": [IS_NOT_TESTING]}
+    ],
     "chat": [
         {"func": RateLimiter(times=1, seconds=2), "conditions": [IS_NOT_TESTING]}
     ],
+    "chat_with_pdfs": [
+        {"func": RateLimiter(times=1, seconds=2), "conditions": [IS_NOT_TESTING]}
+    ],
+    "search_documents": [
+        {"func": RateLimiter(times=1, seconds=1), "conditions": [IS_NOT_TESTING]}
+    ],
+    "get_qa_cache_stats": [
+        {"func": RateLimiter(times=5, seconds=1), "conditions": [IS_NOT_TESTING]}
+    ],
+    "get_document_status": [
+        {"func": RateLimiter(times=5, seconds=1), "conditions": [IS_NOT_TESTING]}
+    ],
+    "get_ingestion_queues": [
+        {"func": RateLimiter(times=5, seconds=1), "conditions": [IS_NOT_TESTING]}
+    ],
     "get_all_documents": [
         {"func": RateLimiter(times=5, seconds=1), "conditions": [IS_NOT_TESTING]}
     ],
@@ -13,3 +13,9 @@ class NoDocumentsException(KeyError):
     """Raised when no documents are loaded from a vector store"""
 
     pass
+
+
+class InvalidFileException(ValueError):
+    """Raised when an uploaded file fails content validation"""
+
+    pass
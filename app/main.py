@@ -3,6 +3,7 @@ This module acts as the entry point and initializes th FastAPI application a wit
 It also sets up a rate limiter using Redis and serves static files.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import APIRouter, FastAPI
 from fastapi.staticfiles import StaticFiles
@@ -15,7 +16,9 @@ from app.middlewares import (
     LoggingMiddleware,
 )
 from app.config import app_config
-from app.routes import chat, document, history
+from app.routes import chat, document, history, search
+from app.services.qa_cache_service import listen_invalidations
+from app.services.rag_service import invalidate_rag_chain
 from app.utils import init_dirs
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -29,7 +32,7 @@ logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
 
 # initialize directories
 init_dirs(
-    app_config.chroma_path,
+    app_config.vectorstore_path,
     app_config.history_path,
     app_config.tmp_path,
     app_config.pdf_path,
@@ -46,9 +49,15 @@ async def lifespan(_: FastAPI):
     # set up limiter
     if not app_config.is_testing:
         await FastAPILimiter.init(redis_connection)
+        # keep the in-process QA cache and RAG chains coherent with the
+        # documents re-ingested by the celery worker
+        invalidation_listener = asyncio.create_task(
+            listen_invalidations(on_invalidate=invalidate_rag_chain)
+        )
 
     yield
     if not app_config.is_testing:
+        invalidation_listener.cancel()
         await FastAPILimiter.close()  # closes the redis connection
 
 
@@ -80,6 +89,7 @@ base_router = APIRouter(prefix=f"/{app_config.api_version}")
 base_router.include_router(router=document.router)
 base_router.include_router(router=chat.router)
 base_router.include_router(router=history.router)
+base_router.include_router(router=search.router)
 app.include_router(base_router)
 
 
@@ -1,2 +1,23 @@
-from .structures import ChunkMetadata, DocumentMetadata
-from .schemas import ChatRequest, ChatResponse
+from .structures import (
+    BulkUploadResult,
+    BulkUploadStatus,
+    ChunkMetadata,
+    ContextMode,
+    DocumentMetadata,
+    IngestionLane,
+    IngestionState,
+    IngestionStatus,
+    LaneStats,
+    QACacheStats,
+    SemanticHitSample,
+    UploadedDocument,
+)
+from .schemas import (
+    ChatRequest,
+    ChatResponse,
+    DocumentMatch,
+    MultiChatRequest,
+    MultiChatResponse,
+    SearchResponse,
+    SearchResult,
+)
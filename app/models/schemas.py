@@ -43,7 +43,101 @@ class ChatResponse(BaseModel):
 
     Attributes:
         response (str): The response generated by the RAG service.
+        partial (bool): True if the document was still being ingested, so the
+            answer is based on its first pages only.
     """
 
     response: str
+    partial: bool = False
     # "history": list
+
+
+class MultiChatRequest(ChatRequest):
+    """Represents a chat request over several documents.
+
+    Attributes:
+        message (str): The user's message to be processed.
+        pdf_ids (list[str]): The IDs of the documents to chat with.
+    """
+
+    pdf_ids: list[str]
+
+    @field_validator("pdf_ids")
+    def validate_pdf_ids(pdf_ids: list[str]):
+        """Validates the document IDs, removing blanks and duplicates.
+
+        Args:
+            pdf_ids (list[str]): The document IDs to validate.
+
+        Raises:
+            ValueError: If no ID is given or there are too many IDs.
+
+        Returns:
+            list[str]: The unique document IDs, in the given order.
+        """
+        pdf_ids = list(dict.fromkeys(i.strip() for i in pdf_ids if i.strip()))
+        if not pdf_ids:
+            raise ValueError("Please provide at least one id.")
+        if len(pdf_ids) > app_config.max_chat_documents:
+            raise ValueError(
+                f"A chat is limited to {app_config.max_chat_documents} documents."
+            )
+        return pdf_ids
+
+
+class MultiChatResponse(ChatResponse):
+    """Represents a chat response over several documents.
+
+    Attributes:
+        response (str): The response generated by the RAG service.
+        partial (bool): True if any document was still being ingested.
+        chat_id (str): The ID of the document set, under which the chat
+            history is kept.
+    """
+
+    chat_id: str
+
+
+class SearchResult(BaseModel):
+    """Represents a chunk matching a library-wide search.
+
+    Attributes:
+        document_id (str): The ID of the document containing the chunk.
+        filename (str): The name of the document file.
+        page (int): The page of the chunk.
+        content (str): The text of the chunk.
+        score (float): The relevance score of the chunk, higher is more relevant.
+    """
+
+    document_id: str
+    filename: str
+    page: int
+    content: str
+    score: float
+
+
+class DocumentMatch(BaseModel):
+    """Represents a document matching a library-wide search.
+
+    Attributes:
+        document_id (str): The ID of the document.
+        filename (str): The name of the document file.
+        score (float): The relevance score of the best chunk of the document.
+    """
+
+    document_id: str
+    filename: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    """Represents the response of a library-wide search.
+
+    Attributes:
+        documents (list[DocumentMatch]): The matching documents, most relevant first.
+        results (list[SearchResult]): The matching chunks of all documents,
+            most relevant first.
+    """
+
+    documents: list[DocumentMatch]
+    results: list[SearchResult]
@@ -3,9 +3,18 @@ Module defining pydantic models that will be used
 through the app to ensure data quality.
 """
 
+from enum import Enum
+from typing import Optional
 from pydantic import BaseModel
 
 
+class ContextMode(str, Enum):
+    """Represents how the context of a chat with a document is built."""
+
+    RETRIEVAL = "retrieval"
+    FULL = "full"
+
+
 class DocumentMetadata(BaseModel):
     """Represents metadata for a document.
 
@@ -13,11 +22,14 @@ class DocumentMetadata(BaseModel):
         document_id (str): Unique identifier for the document.
         filename (str): Name of the document file.
         page_count (int): Total number of pages in the document.
+        context_mode (ContextMode): "full" if the whole text of the document is
+            small enough to be passed to the LLM instead of retrieved chunks.
     """
 
     document_id: str
     filename: str
     page_count: int
+    context_mode: ContextMode = ContextMode.RETRIEVAL
 
 
 class ChunkMetadata(DocumentMetadata):
@@ -26,7 +38,163 @@ class ChunkMetadata(DocumentMetadata):
     Inherits from DocumentMetadata and adds chunk-specific information.
 
     Attributes:
-        start_index (int): The starting index of the chunk within the document.
+        start_index (int): The starting index of the chunk within its page.
+        page (Optional[int]): The page number of the chunk, starting from 1.
     """
 
     start_index: int
+    page: Optional[int] = None
+
+
+class UploadedDocument(BaseModel):
+    """Represents a stored upload, with the facts learned while storing it.
+
+    Attributes:
+        document_id (str): Unique identifier for the document.
+        page_count (int): Total number of pages in the document.
+        size (int): Size of the document in bytes.
+    """
+
+    document_id: str
+    page_count: int
+    size: int
+
+
+class IngestionLane(str, Enum):
+    """Represents the ingestion queues documents are routed to by their
+    estimated processing cost."""
+
+    FAST = "fast"
+    BULK = "bulk"
+
+
+class IngestionState(str, Enum):
+    """Represents the stages of the document ingestion pipeline."""
+
+    QUEUED = "queued"
+    PARSING = "parsing"
+    EMBEDDING = "embedding"
+    PARTIAL = "partial"  # queryable while the remaining pages are ingested
+    READY = "ready"
+    FAILED = "failed"
+
+
+class IngestionStatus(BaseModel):
+    """Represents the ingestion progress of a document.
+
+    Attributes:
+        document_id (str): Unique identifier for the document.
+        state (IngestionState): The current ingestion stage.
+        task_id (Optional[str]): The ID of the celery task processing the document.
+        lane (Optional[IngestionLane]): The ingestion lane the document was routed to.
+        page_count (Optional[int]): Total number of pages, known after parsing.
+        chunk_count (Optional[int]): Total number of chunks, known after splitting.
+        embedded_chunks (int): Number of chunks saved to the vector store.
+        indexed_pages (int): Number of pages whose chunks are all queryable.
+        error (Optional[str]): The error message if the ingestion failed.
+        timings (dict[str, float]): Seconds spent in each finished or
+            ongoing stage, keyed by stage name.
+    """
+
+    document_id: str
+    state: IngestionState
+    task_id: Optional[str] = None
+    lane: Optional[IngestionLane] = None
+    page_count: Optional[int] = None
+    chunk_count: Optional[int] = None
+    embedded_chunks: int = 0
+    indexed_pages: int = 0
+    error: Optional[str] = None
+    timings: dict[str, float] = {}
+
+
+class LaneStats(BaseModel):
+    """Represents the load of an ingestion lane.
+
+    Attributes:
+        lane (IngestionLane): The ingestion lane.
+        queued (int): Number of tasks waiting in the lane's queues.
+        wait_samples (int): Number of recent documents the wait times are based on.
+        wait_p50 (Optional[float]): Median seconds recent documents waited
+            before parsing started.
+        wait_max (Optional[float]): Maximum seconds recent documents waited
+            before parsing started.
+    """
+
+    lane: IngestionLane
+    queued: int
+    wait_samples: int = 0
+    wait_p50: Optional[float] = None
+    wait_max: Optional[float] = None
+
+
+class BulkUploadStatus(str, Enum):
+    """Represents the outcome of a single file of a bulk upload."""
+
+    STORED = "stored"
+    DUPLICATE = "duplicate"
+    REJECTED = "rejected"
+
+
+class BulkUploadResult(BaseModel):
+    """Represents the outcome of a single file of a bulk upload.
+
+    Attributes:
+        filename (str): Name of the uploaded file, or of the zip archive member.
+        status (BulkUploadStatus): Whether the file was stored, already known or rejected.
+        pdf_id (Optional[str]): Unique identifier of the document, unless rejected.
+        page_count (Optional[int]): Total number of pages of a stored document.
+        size (Optional[int]): Size of a stored document in bytes.
+        task_id (Optional[str]): The ID of the celery task processing a stored document.
+        lane (Optional[IngestionLane]): The ingestion lane a stored document was routed to.
+        error (Optional[str]): The reason a file was rejected.
+    """
+
+    filename: str
+    status: BulkUploadStatus
+    pdf_id: Optional[str] = None
+    page_count: Optional[int] = None
+    size: Optional[int] = None
+    task_id: Optional[str] = None
+    lane: Optional[IngestionLane] = None
+    error: Optional[str] = None
+
+
+class SemanticHitSample(BaseModel):
+    """Represents a sampled semantic QA cache hit, kept to review false hits.
+
+    Attributes:
+        chat_id (str): The ID of the document or document set.
+        query (str): The query that was answered from the cache.
+        cached_query (str): The cached query whose answer was returned.
+        similarity (float): The cosine similarity of the two queries.
+        time (float): The time of the hit.
+    """
+
+    chat_id: str
+    query: str
+    cached_query: str
+    similarity: float
+    time: float
+
+
+class QACacheStats(BaseModel):
+    """Represents the effectiveness of the QA cache.
+
+    Attributes:
+        exact_hits (int): Lookups answered by an exact query match.
+        semantic_hits (int): Lookups answered by a similar cached query.
+        misses (int): Lookups without a cached answer.
+        hit_rate (Optional[float]): Fraction of the lookups answered from the cache.
+        samples (list[SemanticHitSample]): Recent sampled semantic hits.
+        local_hits (int): Lookups answered by the in-process cache of the worker
+            serving the request, without a Redis round trip. Not included in
+            the other counts.
+    """
+
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    local_hits: int = 0
+    hit_rate: Optional[float] = None
+    samples: list[SemanticHitSample] = []
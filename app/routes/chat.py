@@ -1,29 +1,125 @@
 """
 Module for handling routes for chat interactions with PDF documents.
 
-This module defines API endpoints for chatting with PDF documents, utilizing 
-Retrieval-Augmented Generation (RAG) to provide context-aware responses. 
-It handles rate limiting, checks for existing documents, and caches question-answer 
-pairs for efficient retrieval.
+This module defines API endpoints for chatting with PDF documents, utilizing
+Retrieval-Augmented Generation (RAG) to provide context-aware responses.
+It handles rate limiting, checks for existing documents, and caches question-answer
+pairs for efficient retrieval. A streaming variant sends the answer as
+Server-Sent Events while it is being generated.
+
+Documents that are still being ingested can be chatted with once they are
+partially indexed. Such answers are flagged as partial and are not cached.
+
+Several documents can be chatted with at once, with a single retrieval pass
+and LLM call. The history and cached answers of such a chat are keyed by the
+document set.
 """
 
+import asyncio
+import json
 import os
+from typing import AsyncIterator
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from app.dependencies import get_current_user, load_route_dependencies
 from app.exceptions import NoDocumentsException
-from app.models import ChatResponse
+from app.models import (
+    ChatResponse,
+    IngestionState,
+    MultiChatRequest,
+    MultiChatResponse,
+    QACacheStats,
+)
 from app.tasks import process_pdf
-from app.services.rag_service import invoke_rag_chain
-from app.services.qa_cache_service import load_qa, save_qa
+from app.services.rag_service import (
+    get_rag_components,
+    invoke_multi_rag_chain,
+    invoke_rag_chain,
+    stream_rag_chain,
+)
+from app.services.qa_cache_service import load_qa, load_qa_stats, save_qa
+from app.services.status_service import load_state
 from app.config import app_config
 from app.models import ChatRequest
-from app.utils.hash_utils import generate_uuid_from_file
+from app.utils.async_utils import run_blocking
+from app.utils.hash_utils import generate_document_set_id, generate_uuid_from_file
 from app.utils.logger import logger
 
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
+@router.post(
+    "/", response_model=MultiChatResponse, dependencies=load_route_dependencies("chat_with_pdfs")
+)
+async def chat_with_pdfs(
+    chat_request: MultiChatRequest,
+    current_user: str = Depends(get_current_user),
+):
+    """Handles chat interactions over several PDF documents at once.
+
+    The documents are searched concurrently, their chunks are merged into a
+    single top-k and answered with one LLM call. The chat history and cached
+    answers are keyed by the document set, returned as `chat_id`.
+
+    Args:
+        chat_request (MultiChatRequest): The request object containing the user's
+            message and the IDs of the documents.
+        current_user (str, optional): The current user making the request. If not provided,
+            default user will be assumed.
+
+    Returns:
+        MultiChatResponse: The AI-generated response to the user's query.
+
+    Raises:
+        HTTPException: If any PDF ID is invalid or if no documents are found.
+    """
+    pdf_ids = [_validate_pdf_id(pdf_id) for pdf_id in chat_request.pdf_ids]
+    partial = any(
+        await asyncio.gather(*(_check_ingestion_state(pdf_id) for pdf_id in pdf_ids))
+    )
+    chat_id = generate_document_set_id(pdf_ids)
+
+    # check for cached response
+    answer = await load_qa(chat_id, chat_request.message, pdf_ids=pdf_ids)
+    if answer:
+        logger.info(f"QA cache hit for: {chat_id}")
+        return MultiChatResponse(response=answer, chat_id=chat_id)
+
+    if not partial:
+        await asyncio.gather(*(_ensure_rag_components(pdf_id) for pdf_id in pdf_ids))
+    output = await invoke_multi_rag_chain(
+        pdf_ids=pdf_ids,
+        query=chat_request.message,
+        user_id=current_user,
+        partial=partial,
+    )
+
+    if not partial:
+        await save_qa(
+            chat_id, chat_request.message, output.get("answer"), pdf_ids=pdf_ids
+        )
+        logger.info(f"Succesfully cached QA pair for {chat_id}")
+    return MultiChatResponse(
+        response=output.get("answer"), partial=partial, chat_id=chat_id
+    )
+
+
+@router.get(
+    "/cache",
+    response_model=QACacheStats,
+    dependencies=load_route_dependencies("get_qa_cache_stats"),
+)
+async def get_qa_cache_stats():
+    """Retrieves the hit rate of the QA cache and recent sampled semantic
+    hits, to review false hits of the similarity threshold.
+
+    Returns:
+        QACacheStats: The cache counters and samples.
+    """
+    return await load_qa_stats()
+
+
 @router.post("/{pdf_id}", dependencies=load_route_dependencies("chat"))
 async def chat_with_pdf(
     pdf_id: str,
@@ -39,17 +135,14 @@ async def chat_with_pdf(
             default user will be assumed.
 
     Returns:
-        ChatResponse: The AI-generated response to the user's query.
+        ChatResponse: The AI-generated response to the user's query, flagged as
+        partial if the document is still being ingested.
 
     Raises:
         HTTPException: If the provided PDF ID is invalid or if no documents are found.
     """
-    pdf_id = pdf_id.strip()
-    if not pdf_id:
-        raise HTTPException(status_code=400, detail="Please provide an id.")
-
-    if not os.path.isfile(app_config.pdf_path / f"{pdf_id}.pdf"):
-        raise HTTPException(status_code=404)  # message is auto handled
+    pdf_id = _validate_pdf_id(pdf_id)
+    partial = await _check_ingestion_state(pdf_id)
 
     # check for cached response
     answer = await load_qa(pdf_id, chat_request.message)
@@ -58,28 +151,168 @@ async def chat_with_pdf(
         return ChatResponse(response=answer)
 
     try:
-        output = invoke_rag_chain(
-            pdf_id=pdf_id, query=chat_request.message, user_id=current_user
+        output = await invoke_rag_chain(
+            pdf_id=pdf_id,
+            query=chat_request.message,
+            user_id=current_user,
+            partial=partial,
         )
     except NoDocumentsException:
-        # handle no documents issue, arises when documents are not properly saved to the vectorstore
-        # for some reason (most likely NFS related issue, see the Dockerfile for the fix).
-        logger.error(
-            f"Could not find any vector data for '{pdf_id}'. attempting to reload the documents."
-        )
-        file_uuid = str(generate_uuid_from_file(app_config.pdf_path / f"{pdf_id}.pdf"))
-
-        # causes bottleneck, but better than throwing an error.
-        process_pdf(file_uuid)
+        await _reload_documents(pdf_id)
 
         # run again
-        output = invoke_rag_chain(
+        output = await invoke_rag_chain(
             pdf_id=pdf_id,
             query=chat_request.message,
+            user_id=current_user,
         )
 
+    if partial:
+        # the answer may change once the remaining pages are indexed
+        return ChatResponse(response=output.get("answer"), partial=True)
+
     # cache response
     # TODO check if the answer is not a refusal and only cache if so.
     await save_qa(pdf_id, chat_request.message, output.get("answer"))
     logger.info(f"Succesfully cached QA pair for {pdf_id}")
     return ChatResponse(response=output.get("answer"))
+
+
+@router.post("/{pdf_id}/stream", dependencies=load_route_dependencies("chat"))
+async def stream_chat_with_pdf(
+    pdf_id: str,
+    chat_request: ChatRequest,
+    current_user: str = Depends(get_current_user),
+):
+    """Handles chat interactions with a specified PDF document, streaming the
+    answer as Server-Sent Events.
+
+    Each generated chunk is sent as a `token` event with `{"token": str}` data.
+    The stream ends with an `end` event carrying the full answer as
+    `{"response": str, "partial": bool}`, or an `error` event if generation
+    fails. Cached answers are served as a single `end` event.
+
+    Args:
+        pdf_id (str): The ID of the PDF document to chat with.
+        chat_request (ChatRequest): The request object containing the user's message.
+        current_user (str, optional): The current user making the request. If not provided,
+            default user will be assumed.
+
+    Returns:
+        StreamingResponse: The `text/event-stream` response.
+
+    Raises:
+        HTTPException: If the provided PDF ID is invalid or if no documents are found.
+    """
+    pdf_id = _validate_pdf_id(pdf_id)
+    partial = await _check_ingestion_state(pdf_id)
+
+    # check for cached response
+    answer = await load_qa(pdf_id, chat_request.message)
+    if answer:
+        logger.info(f"QA cache hit for: {pdf_id}")
+        return _event_stream_response(
+            _single_event({"response": answer, "partial": False}, "end")
+        )
+
+    # make sure the chain can be built before the response starts
+    if not partial:
+        await _ensure_rag_components(pdf_id)
+
+    async def event_stream() -> AsyncIterator[str]:
+        tokens = []
+        try:
+            async for token in stream_rag_chain(
+                pdf_id=pdf_id,
+                query=chat_request.message,
+                user_id=current_user,
+                partial=partial,
+            ):
+                tokens.append(token)
+                yield _format_sse({"token": token}, "token")
+        except Exception as e:
+            # headers are already sent, report the error in-band
+            logger.exception(f"Error while streaming the answer for {pdf_id}: {e}")
+            yield _format_sse({"detail": "Something went wrong"}, "error")
+            return
+
+        answer = "".join(tokens)
+        if not partial:
+            await save_qa(pdf_id, chat_request.message, answer)
+            logger.info(f"Succesfully cached QA pair for {pdf_id}")
+        yield _format_sse({"response": answer, "partial": partial}, "end")
+
+    return _event_stream_response(event_stream())
+
+
+def _validate_pdf_id(pdf_id: str) -> str:
+    pdf_id = pdf_id.strip()
+    if not pdf_id:
+        raise HTTPException(status_code=400, detail="Please provide an id.")
+
+    if not os.path.isfile(app_config.pdf_path / f"{pdf_id}.pdf"):
+        raise HTTPException(status_code=404)  # message is auto handled
+
+    return pdf_id
+
+
+async def _check_ingestion_state(pdf_id: str) -> bool:
+    # O(1) readiness check, documents without a recorded state (e.g. ingested
+    # before status tracking, or Redis being unavailable) fall through to the
+    # vector store check. Returns True if the document is partially indexed.
+    state = await load_state(pdf_id)
+    if state in (
+        IngestionState.QUEUED,
+        IngestionState.PARSING,
+        IngestionState.EMBEDDING,
+    ):
+        raise HTTPException(
+            status_code=409,
+            detail=f"The document is still being processed ({state.value}), please try again later.",
+        )
+    if state == IngestionState.FAILED:
+        raise HTTPException(
+            status_code=422,
+            detail="The document could not be processed, please upload it again.",
+        )
+    return state == IngestionState.PARTIAL
+
+
+async def _ensure_rag_components(pdf_id: str) -> None:
+    try:
+        await get_rag_components(pdf_id)
+    except NoDocumentsException:
+        await _reload_documents(pdf_id)
+
+
+async def _reload_documents(pdf_id: str) -> None:
+    # handle no documents issue, arises when documents are not properly saved to the vectorstore
+    # for some reason (most likely NFS related issue, see the Dockerfile for the fix).
+    logger.error(
+        f"Could not find any vector data for '{pdf_id}'. attempting to reload the documents."
+    )
+    file_uuid = str(
+        await run_blocking(
+            generate_uuid_from_file, app_config.pdf_path / f"{pdf_id}.pdf"
+        )
+    )
+
+    # causes bottleneck, but better than throwing an error.
+    # runs off the event loop so other requests are not blocked.
+    await run_blocking(process_pdf, file_uuid)
+
+
+def _format_sse(data: dict, event: str) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _single_event(data: dict, event: str) -> AsyncIterator[str]:
+    yield _format_sse(data, event)
+
+
+def _event_stream_response(stream: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,16 +1,28 @@
 """
 Module for handling routes for PDF file uploads and retrievals.
 
-This module provides endpoints for uploading PDF files and listing all uploaded 
-documents. It includes rate limiting to control the frequency of requests, ensuring 
-efficient resource usage.
+This module provides endpoints for uploading single PDF files or many at once,
+listing all uploaded documents and monitoring their ingestion status. It includes rate limiting to
+control the frequency of requests, ensuring efficient resource usage.
 """
 
 from fastapi import APIRouter, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
+from app.config import app_config
 from app.dependencies import load_route_dependencies
-from app.tasks import process_pdf_task
+from app.exceptions import InvalidFileException
+from app.models import (
+    BulkUploadResult,
+    BulkUploadStatus,
+    IngestionLane,
+    IngestionStatus,
+    LaneStats,
+)
+from app.tasks import start_ingestion
+from app.services.queue_service import load_lane_stats, select_lane
+from app.services.status_service import init_status, load_status, set_task_id
 from app.services.document_service import (
+    handle_bulk_upload,
     handle_file_upload,
     list_all,
     validate_pdf,
@@ -25,8 +37,9 @@ router = APIRouter(prefix="/pdf", tags=["pdf"])
 async def upload_pdf_file(file: UploadFile):
     """Uploads a PDF file for processing.
 
-    Validates the PDF file, handles the file upload, and initiates background processing
-    through Celery for saving document chunks to the vector store for later use. If the
+    Validates the PDF file, stores it in a single streaming pass, and initiates the staged background
+    ingestion pipeline through Celery for saving document chunks to the vector store for later use.
+    Small documents are ingested through the fast lane, large ones through the bulk lane. If the
     file already exists, it returns the file uuid.
 
     Args:
@@ -42,25 +55,81 @@ async def upload_pdf_file(file: UploadFile):
     if error_message:
         raise HTTPException(status_code=422, detail=error_message)
     try:
-        file_uuid = await handle_file_upload(file)
+        document = await handle_file_upload(file)
+    except InvalidFileException as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except FileExistsError as e:
         raise HTTPException(
             status_code=409, detail=f"File already exists with the id: {e}"
         )
 
-    task = process_pdf_task.delay(file_uuid)
+    # route by estimated cost, so small documents do not wait behind large ones
+    file_uuid = document.document_id
+    lane = select_lane(document.page_count, document.size)
+
+    task_id = await _queue_ingestion(file_uuid, lane)
 
     return JSONResponse(
         status_code=202,
         content={
             "pdf_id": file_uuid,
             "message": "Your document is being processed in the background.",
-            "task_id": task.id,
-            "monitor_url": "Not implemented",
+            "task_id": task_id,
+            "lane": lane.value,
+            "monitor_url": f"/{app_config.api_version}/pdf/{file_uuid}/status",
         },
     )
 
 
+@router.post(
+    "/bulk",
+    status_code=202,
+    response_model=list[BulkUploadResult],
+    dependencies=load_route_dependencies("upload_pdf_files"),
+)
+async def upload_pdf_files(files: list[UploadFile]):
+    """Uploads many PDF files, or zip archives of PDF files, for processing.
+
+    Every PDF file is stored like a single upload and ingested through the bulk
+    lane, keeping the fast lane free for interactive uploads. Files that are
+    already known are skipped without being parsed, and invalid files are
+    rejected without failing the rest of the upload.
+
+    Args:
+        files (list[UploadFile]): The PDF files and zip archives to upload.
+
+    Returns:
+        list[BulkUploadResult]: The outcome of each PDF file, in upload order.
+
+    Raises:
+        HTTPException: If the upload holds more than `max_bulk_files` PDF files.
+    """
+    if len(files) > app_config.max_bulk_files:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Bulk uploads are limited to {app_config.max_bulk_files} files.",
+        )
+    try:
+        results = await handle_bulk_upload(files)
+    except InvalidFileException as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    for result in results:
+        if result.status == BulkUploadStatus.STORED:
+            result.lane = IngestionLane.BULK
+            result.task_id = await _queue_ingestion(result.pdf_id, result.lane)
+
+    return results
+
+
+async def _queue_ingestion(file_uuid: str, lane: IngestionLane) -> str:
+    # mark as queued before the worker can pick the task up
+    await init_status(file_uuid)
+    task = start_ingestion(file_uuid, lane)
+    await set_task_id(file_uuid, task.id, lane=lane)
+    return task.id
+
+
 @router.get("/all", dependencies=load_route_dependencies("get_all_documents"))
 async def get_all_documents():
     """Retrieves a list of all uploaded PDF documents.
@@ -69,3 +138,42 @@ async def get_all_documents():
         list: A list of identifiers for all uploaded PDF documents.
     """
     return list_all()
+
+
+@router.get(
+    "/queues",
+    response_model=list[LaneStats],
+    dependencies=load_route_dependencies("get_ingestion_queues"),
+)
+async def get_ingestion_queues():
+    """Retrieves the load of each ingestion lane.
+
+    Returns:
+        list[LaneStats]: The number of queued tasks and the recent wait
+        times of each lane.
+    """
+    return await load_lane_stats()
+
+
+@router.get(
+    "/{pdf_id}/status",
+    response_model=IngestionStatus,
+    dependencies=load_route_dependencies("get_document_status"),
+)
+async def get_document_status(pdf_id: str):
+    """Retrieves the ingestion status of an uploaded PDF document.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+
+    Raises:
+        HTTPException: If no ingestion status exists for the document.
+
+    Returns:
+        IngestionStatus: The current ingestion state, progress counts and
+        the time spent in each stage.
+    """
+    status = await load_status(pdf_id.strip())
+    if status is None:
+        raise HTTPException(status_code=404)  # message is auto handled
+    return status
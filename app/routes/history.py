@@ -8,7 +8,7 @@ with specific PDF documents.
 from fastapi import APIRouter, Depends, Response
 from app.dependencies import get_current_user, load_route_dependencies
 from app.config import app_config
-from app.services.history_service import delete_history, load_history
+from app.services.history_service import adelete_history, aload_history
 
 
 router = APIRouter(prefix="/history", tags=["history"])
@@ -26,7 +26,7 @@ async def get_chat_history(pdf_id: str, current_user: str = Depends(get_current_
         list: The chat history for the specified PDF document, excluding system messages.
     """
 
-    history = load_history(pdf_id, current_user) or app_config.default_history
+    history = await aload_history(pdf_id, current_user) or app_config.default_history
     return history[1:-1]  # only return the relevant fields
 
 
@@ -43,5 +43,5 @@ async def delete_chat_history(
     Returns:
         Response: HTTP response indicating the status of the deletion.
     """
-    delete_history(pdf_id, current_user)
+    await adelete_history(pdf_id, current_user)
     return Response(status_code=206)
@@ -0,0 +1,66 @@
+"""
+Module handling routes for searching across every uploaded PDF document.
+
+This module provides an endpoint answering which documents talk about a
+topic, returning the best matching documents and chunks of the library.
+"""
+
+from fastapi import APIRouter, Query
+from app.config import app_config
+from app.dependencies import load_route_dependencies
+from app.models import DocumentMatch, SearchResponse, SearchResult
+from app.services.search_service import search_library
+from app.services.vector_service import merge_search_results
+
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get(
+    "/",
+    response_model=SearchResponse,
+    dependencies=load_route_dependencies("search_documents"),
+)
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=app_config.message_character_limit),
+    k: int = Query(10, ge=1, le=app_config.search_max_results),
+):
+    """Searches the chunks of all uploaded documents.
+
+    The query is routed to the most promising documents through their
+    centroids, and only the chunks of those documents are searched.
+
+    Args:
+        q (str): The search query.
+        k (int, optional): Number of chunks to return. Defaults to 10.
+
+    Returns:
+        SearchResponse: The matching documents and chunks, most relevant first.
+    """
+    results = await search_library(q.strip(), k)
+
+    documents = sorted(
+        (
+            DocumentMatch(
+                document_id=doc.metadata["document_id"],
+                filename=doc.metadata.get("filename", ""),
+                score=score,
+            )
+            for doc, score in (result[0] for result in results)
+        ),
+        key=lambda document: document.score,
+        reverse=True,
+    )
+    return SearchResponse(
+        documents=documents,
+        results=[
+            SearchResult(
+                document_id=doc.metadata["document_id"],
+                filename=doc.metadata.get("filename", ""),
+                page=doc.metadata.get("page", 0),
+                content=doc.page_content,
+                score=score,
+            )
+            for doc, score in merge_search_results(results, k)
+        ],
+    )
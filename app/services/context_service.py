@@ -0,0 +1,180 @@
+"""
+Module for compressing the retrieved context passed to the LLM.
+
+Chunks are split with an overlap, so chunks retrieved from the same part of a
+page repeat up to a fifth of their text. Before the LLM call, the overlapping
+or adjacent chunks of a page are merged back into a single passage using their
+`start_index`, chunks whose text is mostly found in higher ranked chunks are
+dropped, and the context is trimmed to `context_token_budget`, cutting the
+lowest ranked chunks at a sentence boundary. Passages keep the rank of their
+best chunk, so the most relevant text comes first.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+from langchain.schema import Document
+from app.config import app_config
+from app.utils.parse_utils import CHARS_PER_TOKEN, estimate_tokens
+
+# chunks separated by at most this many characters, the whitespace stripped
+# by the text splitter, are adjacent
+MAX_MERGE_GAP = 2
+# a chunk trimmed below this many tokens is dropped instead
+MIN_TRIMMED_TOKENS = 50
+SHINGLE_SIZE = 3
+SENTENCE_END = re.compile(r"[.!?](?=\s|$)|\n")
+
+
+@dataclass
+class ContextCompression:
+    """The retrieved context of a chat turn after compression.
+
+    Attributes:
+        documents (list[Document]): The passages passed to the LLM, by rank.
+        input_tokens (int): Estimated number of tokens of the retrieved chunks.
+        output_tokens (int): Estimated number of tokens of the passages.
+        retrieved (int): Number of retrieved chunks.
+    """
+
+    documents: list[Document] = field(default_factory=list)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    retrieved: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        """Estimated number of prompt tokens saved by the compression."""
+        return self.input_tokens - self.output_tokens
+
+
+def compress_context(
+    documents: list[Document], token_budget: Optional[int] = None
+) -> ContextCompression:
+    """Merges the overlapping or adjacent retrieved chunks of each page, drops
+    near-duplicate chunks and trims the result to a token budget.
+
+    Args:
+        documents (list[Document]): The retrieved chunks, by rank.
+        token_budget (Optional[int], optional): Maximum estimated number of
+            tokens of the passages. Defaults to `context_token_budget`, 0
+            disables the budget.
+
+    Returns:
+        ContextCompression: The passages and the token counts.
+    """
+    if token_budget is None:
+        token_budget = app_config.context_token_budget
+
+    compression = ContextCompression(
+        input_tokens=_count_tokens(documents), retrieved=len(documents)
+    )
+    passages = _deduplicate(_merge_overlaps(documents))
+    if token_budget:
+        passages = _fit_budget(passages, token_budget)
+
+    compression.documents = passages
+    compression.output_tokens = _count_tokens(passages)
+    return compression
+
+
+def _count_tokens(documents: list[Document]) -> int:
+    return sum(estimate_tokens(document.page_content) for document in documents)
+
+
+def _merge_overlaps(documents: list[Document]) -> list[Document]:
+    """Merges the overlapping or adjacent chunks of each page, ordering the
+    passages by the best rank of their chunks."""
+    ranked: list[tuple[int, Document]] = []
+    pages: dict[tuple, list[tuple[int, int, Document]]] = {}
+    for rank, document in enumerate(documents):
+        start = document.metadata.get("start_index")
+        page = document.metadata.get("page")
+        if start is None or page is None:
+            ranked.append((rank, document))
+            continue
+        key = (document.metadata.get("document_id"), document.metadata.get("filename"), page)
+        pages.setdefault(key, []).append((start, rank, document))
+
+    for chunks in pages.values():
+        chunks.sort(key=lambda chunk: chunk[0])
+        start, rank, document = chunks[0]
+        text = document.page_content
+        for next_start, next_rank, next_document in chunks[1:]:
+            end = start + len(text)
+            if next_start > end + MAX_MERGE_GAP:
+                ranked.append((rank, _passage(document, start, text)))
+                start, rank, document = next_start, next_rank, next_document
+                text = document.page_content
+                continue
+
+            next_text = next_document.page_content
+            if next_start + len(next_text) > end:
+                if next_start >= end:
+                    text += " " * (next_start - end) + next_text
+                else:
+                    text += next_text[end - next_start :]
+            rank = min(rank, next_rank)
+        ranked.append((rank, _passage(document, start, text)))
+
+    ranked.sort(key=lambda passage: passage[0])
+    return [document for _, document in ranked]
+
+
+def _passage(document: Document, start: int, text: str) -> Document:
+    if text is document.page_content:
+        return document
+    return Document(
+        page_content=text, metadata={**document.metadata, "start_index": start}
+    )
+
+
+def _deduplicate(documents: list[Document]) -> list[Document]:
+    """Drops the documents whose word trigrams are mostly found in higher
+    ranked documents."""
+    seen: set[tuple] = set()
+    kept = []
+    for document in documents:
+        shingles = _shingles(document.page_content)
+        if shingles:
+            duplicated = len(shingles & seen) / len(shingles)
+            if duplicated >= app_config.context_dedup_threshold:
+                continue
+            seen |= shingles
+        kept.append(document)
+    return kept
+
+
+def _shingles(text: str) -> set[tuple]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {
+        tuple(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def _fit_budget(documents: list[Document], token_budget: int) -> list[Document]:
+    """Keeps the documents fitting the budget by rank, trimming the first
+    one that does not fit at a sentence boundary."""
+    kept = []
+    remaining = token_budget
+    for document in documents:
+        tokens = estimate_tokens(document.page_content)
+        if tokens <= remaining:
+            kept.append(document)
+            remaining -= tokens
+        elif remaining >= MIN_TRIMMED_TOKENS:
+            text = _truncate(document.page_content, remaining * CHARS_PER_TOKEN)
+            kept.append(Document(page_content=text, metadata=document.metadata))
+            remaining -= estimate_tokens(text)
+    return kept
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    text = text[:max_chars]
+    ends = [match.end() for match in SENTENCE_END.finditer(text)]
+    # only cut at a sentence end if it keeps most of the text
+    if ends and ends[-1] >= max_chars // 2:
+        return text[: ends[-1]].rstrip()
+    return text.rsplit(" ", 1)[0].rstrip() if " " in text else text
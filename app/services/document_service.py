@@ -3,31 +3,57 @@ Module for handling PDF file uploads and processing.
 
 This module provides utilities for validating, uploading, and processing 
 PDF files within the application. It includes functions to validate PDF 
-file properties, manage file uploads, load documents, split text into 
-chunks, and retrieve metadata associated with documents and their chunks. 
+file properties, manage single and bulk file uploads, load documents, split
+text into chunks, and retrieve metadata associated with documents and their
+chunks. 
+
+Every stored file is named by the hash of its content, so files that are
+already known are detected from the hash alone and skipped before parsing.
+
+Documents can be loaded whole, or streamed page by page into windows of
+chunks, so the progressive ingestion pipeline holds a bounded number of
+chunks in memory regardless of the document size.
+
+Documents small enough to fit `full_context_max_tokens` are flagged with the
+"full" context mode in their chunk metadata, and their text is stored to be
+passed to the LLM as a whole instead of retrieved chunks.
 """
 
+import hashlib
 import os
-import shutil
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Optional
 from fastapi import UploadFile
 from langchain_chroma import Chroma
 from app.config import app_config
 import fitz
 import aiofiles
-from langchain_community.document_loaders import DirectoryLoader, UnstructuredPDFLoader
 
 from langchain.schema import Document
-from app.models import DocumentMetadata, ChunkMetadata
-from app.utils.hash_utils import generate_uuid_from_file
+from app.exceptions import InvalidFileException
+from app.models import (
+    BulkUploadResult,
+    BulkUploadStatus,
+    ChunkMetadata,
+    ContextMode,
+    DocumentMetadata,
+    UploadedDocument,
+)
+from app.services.extraction import extract_pages, iter_pages
+from app.utils.async_utils import run_blocking
+from app.utils.hash_utils import generate_uuid_from_hash
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from app.utils.logger import logger
+from app.utils.parse_utils import estimate_tokens
 
 
 async def validate_pdf(file: UploadFile) -> str:
-    """Validates the PDF file content by checking file size, name length,
-    file type, and attempts to open the file to check content. After checking,
-    it creates a hard copy of the file inside the temp directory. If the file
-    is cached already, it raises an error.
+    """Validates the PDF file properties by checking file size, name length
+    and file type, without reading the file content. The content is checked
+    while it is being stored, see `handle_file_upload`.
 
     Args:
         file (UploadFile): The uploaded PDF file to validate.
@@ -48,84 +74,387 @@ async def validate_pdf(file: UploadFile) -> str:
     if not file.filename.endswith(".pdf") or file.content_type != "application/pdf":
         return "Invalid file type. Only PDF files are allowed."
 
-    # Attempt to open the PDF file and check page count
+    return None
+
+
+async def handle_file_upload(file: UploadFile) -> UploadedDocument:
+    """Handles the upload of a PDF file and stores it in a single pass.
+
+    The upload is streamed to a temporary file in fixed-size chunks while its
+    SHA-256 hash is updated incrementally, so memory usage is constant
+    regardless of the file size. Unless the file is already known, the PDF
+    structure is then checked in a worker thread, and the file is atomically
+    moved to its content-addressed path.
+
+    Args:
+        file (UploadFile): The uploaded PDF file.
+
+    Returns:
+        UploadedDocument: The UUID generated for the uploaded file, with its
+        page count and size.
+
+    Raises:
+        InvalidFileException: If the file is too large or is not a valid PDF.
+        FileExistsError: If a file with the same UUID already exists.
+    """
+    temp_path = app_config.tmp_path / f"{uuid.uuid4().hex}.part"
+
     try:
-        temp_path = app_config.tmp_path / file.filename
-        async with aiofiles.open(temp_path, "wb") as temp_file:
-            content = await file.read()
-            await temp_file.write(content)
-            await temp_file.flush()
-
-        pdf_document = fitz.open(temp_path)
-        if not pdf_document.is_pdf:
-            raise Exception("Not a valid PDF file.")
-        if pdf_document.page_count == 0:
-            return "Uploaded file is not a valid PDF file (no pages)."
+        file_hash, size = await _stream_to_disk(file, temp_path)
+        return await run_blocking(_store_pdf, temp_path, file_hash, size)
+    finally:
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
 
-    except Exception as e:
-        logger.exception(e)
+
+def store_pdf_file(source: BinaryIO) -> UploadedDocument:
+    """Stores a PDF file from a binary stream in a single pass, like
+    `handle_file_upload`. Blocking.
+
+    Args:
+        source (BinaryIO): The PDF file content, e.g. an open file or a zip
+            archive member.
+
+    Returns:
+        UploadedDocument: The UUID generated for the stored file, with its
+        page count and size.
+
+    Raises:
+        InvalidFileException: If the file is too large or is not a valid PDF.
+        FileExistsError: If a file with the same UUID already exists.
+    """
+    temp_path = app_config.tmp_path / f"{uuid.uuid4().hex}.part"
+
+    try:
+        file_hash, size = _copy_to_disk(source, temp_path)
+        return _store_pdf(temp_path, file_hash, size)
+    finally:
         if os.path.isfile(temp_path):
             os.remove(temp_path)
-        return e
-        return "Uploaded file is not a valid PDF file."
 
-    return None
 
+async def handle_bulk_upload(files: list[UploadFile]) -> list[BulkUploadResult]:
+    """Stores many PDF files, and the PDF files inside zip archives, of a
+    single request. Already known files are reported as duplicates without
+    being parsed, and invalid files are rejected without failing the others.
+
+    Args:
+        files (list[UploadFile]): The uploaded PDF files and zip archives.
 
-async def handle_file_upload(file: UploadFile) -> str:
-    """Handles the upload of a PDF file stores it.
+    Returns:
+        list[BulkUploadResult]: The outcome of each PDF file, in upload order.
+
+    Raises:
+        InvalidFileException: If the upload holds more than `max_bulk_files`
+            PDF files, checked before any file is stored.
+    """
+    # the limit is checked before storing anything, so a rejected upload
+    # leaves no stored file behind to be reported as a duplicate on retry
+    file_count = 0
+    for file in files:
+        file_count += await run_blocking(_count_pdf_files, file) if _is_zip(file) else 1
+    if file_count > app_config.max_bulk_files:
+        raise InvalidFileException(
+            f"Bulk uploads are limited to {app_config.max_bulk_files} files."
+        )
+
+    results = []
+    for file in files:
+        if _is_zip(file):
+            if _exceeds_bulk_size(file):
+                results.append(
+                    _rejected(file.filename, "Archive size exceeds the bulk upload limit.")
+                )
+                continue
+            results.extend(await run_blocking(_store_zip, file.file, file.filename))
+        else:
+            error_message = await validate_pdf(file)
+            if error_message:
+                results.append(_rejected(file.filename, error_message))
+            else:
+                try:
+                    results.append(_stored(file.filename, await handle_file_upload(file)))
+                except (InvalidFileException, FileExistsError) as e:
+                    results.append(_not_stored(file.filename, e))
+
+    return results
+
+
+def store_multiple_documents(
+    from_dir: str, max_workers: Optional[int] = None
+) -> list[BulkUploadResult]:
+    """Stores every PDF document in a directory and its subdirectories over a
+    process pool. Already known documents are skipped without being parsed.
 
     Args:
-        file (UploadFile): The uploaded PDF file.
+        from_dir (str): The directory path from which to store PDF documents.
+        max_workers (Optional[int], optional): Number of processes. Defaults
+            to `bulk_ingestion_workers`.
 
     Returns:
-        str: The UUID generated for the uploaded file.
+        list[BulkUploadResult]: The outcome of each document, sorted by path.
 
     Raises:
+        NotADirectoryError: If the directory does not exist.
+    """
+    if not os.path.isdir(from_dir):
+        raise NotADirectoryError(from_dir)
+
+    paths = sorted(
+        str(path) for path in Path(from_dir).rglob("*") if path.suffix.lower() == ".pdf"
+    )
+    if not paths:
+        return []
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers or app_config.bulk_ingestion_workers
+    ) as executor:
+        return list(executor.map(_store_path, paths))
+
+
+def _store_pdf(temp_path: Path, file_hash: bytes, size: int) -> UploadedDocument:
+    """Moves a streamed file to its content-addressed path. Blocking.
+
+    Args:
+        temp_path (Path): The path the file was streamed to.
+        file_hash (bytes): The SHA-256 hash of the file content.
+        size (int): The size of the file in bytes.
+
+    Returns:
+        UploadedDocument: The stored document.
+
+    Raises:
+        InvalidFileException: If the file is not a valid PDF.
         FileExistsError: If a file with the same UUID already exists.
     """
-    temp_path = app_config.tmp_path / file.filename
-    file_uuid = str(generate_uuid_from_file(temp_path))
+    file_uuid = str(generate_uuid_from_hash(file_hash))
     pdf_path = app_config.pdf_path / f"{file_uuid}.pdf"
 
-    if os.path.isfile(pdf_path):
-        os.remove(temp_path)
+    # known files are skipped before parsing
+    if os.path.exists(pdf_path):
         raise FileExistsError(file_uuid)
+    page_count = _check_pdf_structure(temp_path)
+
+    try:
+        # claiming the path fails if it exists, so only one of concurrent
+        # uploads of the same file stores it
+        os.close(os.open(pdf_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise FileExistsError(file_uuid)
+    try:
+        # replace is atomic, and unlike hard links supported by every volume
+        os.replace(temp_path, pdf_path)
+    except BaseException:
+        os.remove(pdf_path)
+        raise
+
+    return UploadedDocument(document_id=file_uuid, page_count=page_count, size=size)
+
 
-    shutil.move(temp_path, pdf_path)
-    # os.remove(temp_path)
+async def _stream_to_disk(file: UploadFile, path: Path) -> tuple[bytes, int]:
+    """Writes an upload to disk chunk by chunk, hashing it on the way.
 
-    return file_uuid
+    Args:
+        file (UploadFile): The uploaded file.
+        path (Path): The path to write the file to.
+
+    Returns:
+        tuple[bytes, int]: The SHA-256 hash of the file content and its size in bytes.
+
+    Raises:
+        InvalidFileException: If the file is empty or exceeds the size limit.
+    """
+    file_hash = hashlib.sha256()
+    size = 0
+
+    await file.seek(0)
+    async with aiofiles.open(path, "wb") as out:
+        while chunk := await file.read(app_config.upload_chunk_size):
+            size += len(chunk)
+            if size > app_config.max_file_size:
+                # the declared size can not be trusted
+                raise InvalidFileException("File size exceeds the limit of 10 MB.")
+            file_hash.update(chunk)
+            await out.write(chunk)
+
+    if size == 0:
+        raise InvalidFileException("Empty file")
 
+    return file_hash.digest(), size
 
-def load_multiple_documents(from_dir: str):
-    """Loads multiple PDF documents from a specified directory.
+
+def _copy_to_disk(source: BinaryIO, path: Path) -> tuple[bytes, int]:
+    """Blocking counterpart of `_stream_to_disk` for binary streams.
 
     Args:
-        from_dir (str): The directory path from which to load PDF documents.
+        source (BinaryIO): The file content.
+        path (Path): The path to write the file to.
 
     Returns:
-        list[Document]: A list of loaded documents.
+        tuple[bytes, int]: The SHA-256 hash of the file content and its size in bytes.
 
     Raises:
-        NotImplementedError: This function is not yet implemented.
-    """
-    # TODO implement logic
-    raise NotImplementedError
-    loader = DirectoryLoader(
-        from_dir,
-        glob="*.pdf",
-        show_progress=True,
-        use_multithreading=True,
-        loader_cls=UnstructuredPDFLoader,
+        InvalidFileException: If the file is empty or exceeds the size limit.
+    """
+    file_hash = hashlib.sha256()
+    size = 0
+
+    with open(path, "wb") as out:
+        while chunk := source.read(app_config.upload_chunk_size):
+            size += len(chunk)
+            if size > app_config.max_file_size:
+                # the size declared by archives can not be trusted either
+                raise InvalidFileException("File size exceeds the limit of 10 MB.")
+            file_hash.update(chunk)
+            out.write(chunk)
+
+    if size == 0:
+        raise InvalidFileException("Empty file")
+
+    return file_hash.digest(), size
+
+
+def _is_zip(file: UploadFile) -> bool:
+    return file.content_type in ("application/zip", "application/x-zip-compressed") or (
+        file.filename or ""
+    ).lower().endswith(".zip")
+
+
+def _exceeds_bulk_size(file: UploadFile) -> bool:
+    return file.size is not None and file.size > app_config.max_bulk_upload_size
+
+
+def _count_pdf_files(file: UploadFile) -> int:
+    """Counts the results a zip archive adds to a bulk upload, without
+    storing anything. Blocking."""
+    if _exceeds_bulk_size(file):
+        return 1
+    try:
+        with zipfile.ZipFile(file.file) as zip_file:
+            return len(_pdf_members(zip_file))
+    except zipfile.BadZipFile:
+        return 1
+    finally:
+        file.file.seek(0)
+
+
+def _pdf_members(zip_file: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    return [
+        member
+        for member in zip_file.infolist()
+        if not member.is_dir()
+        and member.filename.lower().endswith(".pdf")
+        and not member.filename.startswith("__MACOSX/")
+    ]
+
+
+def _store_zip(archive: BinaryIO, archive_name: str) -> list[BulkUploadResult]:
+    """Stores the PDF files inside a zip archive one member at a time. Blocking.
+
+    Args:
+        archive (BinaryIO): The zip archive.
+        archive_name (str): The name of the archive, reported on errors.
+
+    Returns:
+        list[BulkUploadResult]: The outcome of each PDF file in the archive.
+
+    Raises:
+        InvalidFileException: If the archive holds more than `max_bulk_files`
+            PDF files.
+    """
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        return [_rejected(archive_name, "Uploaded file is not a valid zip archive.")]
+
+    with zip_file:
+        members = _pdf_members(zip_file)
+        if len(members) > app_config.max_bulk_files:
+            raise InvalidFileException(
+                f"Bulk uploads are limited to {app_config.max_bulk_files} files."
+            )
+
+        results = []
+        for member in members:
+            filename = os.path.basename(member.filename)
+            if member.file_size > app_config.max_file_size:
+                results.append(_rejected(filename, "File size exceeds the limit of 10 MB."))
+                continue
+            with zip_file.open(member) as source:
+                results.append(_store_result(filename, lambda: store_pdf_file(source)))
+        return results
+
+
+def _store_path(path: str) -> BulkUploadResult:
+    with open(path, "rb") as source:
+        return _store_result(os.path.basename(path), lambda: store_pdf_file(source))
+
+
+def _store_result(
+    filename: str, store: Callable[[], UploadedDocument]
+) -> BulkUploadResult:
+    try:
+        return _stored(filename, store())
+    except (InvalidFileException, FileExistsError) as e:
+        return _not_stored(filename, e)
+
+
+def _stored(filename: str, document: UploadedDocument) -> BulkUploadResult:
+    return BulkUploadResult(
+        filename=filename,
+        status=BulkUploadStatus.STORED,
+        pdf_id=document.document_id,
+        page_count=document.page_count,
+        size=document.size,
+    )
+
+
+def _not_stored(
+    filename: str, e: InvalidFileException | FileExistsError
+) -> BulkUploadResult:
+    if isinstance(e, FileExistsError):
+        return BulkUploadResult(
+            filename=filename, status=BulkUploadStatus.DUPLICATE, pdf_id=str(e)
+        )
+    return _rejected(filename, str(e))
+
+
+def _rejected(filename: str, error: str) -> BulkUploadResult:
+    return BulkUploadResult(
+        filename=filename, status=BulkUploadStatus.REJECTED, error=error
     )
-    documents = loader.load()
 
-    return documents
+
+def _check_pdf_structure(file_path: Path) -> int:
+    """Opens a PDF file to check its structure. Blocking.
+
+    Args:
+        file_path (Path): The path to the PDF file.
+
+    Returns:
+        int: The page count of the PDF file.
+
+    Raises:
+        InvalidFileException: If the file is not a valid PDF or has no pages.
+    """
+    try:
+        with fitz.open(file_path) as pdf_document:
+            is_pdf, page_count = pdf_document.is_pdf, pdf_document.page_count
+    except Exception as e:
+        logger.exception(e)
+        raise InvalidFileException("Uploaded file is not a valid PDF file.")
+
+    if not is_pdf:
+        raise InvalidFileException("Uploaded file is not a valid PDF file.")
+    if page_count == 0:
+        raise InvalidFileException("Uploaded file is not a valid PDF file (no pages).")
+
+    return page_count
 
 
 def load_document(file_path, file_uuid: str = ""):
-    """Loads a single PDF document and attaches metadata.
+    """Loads a single PDF document page by page and attaches metadata.
+    Pages without any text are skipped.
 
     Args:
         file_path (str): The path to the PDF file to load.
@@ -134,21 +463,84 @@ def load_document(file_path, file_uuid: str = ""):
             metadata to the chunk cache.
 
     Returns:
-        list[Document]: A list of loaded documents with metadata attached.
+        list[Document]: A list of loaded page documents with metadata attached.
     """
-    loader = UnstructuredPDFLoader(file_path, mode="single")
-    documents = loader.load()
+    page_texts = extract_pages(file_path)
+    return list(_page_documents(file_path, file_uuid, page_texts, len(page_texts)))
+
+
+def iter_document(file_path, file_uuid: str = "") -> Iterator[Document]:
+    """Loads a single PDF document lazily, one page at a time, like `load_document`.
+
+    Args:
+        file_path (str): The path to the PDF file to load.
+        file_uuid (str, optional): The UUID associated with the document.
+            Defaults to empty string.
 
+    Yields:
+        Document: The next page document with metadata attached.
+    """
     with fitz.open(file_path) as pdf:
-        num_pages = pdf.page_count
-        filename = os.path.basename(file_path)
+        page_count = pdf.page_count
+    yield from _page_documents(file_path, file_uuid, iter_pages(file_path), page_count)
+
+
+def iter_chunk_windows(
+    file_path, file_uuid: str = "", window_size: Optional[int] = None
+) -> Iterator[list[Document]]:
+    """Streams a PDF document page by page and yields its chunks in windows
+    of whole pages, so a window can be processed as soon as it is complete
+    and only one window is held in memory.
+
+    Args:
+        file_path (str): The path to the PDF file to load.
+        file_uuid (str, optional): The UUID associated with the document.
+            Defaults to empty string.
+        window_size (Optional[int], optional): Minimum number of chunks per
+            window, only the last window may be smaller. Defaults to
+            `ingestion_embedding_task_size`.
 
-    # Attach metadata to each document
-    for doc in documents:
-        doc.metadata = DocumentMetadata(
-            filename=filename, document_id=file_uuid, page_count=num_pages
-        ).model_dump()
-    return documents
+    Yields:
+        list[Document]: The chunks of the next pages, in document order.
+    """
+    window_size = window_size or app_config.ingestion_embedding_task_size
+    window, pages = [], []
+    for page in iter_document(file_path, file_uuid):
+        # pages are split on their own, so a window never splits a page
+        window.extend(text_splitter.split_documents([page]))
+        if pages is not None:
+            pages.append(page)
+        if len(window) >= window_size:
+            yield window
+            # the document spans several windows, too large to pass as a whole
+            window, pages = [], None
+    if window:
+        if pages is not None:
+            select_context_mode(pages, window)
+        yield window
+
+
+def _page_documents(
+    file_path, file_uuid: str, page_texts: Iterator[str], page_count: int
+) -> Iterator[Document]:
+    filename = os.path.basename(file_path)
+    for index, text in enumerate(page_texts):
+        if not text.strip():
+            continue
+
+        metadata = DocumentMetadata(
+            filename=filename, document_id=file_uuid, page_count=page_count
+        ).model_dump(mode="json")
+        metadata["page"] = index + 1
+        yield Document(page_content=text, metadata=metadata)
+
+
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=1000,
+    chunk_overlap=200,
+    length_function=len,
+    add_start_index=True,
+)
 
 
 def split_text(documents: list[Document]):
@@ -160,18 +552,108 @@ def split_text(documents: list[Document]):
     Returns:
         list[Document]: A list of text chunks.
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-        add_start_index=True,
-    )
     chunks = text_splitter.split_documents(documents)
 
     logger.debug(f"Split {len(documents)} documents into {len(chunks)} chunks.")
     return chunks
 
 
+def select_context_mode(pages: list[Document], chunks: list[Document]) -> ContextMode:
+    """Selects the context mode of a document from the size of its text, and
+    records it in the metadata of its chunks.
+
+    Args:
+        pages (list[Document]): Every page of the document.
+        chunks (list[Document]): Every chunk of the document.
+
+    Returns:
+        ContextMode: "full" if the text of the document fits
+        `full_context_max_tokens`, "retrieval" otherwise.
+    """
+    max_tokens = app_config.full_context_max_tokens
+    tokens = sum(estimate_tokens(page.page_content) for page in pages)
+    if max_tokens and tokens <= max_tokens:
+        mode = ContextMode.FULL
+    else:
+        mode = ContextMode.RETRIEVAL
+
+    for chunk in chunks:
+        chunk.metadata["context_mode"] = mode.value
+    logger.debug(f"selected the {mode.value} context mode for {tokens} tokens")
+    return mode
+
+
+def save_document_text(document_id: str, chunks: list[Document]) -> None:
+    """Stores the text of a document, rebuilt from its chunks, to be passed
+    to the LLM as a whole. The file is replaced atomically.
+
+    Args:
+        document_id (str): The ID of the document.
+        chunks (list[Document]): Every chunk of the document, with their
+            page and start index metadata.
+    """
+    os.makedirs(app_config.document_text_path, exist_ok=True)
+    path = _document_text_path(document_id)
+    temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(_join_chunks(chunks))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
+
+
+def load_document_text(document_id: str) -> Optional[str]:
+    """Loads the text of a document stored by `save_document_text`.
+
+    Args:
+        document_id (str): The ID of the document.
+
+    Returns:
+        Optional[str]: The text of the document, or None if it is not stored.
+    """
+    try:
+        with open(_document_text_path(document_id), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def delete_document_text(document_id: str) -> None:
+    """Deletes the stored text of a document, if any.
+
+    Args:
+        document_id (str): The ID of the document.
+    """
+    path = _document_text_path(document_id)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def _document_text_path(document_id: str) -> Path:
+    return app_config.document_text_path / f"{document_id}.txt"
+
+
+def _join_chunks(chunks: list[Document]) -> str:
+    """Rebuilds the text of the pages from their overlapping chunks, the
+    pages being separated by a blank line."""
+    pages: dict[int, str] = {}
+    for chunk in sorted(
+        chunks, key=lambda c: (c.metadata.get("page", 0), c.metadata.get("start_index", 0))
+    ):
+        page = chunk.metadata.get("page", 0)
+        start = chunk.metadata.get("start_index", 0)
+        text = pages.get(page, "")
+        if start >= len(text):
+            # the splitter strips the whitespace between chunks
+            text += " " * (start - len(text)) + chunk.page_content
+        else:
+            text += chunk.page_content[len(text) - start :]
+        pages[page] = text
+    return "\n\n".join(text.strip() for text in pages.values())
+
+
 def list_all():
     """Lists all PDF document IDs stored in the specified path.
 
@@ -1 +1,3 @@
 from .google_embeddings import gemini_embeddings
+from .batching import embed_documents_batched
+from .cached_embeddings import CachedEmbeddings
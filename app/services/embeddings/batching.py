@@ -0,0 +1,77 @@
+"""
+Module for embedding large numbers of texts in concurrent batches.
+
+Texts are split into fixed-size batches that are embedded over a bounded
+thread pool. Rate limit and server errors are retried with jittered
+exponential backoff, so a document's chunks are embedded in a fraction of
+the time a single sequential call would take without overrunning the quota.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from langchain_core.embeddings import Embeddings
+from app.config import app_config
+from app.utils.retry_utils import retry_with_backoff
+
+
+def embed_documents_batched(
+    texts: list[str],
+    embeddings: Embeddings,
+    batch_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> list[list[float]]:
+    """Embeds texts in concurrent batches, retrying 429 and 5xx errors.
+
+    Args:
+        texts (list[str]): The texts to embed.
+        embeddings (Embeddings): The embedding model.
+        batch_size (Optional[int], optional): Number of texts per request.
+            Defaults to `embedding_batch_size` from the config.
+        max_concurrency (Optional[int], optional): Maximum number of requests
+            in flight. Defaults to `embedding_max_concurrency` from the config.
+        on_progress (Optional[Callable[[int], None]], optional): Called with
+            the number of embedded texts after each finished batch.
+
+    Returns:
+        list[list[float]]: The vectors, in the same order as the texts.
+
+    Raises:
+        Exception: The error of the first batch that could not be embedded.
+            Batches that have not started yet are cancelled.
+    """
+    batch_size = batch_size or app_config.embedding_batch_size
+    max_concurrency = max_concurrency or app_config.embedding_max_concurrency
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    done = 0
+    lock = threading.Lock()
+
+    def embed_batch(batch: list[str]) -> list[list[float]]:
+        nonlocal done
+        vectors = retry_with_backoff(
+            lambda: embeddings.embed_documents(batch),
+            max_retries=app_config.embedding_max_retries,
+            base_delay=app_config.embedding_backoff_base,
+            max_delay=app_config.embedding_backoff_max,
+        )
+        with lock:
+            done += len(batch)
+            if on_progress:
+                on_progress(done)
+        return vectors
+
+    if len(batches) <= 1 or max_concurrency <= 1:
+        return [vector for batch in batches for vector in embed_batch(batch)]
+
+    pool = ThreadPoolExecutor(
+        max_workers=min(max_concurrency, len(batches)),
+        thread_name_prefix="embedding",
+    )
+    try:
+        futures = [pool.submit(embed_batch, batch) for batch in batches]
+        return [vector for future in futures for vector in future.result()]
+    finally:
+        # stop queued batches early if one of them failed
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,224 @@
+"""
+Module for caching embeddings by content.
+
+Vectors are keyed by a hash of the embedding model name and the embedded
+text, so the same chunk or query is only sent to the embedding API once,
+regardless of which document or user it came from. Vectors are stored
+compactly as float32 bytes in a local disk tier, and optionally in a shared
+Redis tier so that all API and worker containers can reuse them.
+
+Caching is best effort: disk and Redis errors are logged and treated as
+cache misses.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from array import array
+from pathlib import Path
+from typing import Optional
+from langchain_core.embeddings import Embeddings
+from redis.exceptions import RedisError
+from app.connection import sync_redis
+from app.utils.logger import logger
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    """Generates the cache key of a text embedded with a model.
+
+    Args:
+        model (str): The name of the embedding model.
+        text (str): The embedded text.
+
+    Returns:
+        str: The hex digest of the SHA-256 hash of the model name and text.
+    """
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: list[float]) -> bytes:
+    """Packs a vector into float32 bytes."""
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> list[float]:
+    """Unpacks float32 bytes into a vector."""
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves previously embedded texts from a cache.
+
+    Lookups go through the disk tier first, then the Redis tier. Redis hits are
+    copied to the disk tier, and freshly embedded texts are written to both.
+
+    Attributes:
+        embeddings (Embeddings): The wrapped embedding model.
+        model (str): The model name used in cache keys.
+        cache_dir (Path): Directory of the disk tier.
+        redis_conn (Optional[sync_redis.Redis]): Connection of the Redis tier,
+            None to disable it.
+        redis_ttl (Optional[int]): Expiry of the Redis entries in seconds.
+        hits (int): Number of texts served from the cache.
+        misses (int): Number of texts sent to the embedding model.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache_dir: str | Path,
+        model: Optional[str] = None,
+        redis_conn: Optional[sync_redis.Redis] = None,
+        redis_ttl: Optional[int] = None,
+    ):
+        """Initializes the cached embeddings.
+
+        Args:
+            embeddings (Embeddings): The embedding model to wrap.
+            cache_dir (str | Path): Directory of the disk tier.
+            model (Optional[str], optional): The model name used in cache keys.
+                Defaults to the `model` attribute of the wrapped embeddings.
+            redis_conn (Optional[sync_redis.Redis], optional): Connection of the
+                Redis tier. Defaults to None, disabling the Redis tier.
+            redis_ttl (Optional[int], optional): Expiry of the Redis entries in
+                seconds. Defaults to None, no expiry.
+        """
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.cache_dir = Path(cache_dir)
+        self.redis_conn = redis_conn
+        self.redis_ttl = redis_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embeds texts, only sending the uncached ones to the embedding model.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: The vectors, in the same order as the texts.
+        """
+        keys = [embedding_cache_key(self.model, text) for text in texts]
+        vectors = self._load(keys)
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # the same text can appear more than once, embed it once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            embedded = dict(zip(unique, self.embeddings.embed_documents(unique)))
+            self._save({embedding_cache_key(self.model, t): v for t, v in embedded.items()})
+            for i in missing:
+                vectors[i] = embedded[texts[i]]
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embeds a query, serving it from the cache if it was embedded before.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            list[float]: The vector of the query.
+        """
+        # queries use a different task type than documents for some models
+        key = embedding_cache_key(f"{self.model}:query", text)
+        vector = self._load([key])[0]
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._save({key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        """Returns the cache counters.
+
+        Returns:
+            dict: Hits, misses and the hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _load(self, keys: list[str]) -> list[Optional[list[float]]]:
+        vectors = [self._load_from_disk(key) for key in keys]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing and self.redis_conn is not None:
+            try:
+                values = self.redis_conn.mget([_redis_key(keys[i]) for i in missing])
+            except RedisError as e:
+                logger.warning(f"Could not load embeddings from Redis: {e}")
+                values = [None] * len(missing)
+
+            for i, value in zip(missing, values):
+                if value is not None:
+                    vectors[i] = unpack_vector(value)
+                    self._save_to_disk(keys[i], value)
+        return vectors
+
+    def _save(self, vectors: dict[str, list[float]]) -> None:
+        packed = {key: pack_vector(vector) for key, vector in vectors.items()}
+        for key, data in packed.items():
+            self._save_to_disk(key, data)
+
+        if self.redis_conn is not None:
+            try:
+                with self.redis_conn.pipeline(transaction=False) as pipe:
+                    for key, data in packed.items():
+                        pipe.set(_redis_key(key), data, ex=self.redis_ttl)
+                    pipe.execute()
+            except RedisError as e:
+                logger.warning(f"Could not save embeddings to Redis: {e}")
+
+    def _disk_path(self, key: str) -> Path:
+        # shard by the key prefix to keep directories small
+        return self.cache_dir / key[:2] / f"{key}.f32"
+
+    def _load_from_disk(self, key: str) -> Optional[list[float]]:
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return unpack_vector(f.read())
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not load embedding {key} from disk: {e}")
+            return None
+
+    def _save_to_disk(self, key: str, data: bytes) -> None:
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.part")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            # atomic, concurrent readers never see partial vectors
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save embedding {key} to disk: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _redis_key(key: str) -> str:
+    return f"embedding:{key}"
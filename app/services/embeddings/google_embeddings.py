@@ -4,16 +4,29 @@ Module for initializing embeddings using Google Generative AI.
 This module sets up embeddings using the Google Generative AI Embeddings 
 from the LangChain library. It leverages the provided Google API key 
 from the environment configuration to access the specified model for 
-generating embeddings.
+generating embeddings. Unless disabled, the embeddings are wrapped in a
+content-addressed cache.
 
 Embeddings Instance:
 - gemini_embeddings: An instance of GoogleGenerativeAIEmbeddings configured 
-  with the model and API key.
+  with the model and API key, wrapped in CachedEmbeddings if enabled.
 """
 
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from app.config import env_config
+from app.config import env_config, app_config
+from app.connection import sync_redis_connection
+from .cached_embeddings import CachedEmbeddings
 
 gemini_embeddings = GoogleGenerativeAIEmbeddings(
     model="models/embedding-001", google_api_key=env_config.google_api_key
 )
+
+if app_config.embedding_cache_enabled:
+    gemini_embeddings = CachedEmbeddings(
+        gemini_embeddings,
+        cache_dir=app_config.embedding_cache_path,
+        redis_conn=(
+            sync_redis_connection if app_config.embedding_cache_redis else None
+        ),
+        redis_ttl=app_config.embedding_cache_expiry,
+    )
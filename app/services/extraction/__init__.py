@@ -0,0 +1,133 @@
+"""
+Module for extracting per-page text from PDF files with pluggable engines.
+
+Engines:
+- pymupdf: Reads the text layer with PyMuPDF, in parallel for large documents,
+  also when the pages are iterated.
+  Pages without a text layer fall back to Unstructured.
+- unstructured: Runs Unstructured on the whole document.
+
+The engine is selected with `extraction_engine` in app/config.py. Documents
+are extracted whole with `extract_pages`, or lazily page by page with
+`iter_pages`.
+"""
+
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+import fitz
+from app.config import app_config
+from app.utils.logger import logger
+from . import pymupdf_extraction, unstructured_extraction
+
+
+def extract_with_pymupdf(file_path: str | Path) -> list[str]:
+    """Extracts page texts with PyMuPDF, using Unstructured only for the
+    pages without a text layer.
+
+    Args:
+        file_path (str | Path): The path to the PDF file.
+
+    Returns:
+        list[str]: The text of each page, indexed by page number starting from 0.
+    """
+    texts = pymupdf_extraction.extract_pages(
+        file_path,
+        parallel_min_pages=app_config.extraction_parallel_min_pages,
+        workers=app_config.extraction_workers,
+    )
+
+    empty_pages = [i for i, text in enumerate(texts) if _is_empty(text)]
+    if empty_pages:
+        logger.debug(f"{len(empty_pages)} pages without a text layer, using fallback")
+        for i, text in _extract_fallback(file_path, empty_pages).items():
+            texts[i] = text
+
+    return texts
+
+
+def _is_empty(text: str) -> bool:
+    return len(text.strip()) < app_config.extraction_min_page_chars
+
+
+def _extract_fallback(file_path: str | Path, pages: list[int]) -> dict[int, str]:
+    try:
+        return unstructured_extraction.extract_pages(file_path, pages)
+    except Exception as e:
+        # a missing OCR dependency should not fail the whole document
+        logger.warning(f"Fallback extraction failed, skipping the pages: {e}")
+        return {}
+
+
+def extract_with_unstructured(file_path: str | Path) -> list[str]:
+    """Extracts page texts with Unstructured.
+
+    Args:
+        file_path (str | Path): The path to the PDF file.
+
+    Returns:
+        list[str]: The text of each page, indexed by page number starting from 0.
+    """
+    texts = unstructured_extraction.extract_pages(file_path)
+    with fitz.open(file_path) as pdf:
+        page_count = pdf.page_count
+    return [texts.get(i, "") for i in range(page_count)]
+
+
+EXTRACTION_ENGINES: dict[str, Callable[[str | Path], list[str]]] = {
+    "pymupdf": extract_with_pymupdf,
+    "unstructured": extract_with_unstructured,
+}
+
+
+def iter_pages(file_path: str | Path, engine: Optional[str] = None) -> Iterator[str]:
+    """Extracts the text of a PDF file lazily, one page at a time, so only a
+    few pages are held in memory. The pymupdf engine extracts large documents
+    a few page ranges at a time over a process pool, like `extract_pages`,
+    using the Unstructured fallback per page without a text layer. Other
+    engines extract the whole document first.
+
+    Args:
+        file_path (str | Path): The path to the PDF file.
+        engine (Optional[str], optional): The extraction engine to use.
+            Defaults to None, which uses `extraction_engine` from the config.
+
+    Yields:
+        str: The text of the next page, in page order.
+
+    Raises:
+        ValueError: If the engine is unknown.
+    """
+    engine = engine or app_config.extraction_engine
+    if engine != "pymupdf":
+        yield from extract_pages(file_path, engine)
+        return
+
+    texts = pymupdf_extraction.iter_pages(
+        file_path,
+        parallel_min_pages=app_config.extraction_parallel_min_pages,
+        workers=app_config.extraction_workers,
+    )
+    for i, text in enumerate(texts):
+        if _is_empty(text):
+            text = _extract_fallback(file_path, [i]).get(i, text)
+        yield text
+
+
+def extract_pages(file_path: str | Path, engine: Optional[str] = None) -> list[str]:
+    """Extracts the text of every page of a PDF file.
+
+    Args:
+        file_path (str | Path): The path to the PDF file.
+        engine (Optional[str], optional): The extraction engine to use.
+            Defaults to None, which uses `extraction_engine` from the config.
+
+    Returns:
+        list[str]: The text of each page, indexed by page number starting from 0.
+
+    Raises:
+        ValueError: If the engine is unknown.
+    """
+    engine = engine or app_config.extraction_engine
+    if engine not in EXTRACTION_ENGINES:
+        raise ValueError(f"Unknown extraction engine: {engine}")
+    return EXTRACTION_ENGINES[engine](file_path)
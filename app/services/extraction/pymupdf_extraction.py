@@ -0,0 +1,147 @@
+"""
+Module for extracting text from PDF files using PyMuPDF.
+
+Text is extracted page by page from the text layer of the document, which is
+much faster than layout analysis. Large documents are split into contiguous
+page ranges that are extracted in parallel over a process pool. When pages
+are iterated, the ranges are extracted a few at a time and yielded in order,
+so only the ranges in flight are held in memory.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+import fitz
+from app.utils.logger import logger
+
+# pages per range when iterating over a process pool
+ITER_RANGE_PAGES = 25
+
+
+def extract_page_range(file_path: str | Path, start: int, stop: int) -> list[str]:
+    """Extracts the text layer of a range of pages.
+
+    Args:
+        file_path (str | Path): The path to the PDF file.
+        start (int): Index of the first page to extract.
+        stop (int): Index after the last page to extract.
+
+    Returns:
+        list[str]: The text of each page in the range.
+    """
+    with fitz.open(file_path) as pdf:
+        return [pdf[i].get_text() for i in range(start, stop)]
+
+
+def iter_pages(
+    file_path: str | Path,
+    parallel_min_pages: int = 0,
+    workers: int = 1,
+    range_pages: int = ITER_RANGE_PAGES,
+) -> Iterator[str]:
+    """Extracts the text layer of a PDF file lazily, in page order. Large
+    documents are extracted over a process pool, with one range of
+    `range_pages` pages in flight per worker, otherwise one page at a time.
+
+    Args:
+        file_path (str | Path): The path to the PDF file.
+        parallel_min_pages (int, optional): Documents with at least this many
+            pages are extracted over a process pool. 0 disables parallelism.
+        workers (int, optional): Number of worker processes, capped at the
+            number of available CPUs.
+        range_pages (int, optional): Number of pages extracted per task of
+            the process pool.
+
+    Yields:
+        str: The text of the next page.
+    """
+    with fitz.open(file_path) as pdf:
+        page_count = pdf.page_count
+
+    workers = min(workers, os.cpu_count() or 1)
+    if workers <= 1 or not parallel_min_pages or page_count < parallel_min_pages:
+        yield from _iter_page_range(file_path, 0, page_count)
+        return
+
+    ranges = (
+        (i, min(i + range_pages, page_count)) for i in range(0, page_count, range_pages)
+    )
+    next_page = 0
+    try:
+        with _process_pool(workers) as pool:
+            pending = deque(
+                pool.submit(extract_page_range, file_path, start, stop)
+                for start, stop in islice(ranges, workers)
+            )
+            while pending:
+                texts = pending.popleft().result()
+                # keep every worker busy while the pages are consumed
+                next_range = next(ranges, None)
+                if next_range:
+                    pending.append(pool.submit(extract_page_range, file_path, *next_range))
+                for text in texts:
+                    yield text
+                    next_page += 1
+    except (AssertionError, OSError) as e:
+        # daemonic processes (e.g. celery prefork workers) can not have children
+        logger.warning(f"Parallel extraction unavailable, extracting sequentially: {e}")
+        yield from _iter_page_range(file_path, next_page, page_count)
+
+
+def _iter_page_range(file_path: str | Path, start: int, stop: int) -> Iterator[str]:
+    with fitz.open(file_path) as pdf:
+        for i in range(start, stop):
+            yield pdf[i].get_text()
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        # spawn, as forking a multithreaded process (e.g. a celery thread
+        # pool worker) can deadlock
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def extract_pages(
+    file_path: str | Path, parallel_min_pages: int = 0, workers: int = 1
+) -> list[str]:
+    """Extracts the text layer of every page of a PDF file.
+
+    Args:
+        file_path (str | Path): The path to the PDF file.
+        parallel_min_pages (int, optional): Documents with at least this many
+            pages are extracted over a process pool. 0 disables parallelism.
+        workers (int, optional): Number of worker processes, capped at the
+            number of available CPUs.
+
+    Returns:
+        list[str]: The text of each page, indexed by page number starting from 0.
+    """
+    with fitz.open(file_path) as pdf:
+        page_count = pdf.page_count
+
+    workers = min(workers, os.cpu_count() or 1)
+    if workers <= 1 or not parallel_min_pages or page_count < parallel_min_pages:
+        return extract_page_range(file_path, 0, page_count)
+
+    # contiguous ranges keep the number of times the file is opened low
+    step = -(-page_count // workers)
+    ranges = [(i, min(i + step, page_count)) for i in range(0, page_count, step)]
+
+    try:
+        with _process_pool(len(ranges)) as pool:
+            results = pool.map(
+                extract_page_range,
+                [file_path] * len(ranges),
+                *zip(*ranges),
+            )
+            return [text for texts in results for text in texts]
+    except (AssertionError, OSError) as e:
+        # daemonic processes (e.g. celery prefork workers) can not have children
+        logger.warning(f"Parallel extraction unavailable, extracting sequentially: {e}")
+        return extract_page_range(file_path, 0, page_count)
@@ -0,0 +1,50 @@
+"""
+Module for extracting text from PDF files using Unstructured.
+
+Unstructured runs layout analysis and OCR, so it can read pages without a
+text layer (e.g. scanned pages), at a much higher cost than reading the
+text layer directly.
+"""
+
+import tempfile
+from pathlib import Path
+from typing import Optional
+import fitz
+
+
+def extract_pages(
+    file_path: str | Path, pages: Optional[list[int]] = None
+) -> dict[int, str]:
+    """Extracts the text of the given pages of a PDF file.
+
+    Args:
+        file_path (str | Path): The path to the PDF file.
+        pages (Optional[list[int]], optional): Indexes of the pages to extract,
+            starting from 0. Defaults to None, which extracts every page.
+
+    Returns:
+        dict[int, str]: The text of each extracted page, keyed by page index.
+    """
+    # imported lazily, as it is slow to import and only needed as a fallback
+    from langchain_community.document_loaders import UnstructuredPDFLoader
+
+    if pages is None:
+        documents = UnstructuredPDFLoader(str(file_path), mode="paged").load()
+        texts = {}
+        for doc in documents:
+            index = doc.metadata.get("page_number", 1) - 1
+            texts[index] = texts.get(index, "") + doc.page_content
+        return texts
+
+    texts = {}
+    with fitz.open(file_path) as pdf, tempfile.TemporaryDirectory() as tmp_dir:
+        for index in pages:
+            # run unstructured on a single page document to skip the other pages
+            page_path = Path(tmp_dir) / f"{index}.pdf"
+            with fitz.open() as page_pdf:
+                page_pdf.insert_pdf(pdf, from_page=index, to_page=index)
+                page_pdf.save(page_path)
+
+            documents = UnstructuredPDFLoader(str(page_path), mode="single").load()
+            texts[index] = "\n\n".join(doc.page_content for doc in documents)
+    return texts
@@ -1,54 +1,82 @@
 """
 Module for managing chat history for the PDF documents.
 
-This module provides functions to load, save, and delete chat history 
+This module provides functions to load, append to, and delete chat history
 associated with specific PDF documents and the user ID. If no user
-ID is provided, default user will be assumed. The storage of chat history
-is handled in JSON format.
+ID is provided, default user will be assumed.
+
+The history of a conversation is stored append-only as JSON lines, one
+record per turn, next to an index of the byte offset of every record. A turn
+is saved with a single append to each file, and the last turns are loaded by
+seeking to their offset, so the cost of a turn does not grow with the length
+of the conversation. Appends are serialized per conversation by an asyncio
+lock within a process and a file lock across processes. Async variants run
+the file I/O in the blocking thread pool, off the event loop.
+
+Histories saved by earlier versions as a single JSON list are still read,
+and are converted to JSON lines on their first append.
+
+The rolling summary of the turns which no longer fit the prompt is stored
+next to the history, with the number of turns it covers, see
+app/services/summary_service.py.
 """
 
-import os
+import asyncio
 import json
+import os
+import struct
+import uuid
+import weakref
 from pathlib import Path
 from typing import Optional, List, Tuple
 from app.config import app_config
+from app.utils.async_utils import run_blocking
+from app.utils.file_utils import lock_file
 from app.utils.logger import logger
+from app.utils.parse_utils import estimate_tokens
 
+RECORDS_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx"
+SUMMARY_SUFFIX = ".summary"
+# byte offset of a record in the index, unsigned 64-bit little-endian
+_OFFSET = struct.Struct("<Q")
 
-def load_history(pdf_id: str, user_id: str = None) -> List[Optional[Tuple]]:
+# appends in progress per conversation, released once no request holds them
+_append_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def load_history(
+    pdf_id: str,
+    user_id: str = None,
+    max_turns: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> List[Optional[Tuple]]:
     """Loads the chat history for a given PDF document and user.
 
     Args:
         pdf_id (str): The ID of the PDF document for which to load history.
         user_id (str, optional): The ID of the user associated with the history.
+        max_turns (Optional[int], optional): Maximum number of most recent turns
+            to load. Defaults to None, loading every turn.
+        token_budget (Optional[int], optional): Maximum estimated number of
+            tokens of the loaded turns. The most recent turns fitting the budget
+            are loaded. Defaults to None, without limit.
 
     Returns:
         List[Optional[Tuple]]: A list of tuples representing the chat history,
+        starting with the system prompt and ending with the input placeholder,
         or an empty list if no history exists.
     """
     history_path = _get_history_path(pdf_id, user_id)
     logger.debug(f"attempting to load the chat history: {history_path}")
 
-    try:
-        with open(history_path, "r") as file:
-            content = json.load(file)
-
-            if not (content or len(content) > 0):
-                return []
-
-            # Convert lists to tuples
-            content = [tuple(entry) for entry in content]
-
-            # Update the system prompt if necessary
-            old_system_prompt = content[0][1]
-            system_prompt = app_config.default_history[0][1]
-
-            if old_system_prompt != system_prompt:
-                # Can not update tuples, replace instead
-                content[0] = tuple(app_config.default_history[0])
-                logger.debug("system prompt has been updated")
+    if max_turns == 0:
+        return []
 
-            return content
+    try:
+        turns = _load_turns(history_path, -max_turns if max_turns else 0)
     except FileNotFoundError:
         logger.warning(f"Chat history file not found: {history_path}")
         return []
@@ -58,25 +86,167 @@ def load_history(pdf_id: str, user_id: str = None) -> List[Optional[Tuple]]:
         )
         raise Exception(e)
 
+    if token_budget is not None:
+        turns = _fit_budget(turns, token_budget)
+    return _build_history(turns)
+
+
+async def aload_history(
+    pdf_id: str,
+    user_id: str = None,
+    max_turns: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> List[Optional[Tuple]]:
+    """Asynchronously loads the chat history for a given PDF document and user.
+
+    Args:
+        pdf_id (str): The ID of the PDF document for which to load history.
+        user_id (str, optional): The ID of the user associated with the history.
+        max_turns (Optional[int], optional): Maximum number of most recent turns
+            to load. Defaults to None, loading every turn.
+        token_budget (Optional[int], optional): Maximum estimated number of
+            tokens of the loaded turns. Defaults to None, without limit.
+
+    Returns:
+        List[Optional[Tuple]]: A list of tuples representing the chat history,
+        or an empty list if no history exists.
+    """
+    return await run_blocking(load_history, pdf_id, user_id, max_turns, token_budget)
+
+
+def load_turns(
+    pdf_id: str, user_id: str = None, start: int = 0, stop: Optional[int] = None
+) -> List[Tuple[str, str]]:
+    """Loads a range of turns of the chat history for a given PDF document
+    and user.
+
+    Args:
+        pdf_id (str): The ID of the PDF document of the conversation.
+        user_id (str, optional): The ID of the user associated with the history.
+        start (int, optional): Index of the first turn. Defaults to 0.
+        stop (Optional[int], optional): Index following the last turn.
+            Defaults to None, up to the last turn.
+
+    Returns:
+        List[Tuple[str, str]]: The queries and answers of the turns, oldest first.
+    """
+    try:
+        return _load_turns(_get_history_path(pdf_id, user_id), start, stop)
+    except FileNotFoundError:
+        return []
+
+
+def count_turns(pdf_id: str, user_id: str = None) -> int:
+    """Returns the number of turns of the chat history for a given PDF
+    document and user, from the size of its offset index.
+
+    Args:
+        pdf_id (str): The ID of the PDF document of the conversation.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        int: The number of turns, 0 if no history exists.
+    """
+    history_path = _get_history_path(pdf_id, user_id)
+    index_path = history_path.with_name(history_path.name + INDEX_SUFFIX)
+    try:
+        return os.path.getsize(index_path) // _OFFSET.size
+    except FileNotFoundError:
+        return len(load_turns(pdf_id, user_id))
+
+
+def load_summary(pdf_id: str, user_id: str = None) -> Tuple[str, int]:
+    """Loads the rolling summary of the chat history for a given PDF
+    document and user.
+
+    Args:
+        pdf_id (str): The ID of the PDF document of the conversation.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        Tuple[str, int]: The summary and the number of oldest turns it covers,
+        or an empty summary covering no turns.
+    """
+    history_path = _get_history_path(pdf_id, user_id)
+    summary_path = history_path.with_name(history_path.name + SUMMARY_SUFFIX)
+    try:
+        with open(summary_path, "r") as file:
+            content = json.load(file)
+    except FileNotFoundError:
+        return "", 0
+    return content["summary"], content["turns"]
+
+
+def save_summary(pdf_id: str, summary: str, turns: int, user_id: str = None) -> bool:
+    """Saves the rolling summary of the chat history for a given PDF document
+    and user, unless the saved summary already covers as many turns.
+
+    Args:
+        pdf_id (str): The ID of the PDF document of the conversation.
+        summary (str): The summary of the oldest turns.
+        turns (int): The number of oldest turns covered by the summary.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        bool: True if the summary was saved.
+    """
+    if load_summary(pdf_id, user_id)[1] >= turns:
+        # a concurrent refresh got there first
+        return False
+
+    history_path = _get_history_path(pdf_id, user_id)
+    summary_path = history_path.with_name(history_path.name + SUMMARY_SUFFIX)
+    logger.debug(f"saving the chat history summary to: {summary_path}")
+
+    # swap the summary in atomically, readers never see a partial file
+    tmp_path = f"{summary_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump({"summary": summary, "turns": turns}, file)
+    os.replace(tmp_path, summary_path)
+    return True
 
-def save_history(pdf_id: str, history: List[Tuple], user_id: str = None):
-    """Saves the chat history for a given PDF document and user.
+
+def append_turn(pdf_id: str, query: str, answer: str, user_id: str = None):
+    """Appends a turn to the chat history for a given PDF document and user.
 
     Args:
-        pdf_id (str): The ID of the PDF document for which to save history.
-        history (List[Tuple]): The chat history to save.
+        pdf_id (str): The ID of the PDF document of the conversation.
+        query (str): The user's message.
+        answer (str): The answer to the message.
         user_id (str, optional): The ID of the user associated with the history.
 
     Returns:
         None: This function does not return any value.
     """
     history_path = _get_history_path(pdf_id, user_id)
-    logger.debug(f"saving the chat history to: {history_path}")
+    logger.debug(f"appending a turn to the chat history: {history_path}")
+
+    records_path = history_path.with_name(history_path.name + RECORDS_SUFFIX)
+    with open(records_path, "ab") as records:
+        # serializes appends of every process, the file is never replaced
+        with lock_file(records):
+            offset = os.fstat(records.fileno()).st_size
+            if offset == 0 and os.path.isfile(history_path):
+                offset = _migrate_legacy(history_path, records)
+            _append_record(records, history_path, offset, query, answer)
 
-    # Convert tuples back to lists for JSON serialization
-    history_as_lists = [list(entry) for entry in history]
-    with open(history_path, "w") as file:
-        json.dump(history_as_lists, file)
+
+async def aappend_turn(pdf_id: str, query: str, answer: str, user_id: str = None):
+    """Asynchronously appends a turn to the chat history for a given PDF
+    document and user. Concurrent appends to the same conversation are
+    applied one at a time.
+
+    Args:
+        pdf_id (str): The ID of the PDF document of the conversation.
+        query (str): The user's message.
+        answer (str): The answer to the message.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        None: This function does not return any value.
+    """
+    async with _append_lock(pdf_id, user_id):
+        await run_blocking(append_turn, pdf_id, query, answer, user_id)
 
 
 def delete_history(pdf_id: str, user_id: str = None):
@@ -91,13 +261,187 @@ def delete_history(pdf_id: str, user_id: str = None):
     """
     history_path = _get_history_path(pdf_id, user_id)
 
-    if os.path.isfile(history_path):
-        logger.debug(f"deleting the chat history from: {history_path}")
-        os.remove(history_path)
+    for path in (
+        history_path.with_name(history_path.name + RECORDS_SUFFIX),
+        history_path.with_name(history_path.name + INDEX_SUFFIX),
+        history_path.with_name(history_path.name + SUMMARY_SUFFIX),
+        history_path,
+    ):
+        if os.path.isfile(path):
+            logger.debug(f"deleting the chat history from: {path}")
+            os.remove(path)
+
+
+async def adelete_history(pdf_id: str, user_id: str = None):
+    """Asynchronously deletes the chat history for a given PDF document and
+    user, after any append to the conversation in progress.
+
+    Args:
+        pdf_id (str): The ID of the PDF document for which to delete history.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        None: This function does not return any value.
+    """
+    async with _append_lock(pdf_id, user_id):
+        await run_blocking(delete_history, pdf_id, user_id)
+
+
+def _append_lock(pdf_id: str, user_id: str = None) -> asyncio.Lock:
+    key = str(_get_history_path(pdf_id, user_id))
+    lock = _append_locks.get(key)
+    if lock is None:
+        lock = _append_locks.setdefault(key, asyncio.Lock())
+    return lock
+
+
+def _load_turns(
+    history_path: Path, start: int = 0, stop: Optional[int] = None
+) -> List[Tuple[str, str]]:
+    """Loads the turns from `start` to `stop` of a JSON lines history, or of
+    a history saved as a single JSON list. A negative `start` loads the last
+    `-start` turns, and `stop` is then ignored.
+
+    Raises:
+        FileNotFoundError: If no history exists.
+    """
+    turns = _read_turns(history_path, start)
+    if turns is None:
+        turns = _read_legacy_turns(history_path)
+        return turns[start:] if start < 0 else turns[start:stop]
+    if start < 0:
+        # records appended after the index was read are included as well
+        return turns[max(len(turns) + start, 0) :]
+    return turns[: stop - start] if stop is not None else turns
+
+
+def _read_turns(history_path: Path, start: int = 0) -> Optional[List[Tuple[str, str]]]:
+    """Reads the turns of a JSON lines history from the `start` record,
+    seeking to it through the offset index.
+
+    Returns:
+        Optional[List[Tuple[str, str]]]: The queries and answers, oldest first,
+        or None if the conversation has no JSON lines history.
+    """
+    records_path = history_path.with_name(history_path.name + RECORDS_SUFFIX)
+    try:
+        records = open(records_path, "rb")
+    except FileNotFoundError:
+        return None
+
+    with records:
+        if start:
+            records.seek(_record_offset(history_path, start))
+        lines = records.read().splitlines()
+
+    turns = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # a record being appended concurrently
+            continue
+        turns.append((record["human"], record["ai"]))
+    return turns
+
+
+def _record_offset(history_path: Path, position: int) -> int:
+    """Returns the byte offset of a record, counted from the end if the
+    position is negative, or 0 if it precedes the first record or the
+    conversation has no index."""
+    index_path = history_path.with_name(history_path.name + INDEX_SUFFIX)
+    try:
+        with open(index_path, "rb") as index:
+            count = os.fstat(index.fileno()).st_size // _OFFSET.size
+            if position < 0:
+                position += count
+            if position <= 0:
+                return 0
+            if position >= count:
+                return os.path.getsize(history_path.with_name(history_path.name + RECORDS_SUFFIX))
+            index.seek(position * _OFFSET.size)
+            return _OFFSET.unpack(index.read(_OFFSET.size))[0]
+    except FileNotFoundError:
+        return 0
+
+
+def _fit_budget(turns: List[Tuple[str, str]], token_budget: int) -> List[Tuple[str, str]]:
+    """Returns the most recent turns whose estimated tokens fit the budget."""
+    used = 0
+    for position in range(len(turns) - 1, -1, -1):
+        used += sum(estimate_tokens(message) for message in turns[position])
+        if used > token_budget:
+            return turns[position + 1 :]
+    return turns
+
+
+def _append_record(records, history_path: Path, offset: int, query: str, answer: str) -> int:
+    """Appends a turn to the open records file and its offset to the index.
+
+    Returns:
+        int: The offset following the appended record.
+    """
+    line = (json.dumps({"human": query, "ai": answer}) + "\n").encode("utf-8")
+    records.write(line)
+    records.flush()
+
+    index_path = history_path.with_name(history_path.name + INDEX_SUFFIX)
+    with open(index_path, "ab") as index:
+        index.write(_OFFSET.pack(offset))
+    return offset + len(line)
+
+
+def _read_legacy_turns(history_path: Path) -> List[Tuple[str, str]]:
+    """Reads the turns of a history saved as a single JSON list of
+    (role, message) entries."""
+    with open(history_path, "r") as file:
+        content = json.load(file)
+
+    turns = []
+    for (role, message), (next_role, next_message) in zip(content, content[1:]):
+        if role == "human" and next_role == "ai":
+            turns.append((message, next_message))
+    return turns
+
+
+def _migrate_legacy(history_path: Path, records) -> int:
+    """Converts a JSON list history to the open, empty records file.
+
+    Returns:
+        int: The offset following the converted records.
+    """
+    offset = 0
+    for query, answer in _read_legacy_turns(history_path):
+        offset = _append_record(records, history_path, offset, query, answer)
+    os.remove(history_path)
+    logger.debug(f"converted the chat history to JSON lines: {history_path}")
+    return offset
+
+
+def _build_history(turns: List[Tuple[str, str]]) -> List[Optional[Tuple]]:
+    """Builds the chat history passed to the chain from the turns, with the
+    current system prompt and greeting, followed by the input placeholder.
+
+    Args:
+        turns (List[Tuple[str, str]]): The queries and answers, oldest first.
+
+    Returns:
+        List[Optional[Tuple]]: A list of tuples representing the chat history,
+        or an empty list if there are no turns.
+    """
+    if not turns:
+        return []
+
+    system_prompt, greeting = app_config.default_history[:2]
+    history = [tuple(system_prompt), tuple(greeting)]
+    for query, answer in turns:
+        history.extend([("human", query), ("ai", answer)])
+    history.append(("human", "{input}"))
+    return history
 
 
-def _get_history_path(pdf_id: str, user_id: str = None) -> str:
-    """Constructs the file path for the chat history. Default
+def _get_history_path(pdf_id: str, user_id: str = None) -> Path:
+    """Constructs the base file path for the chat history. Default
     path format is {user_id}_{file_uuid}. If user ID is not provided,
     assumes default history: {file_uuid}
 
@@ -106,7 +450,8 @@ def _get_history_path(pdf_id: str, user_id: str = None) -> str:
         user_id (str, optional): The ID of the user associated with the history.
 
     Returns:
-        str: The file path for the chat history.
+        Path: The base file path for the chat history, also the path of
+        histories saved as a single JSON list.
     """
     file_prefix = f"{user_id}_" if user_id else ""
     return app_config.history_path / Path(file_prefix + pdf_id)
@@ -0,0 +1,52 @@
+"""
+Module for managing the lexical (BM25) indexes of the documents.
+
+Every document has a BM25 index persisted under `lexical_path` next to its
+vectors, built window by window during ingestion. It serves exact keyword
+lookups without an embedding call and is fused with the vector results by
+the hybrid retriever, see app/services/rag_service.py.
+"""
+
+from pathlib import Path
+from typing import Optional
+from langchain.schema import Document
+from app.config import app_config
+from .bm25_index import BM25Index, tokenize
+
+
+def save_lexical_index(
+    col_name: str, documents: list[Document], dir_path: Optional[str | Path] = None
+) -> BM25Index:
+    """Indexes a window of chunks of a document. The window is keyed by the
+    page of its first chunk, so re-indexing a window replaces it.
+
+    Args:
+        col_name (str): The name of the index, the document ID.
+        documents (list[Document]): The chunks to index.
+        dir_path (Optional[str | Path], optional): The directory of the indexes.
+            Defaults to `lexical_path` from the config.
+
+    Returns:
+        BM25Index: The index after saving the chunks.
+    """
+    index = load_lexical_index(col_name, dir_path)
+    if documents:
+        index.add_documents(documents, segment=str(documents[0].metadata.get("page", 0)))
+    return index
+
+
+def load_lexical_index(
+    col_name: str, from_dir: Optional[str | Path] = None
+) -> BM25Index:
+    """Loads the lexical index of a document.
+
+    Args:
+        col_name (str): The name of the index, the document ID.
+        from_dir (Optional[str | Path], optional): The directory of the indexes.
+            Defaults to `lexical_path` from the config.
+
+    Returns:
+        BM25Index: The index, empty if the document has no lexical index.
+    """
+    return BM25Index(col_name, from_dir or app_config.lexical_path)
+
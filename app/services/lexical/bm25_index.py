@@ -0,0 +1,259 @@
+"""
+Module for a compact BM25 inverted index over the chunks of a document.
+
+Each index is persisted as a directory of JSON segments, one per ingestion
+window, holding the texts and metadata of the window's chunks, their token
+counts and the postings of every term. Segments are written atomically and
+keyed by name, so a retried window replaces its segment, and a document is
+searchable as soon as its first segment is written.
+
+The segments are merged on the first read into per-term NumPy arrays of rows
+and term frequencies, so a query is scored with a few vectorized operations
+per query term and no embedding call.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from langchain.schema import Document
+
+SEGMENT_SUFFIX = ".json"
+
+# words, keeping dotted and hyphenated terms like "14.2" or "covid-19" whole
+_TOKEN_PATTERN = re.compile(r"\w+(?:[.\-]\w+)*")
+# question words and function words, which carry no lexical evidence
+STOPWORDS = frozenset(
+    "a an and are as at be by can did do does for from how in is it its of on or "
+    "the this that to was what when where which who why with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits a text into lowercase terms, dropping stopwords.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list[str]: The terms of the text, in order.
+    """
+    return [term for term in _TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """BM25 inverted index over the chunks of a document.
+
+    Attributes:
+        collection_name (str): The name of the index.
+        persist_directory (Path): The directory holding the indexes.
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        persist_directory: str | Path,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        """Initializes a handle to an index. The index is loaded lazily on the
+        first read.
+
+        Args:
+            collection_name (str): The name of the index.
+            persist_directory (str | Path): The directory holding the indexes.
+            k1 (float, optional): Term frequency saturation. Defaults to 1.5.
+            b (float, optional): Document length normalization. Defaults to 0.75.
+        """
+        self.collection_name = str(collection_name)
+        self.persist_directory = Path(persist_directory)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # merged snapshot, replaced as a whole so readers never see a partial merge
+        self._data: Optional[dict] = None
+
+    @property
+    def _index_path(self) -> Path:
+        return self.persist_directory / self.collection_name
+
+    def __len__(self) -> int:
+        return len(self._load()["documents"])
+
+    def add_documents(self, documents: list[Document], segment: str) -> None:
+        """Indexes documents as a segment, replacing an existing segment of
+        the same name.
+
+        Args:
+            documents (list[Document]): The documents to index.
+            segment (str): The name of the segment, e.g. the first page of
+                an ingestion window.
+        """
+        postings: dict[str, list[list[int]]] = {}
+        lengths = []
+        for row, document in enumerate(documents):
+            terms = tokenize(document.page_content)
+            lengths.append(len(terms))
+            counts: dict[str, int] = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, []).append([row, count])
+
+        self._write(
+            segment,
+            {
+                "documents": [document.page_content for document in documents],
+                "metadatas": [document.metadata for document in documents],
+                "lengths": lengths,
+                "postings": postings,
+            },
+        )
+
+    def delete(self) -> None:
+        """Deletes every segment of the index."""
+        with self._lock:
+            if self._index_path.is_dir():
+                for path in self._index_path.glob(f"*{SEGMENT_SUFFIX}"):
+                    os.remove(path)
+            self._data = None
+
+    def search(self, query: str, k: int = 4) -> list[tuple[Document, float]]:
+        """Returns the k documents scoring highest for a query.
+
+        Args:
+            query (str): The query text.
+            k (int, optional): Number of documents to return. Defaults to 4.
+
+        Returns:
+            list[tuple[Document, float]]: The documents and BM25 scores, highest
+            first. Documents matching no query term are omitted.
+        """
+        data = self._load()
+        count = len(data["documents"])
+        if k <= 0 or not count:
+            return []
+
+        lengths = data["lengths"]
+        avg_length = max(float(lengths.mean()), 1.0)
+        norms = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        scores = np.zeros(count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = data["postings"].get(term)
+            if posting is None:
+                continue
+            rows, tfs = posting
+            scores[rows] += self._idf(len(rows), count) * tfs * (self.k1 + 1) / (tfs + norms[rows])
+
+        matched = np.flatnonzero(scores)
+        if not matched.size:
+            return []
+        k = min(k, matched.size)
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (
+                Document(
+                    page_content=data["documents"][row],
+                    metadata=data["metadatas"][row] or {},
+                ),
+                float(scores[row]),
+            )
+            for row in top
+        ]
+
+    def coverage(self, query: str, document: Document) -> float:
+        """Returns the IDF weighted fraction of the query terms found in a
+        document, 1.0 when the document contains every query term. Terms
+        common in the document weigh less than rare ones.
+
+        Args:
+            query (str): The query text.
+            document (Document): The document to check.
+
+        Returns:
+            float: The coverage in [0, 1].
+        """
+        data = self._load()
+        count = len(data["documents"])
+        terms = set(tokenize(query))
+        if not terms or not count:
+            return 0.0
+
+        found = set(tokenize(document.page_content))
+        weights = {}
+        for term in terms:
+            posting = data["postings"].get(term)
+            weights[term] = self._idf(0 if posting is None else len(posting[0]), count)
+        total = sum(weights.values())
+        return sum(w for term, w in weights.items() if term in found) / total
+
+    @staticmethod
+    def _idf(document_frequency: int, count: int) -> float:
+        return math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def _load(self) -> dict:
+        data = self._data
+        if data is None:
+            data = self._data = self._merge(self._read_segments())
+        return data
+
+    def _read_segments(self) -> list[dict]:
+        if not self._index_path.is_dir():
+            return []
+        segments = []
+        for path in sorted(self._index_path.glob(f"*{SEGMENT_SUFFIX}")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    segments.append(json.load(f))
+            except FileNotFoundError:
+                # replaced by a concurrent write
+                continue
+        return segments
+
+    @staticmethod
+    def _merge(segments: list[dict]) -> dict:
+        documents, metadatas, lengths = [], [], []
+        postings: dict[str, tuple[list[int], list[int]]] = {}
+        for segment in segments:
+            offset = len(documents)
+            documents.extend(segment["documents"])
+            metadatas.extend(segment["metadatas"])
+            lengths.extend(segment["lengths"])
+            for term, rows in segment["postings"].items():
+                merged = postings.setdefault(term, ([], []))
+                for row, tf in rows:
+                    merged[0].append(row + offset)
+                    merged[1].append(tf)
+
+        return {
+            "documents": documents,
+            "metadatas": metadatas,
+            "lengths": np.asarray(lengths, dtype=np.float32),
+            "postings": {
+                term: (np.asarray(rows, dtype=np.intp), np.asarray(tfs, dtype=np.float32))
+                for term, (rows, tfs) in postings.items()
+            },
+        }
+
+    def _write(self, segment: str, content: dict) -> None:
+        self._index_path.mkdir(parents=True, exist_ok=True)
+        path = self._index_path / f"{segment}{SEGMENT_SUFFIX}"
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        with self._lock:
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(content, f)
+                os.replace(temp_path, path)
+            finally:
+                if temp_path.exists():
+                    os.remove(temp_path)
+            # the next read merges the new segment
+            self._data = None
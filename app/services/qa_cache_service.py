@@ -1,54 +1,414 @@
 """
 Module for managing query-answer pairs in Redis.
 
-This module provides functionality to cache and load query-answer 
+This module provides functionality to cache and load query-answer
 pairs associated with PDF documents with an expire based approach.
 It uses a Redis database for storage.
+
+Answers are keyed by a hash of the normalized query, stored zlib compressed,
+and read with a single GETEX, which also prolongs their expiry. Every key
+cached for a document is added to a per-document index set, so re-ingesting
+a document drops its stale answers with a constant number of round trips,
+whatever the number of cached answers.
+
+Hot answers are also kept in a small in-process cache of each API worker,
+with TinyLFU admission, so repeated questions are answered without a network
+round trip. Invalidations are broadcast over Redis pub/sub to every worker,
+which also drops the other in-process state of the document, e.g. its cached
+RAG chain, and the short TTL of the in-process cache bounds the staleness of a worker
+which missed a broadcast.
+
+Besides the exact match on the query, a semantic layer keeps a small index
+of past question embeddings per document (or document set), so paraphrases
+like "What is the deadline?" and "what's the deadline" share an answer when
+their cosine similarity reaches `qa_semantic_cache_threshold`. The index is
+a capped Redis list, searched with a single matrix-vector product, whose
+entries point to the exact keys of the answers.
+
+Hits and misses are counted, and a sample of the semantic hits is kept with
+the cached question and similarity, so false hits can be reviewed and the
+threshold tuned. Instrumentation is best effort, recorded in the background,
+and never fails or delays a lookup.
 """
 
-from typing import Optional
-from app.connection import redis_connection as default_connection, redis
+import asyncio
+import base64
+import json
+import random
+import time
+import zlib
+from typing import Callable, Optional
+import numpy as np
+from redis.exceptions import RedisError
+from app.connection import (
+    redis_connection as default_connection,
+    sync_redis_connection as default_sync_connection,
+    redis,
+    sync_redis,
+)
 
 from app.config import app_config
+from app.models import QACacheStats, SemanticHitSample
+from app.services.embeddings import gemini_embeddings
+from app.utils.cache_utils import LRUCache
+from app.utils.logger import logger
 from app.utils.parse_utils import generate_safe_key
 
+STATS_KEY = "qa_cache:stats"
+SAMPLES_KEY = "qa_cache:samples"
+INVALIDATION_CHANNEL = "qa_cache:invalidations"
+# seconds to wait before resubscribing to the invalidations
+INVALIDATION_RETRY_DELAY = 5
+
+# lookup counters being recorded, referenced until they are done
+_pending_records: set[asyncio.Future] = set()
 
-async def save_qa(pdf_id: str, query: str, answer: str, redis_conn: redis.Redis|None = None) -> None:
-    """Saves a query-answer pair in Redis with an expiry time.
+# answers keyed like in Redis, with the IDs of the documents they depend on
+local_qa_cache: Optional[LRUCache] = (
+    LRUCache(
+        maxsize=app_config.qa_local_cache_size,
+        ttl=app_config.qa_local_cache_ttl,
+        admission=True,
+    )
+    if app_config.qa_local_cache_size > 0
+    else None
+)
+
+
+async def save_qa(
+    pdf_id: str,
+    query: str,
+    answer: str,
+    redis_conn: redis.Redis|None = None,
+    pdf_ids: Optional[list[str]] = None,
+) -> None:
+    """Saves a query-answer pair in Redis with an expiry time, adds the
+    query to the semantic index of the document, and tags the keys with the
+    documents the answer was generated from. Redis errors are logged, as
+    the answer was already generated.
 
     Args:
-        pdf_id (str): The ID of the PDF document associated with the query.
+        pdf_id (str): The ID of the PDF document (or document set) associated
+            with the query.
         query (str): The query to save.
         answer (str): The answer corresponding to the query.
         redis_conn (redis.Redis|None): Optional redis connection
+        pdf_ids (Optional[list[str]]): The IDs of the documents the answer was
+            generated from, whose re-ingestion invalidates it. Defaults to
+            `[pdf_id]`.
 
     Returns:
         None: This function does not return any value.
     """
     connection = redis_conn or default_connection
     key = generate_safe_key(pdf_id, query)
-    await connection.set(key, answer, ex=app_config.cache_expiry)
+    semantic_key = _semantic_key(pdf_id)
+    entry = None
+    if app_config.qa_semantic_cache_enabled:
+        entry = await _semantic_entry(query, key)
+
+    try:
+        async with connection.pipeline(transaction=False) as pipe:
+            pipe.set(key, _compress(answer), ex=app_config.cache_expiry)
+            if entry is not None:
+                pipe.lpush(semantic_key, entry)
+                pipe.ltrim(semantic_key, 0, app_config.qa_semantic_cache_size - 1)
+                pipe.expire(semantic_key, app_config.cache_expiry)
+            for doc_id in pdf_ids or [pdf_id]:
+                pipe.sadd(_index_key(doc_id), key, semantic_key)
+                pipe.expire(_index_key(doc_id), app_config.cache_expiry)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not cache the answer for {pdf_id}: {e}")
+    _cache_locally(key, answer, pdf_ids or [pdf_id])
 
 
-async def load_qa(pdf_id: str, query: str, redis_conn: redis.Redis|None = None) -> Optional[str]:
-    """Loads a query-answer pair from Redis, prolonging expiry on hit.
+async def load_qa(
+    pdf_id: str,
+    query: str,
+    redis_conn: redis.Redis|None = None,
+    pdf_ids: Optional[list[str]] = None,
+) -> Optional[str]:
+    """Loads a query-answer pair from the in-process cache or Redis,
+    prolonging expiry on hit. Falls back to the answer of the most similar
+    cached query of the document.
 
     Args:
-        pdf_id (str): The ID of the PDF document associated with the query.
+        pdf_id (str): The ID of the PDF document (or document set) associated
+            with the query.
         query (str): The query for which to retrieve the answer.
         redis_conn (redis.Redis|None): Optional redis connection
+        pdf_ids (Optional[list[str]]): The IDs of the documents the answer
+            depends on, whose re-ingestion drops it from the in-process cache.
+            Defaults to `[pdf_id]`.
 
     Returns:
         Optional[str]: The answer corresponding to the query, or None if
         no answer is found.
     """
-    connection = redis_conn or default_connection
-    
     key = generate_safe_key(pdf_id, query)
-    answer = await connection.get(key)
+    if local_qa_cache is not None:
+        cached = local_qa_cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+    connection = redis_conn or default_connection
+    # read and prolong expiry in a single round trip
+    answer = await connection.getex(key, ex=app_config.cache_expiry)
 
     if answer is not None:
-        # Prolong expiry on hit
-        await connection.expire(key, app_config.cache_expiry)
+        answer = _decompress(answer)
+        _cache_locally(key, answer, pdf_ids or [pdf_id])
+        _record(connection, "exact_hits")
+        return answer
 
+    if app_config.qa_semantic_cache_enabled:
+        answer = await _load_similar(connection, pdf_id, query)
+    _record(connection, "misses" if answer is None else "semantic_hits")
     return answer
+
+
+def invalidate_qa(pdf_id: str, redis_conn: sync_redis.Redis | None = None) -> None:
+    """Deletes every cached answer generated from a document, e.g. after the
+    document is re-ingested, and notifies the API workers to drop them from
+    their in-process caches. Blocking, meant for the celery worker.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        redis_conn (sync_redis.Redis|None): Optional blocking redis connection
+
+    Returns:
+        None: This function does not return any value.
+    """
+    _invalidate_locally(pdf_id)
+
+    connection = redis_conn or default_sync_connection
+    index_key = _index_key(pdf_id)
+    try:
+        # take the index atomically, answers saved afterwards start a new one
+        with connection.pipeline(transaction=True) as pipe:
+            pipe.smembers(index_key)
+            pipe.delete(index_key)
+            pipe.publish(INVALIDATION_CHANNEL, pdf_id)
+            keys, _, _ = pipe.execute()
+        if keys:
+            # reclaim the memory off the Redis main thread
+            connection.unlink(*keys)
+    except RedisError as e:
+        logger.warning(f"Could not invalidate the cached answers of {pdf_id}: {e}")
+
+
+async def listen_invalidations(
+    redis_conn: redis.Redis|None = None,
+    on_invalidate: Optional[Callable[[Optional[str]], None]] = None,
+) -> None:
+    """Drops the answers invalidated by other processes, e.g. the celery
+    worker re-ingesting a document, from the in-process cache, resubscribing
+    on connection errors. Runs until cancelled, meant as a background task of
+    each API worker.
+
+    Args:
+        redis_conn (redis.Redis|None): Optional redis connection
+        on_invalidate (Optional[Callable[[Optional[str]], None]]): Called with
+            the ID of every invalidated document, e.g. to drop other
+            in-process state built from it, or with None on (re)subscription
+            since invalidations may have been missed in between.
+
+    Returns:
+        None: This function does not return any value.
+    """
+    if local_qa_cache is None and on_invalidate is None:
+        return
+
+    connection = redis_conn or default_connection
+    while True:
+        try:
+            async with connection.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # invalidations may have been missed while unsubscribed
+                if local_qa_cache is not None:
+                    local_qa_cache.invalidate_if(lambda key, value: True)
+                if on_invalidate is not None:
+                    on_invalidate(None)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        pdf_id = _decode(message["data"])
+                        _invalidate_locally(pdf_id)
+                        if on_invalidate is not None:
+                            on_invalidate(pdf_id)
+        except RedisError as e:
+            logger.warning(f"QA cache invalidation listener disconnected: {e}")
+            await asyncio.sleep(INVALIDATION_RETRY_DELAY)
+
+
+async def load_qa_stats(redis_conn: redis.Redis|None = None) -> QACacheStats:
+    """Loads the hit and miss counts of the QA cache and the sampled
+    semantic hits, most recent first.
+
+    Args:
+        redis_conn (redis.Redis|None): Optional redis connection
+
+    Returns:
+        QACacheStats: The cache counters and samples, empty if Redis is
+        unavailable.
+    """
+    connection = redis_conn or default_connection
+    try:
+        counts = await connection.hgetall(STATS_KEY)
+        samples = await connection.lrange(SAMPLES_KEY, 0, -1)
+    except RedisError as e:
+        logger.warning(f"Could not load the QA cache stats: {e}")
+        counts, samples = {}, []
+
+    counts = {_decode(k): int(v) for k, v in counts.items()}
+    hits = counts.get("exact_hits", 0) + counts.get("semantic_hits", 0)
+    lookups = hits + counts.get("misses", 0)
+    return QACacheStats(
+        exact_hits=counts.get("exact_hits", 0),
+        semantic_hits=counts.get("semantic_hits", 0),
+        misses=counts.get("misses", 0),
+        hit_rate=round(hits / lookups, 4) if lookups else None,
+        samples=[SemanticHitSample(**json.loads(sample)) for sample in samples],
+        local_hits=local_qa_cache.hits if local_qa_cache is not None else 0,
+    )
+
+
+def _semantic_key(pdf_id: str) -> str:
+    return f"qa_semantic:{pdf_id}"
+
+
+def _index_key(pdf_id: str) -> str:
+    return f"qa_index:{pdf_id}"
+
+
+def _cache_locally(key: str, answer: str, pdf_ids: list[str]) -> None:
+    if local_qa_cache is not None:
+        local_qa_cache.set(key, (answer, frozenset(pdf_ids)))
+
+
+def _invalidate_locally(pdf_id: str) -> None:
+    if local_qa_cache is not None:
+        count = local_qa_cache.invalidate_if(lambda key, value: pdf_id in value[1])
+        if count:
+            logger.debug(f"dropped {count} locally cached answers of {pdf_id}")
+
+
+async def _semantic_entry(query: str, key: str) -> Optional[str]:
+    """Returns the semantic index entry of a query, pointing to the exact key
+    of its answer, or None if the query cannot be embedded."""
+    try:
+        vector = _normalize(await gemini_embeddings.aembed_query(query))
+    except Exception as e:
+        logger.warning(f"Could not embed the query for the semantic QA cache: {e}")
+        return None
+
+    return json.dumps(
+        {
+            "query": query,
+            "key": key,
+            "vector": base64.b64encode(vector.tobytes()).decode("ascii"),
+        }
+    )
+
+
+async def _load_similar(
+    connection: redis.Redis, pdf_id: str, query: str
+) -> Optional[str]:
+    """Returns the answer of the cached query most similar to the query, if
+    its cosine similarity reaches `qa_semantic_cache_threshold` and the
+    answer has not expired."""
+    key = _semantic_key(pdf_id)
+    raw_entries = await connection.lrange(key, 0, -1)
+    if not raw_entries:
+        # nothing cached, do not pay for the query embedding
+        return None
+
+    try:
+        vector = _normalize(await gemini_embeddings.aembed_query(query))
+    except Exception as e:
+        logger.warning(f"Could not embed the query for the semantic QA cache: {e}")
+        return None
+
+    entries, vectors = [], []
+    for raw_entry in raw_entries:
+        entry = json.loads(raw_entry)
+        entry_vector = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+        # skip queries embedded by another model
+        if entry_vector.shape == vector.shape and "key" in entry:
+            entries.append(entry)
+            vectors.append(entry_vector)
+    if not entries:
+        return None
+
+    similarities = np.stack(vectors) @ vector
+    best = int(np.argmax(similarities))
+    similarity = float(similarities[best])
+    if similarity < app_config.qa_semantic_cache_threshold:
+        return None
+
+    entry = entries[best]
+    async with connection.pipeline(transaction=False) as pipe:
+        pipe.getex(entry["key"], ex=app_config.cache_expiry)
+        pipe.expire(key, app_config.cache_expiry)
+        answer, _ = await pipe.execute()
+    if answer is None:
+        # the answer expired before its index entry
+        return None
+
+    logger.debug(f"semantic QA cache hit for {pdf_id} ({similarity:.3f}): {query!r} ~ {entry['query']!r}")
+    if random.random() < app_config.qa_semantic_cache_sample_rate:
+        await _sample(connection, pdf_id, query, entry["query"], similarity)
+    return _decompress(answer)
+
+
+def _record(connection: redis.Redis, field: str) -> None:
+    """Counts a lookup in the background, so the counter never adds a round
+    trip to the answer."""
+    task = asyncio.ensure_future(_increment(connection, field))
+    _pending_records.add(task)
+    task.add_done_callback(_pending_records.discard)
+
+
+async def _increment(connection: redis.Redis, field: str) -> None:
+    try:
+        await connection.hincrby(STATS_KEY, field, 1)
+    except RedisError as e:
+        logger.warning(f"Could not record the QA cache {field}: {e}")
+
+
+async def _sample(
+    connection: redis.Redis, pdf_id: str, query: str, cached_query: str, similarity: float
+) -> None:
+    """Keeps a semantic hit for review, so false hits can be spotted."""
+    sample = SemanticHitSample(
+        chat_id=pdf_id,
+        query=query,
+        cached_query=cached_query,
+        similarity=round(similarity, 4),
+        time=time.time(),
+    )
+    try:
+        async with connection.pipeline(transaction=False) as pipe:
+            pipe.lpush(SAMPLES_KEY, sample.model_dump_json())
+            pipe.ltrim(SAMPLES_KEY, 0, app_config.qa_semantic_cache_samples - 1)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not sample the semantic QA cache hit: {e}")
+
+
+def _compress(answer: str) -> bytes:
+    return zlib.compress(answer.encode("utf-8"))
+
+
+def _decompress(value: bytes) -> str:
+    return zlib.decompress(value).decode("utf-8")
+
+
+def _normalize(vector: list[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _decode(value: bytes | str) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
@@ -0,0 +1,129 @@
+"""
+Module for routing documents to ingestion lanes and monitoring the lanes.
+
+Documents are routed by their estimated processing cost, known from the page
+count and byte size learned while storing the upload. Small documents go to
+the fast lane, which has a dedicated worker pool, so the time to the first
+chat of a short document does not depend on large documents uploaded before
+it. Each lane has its own parsing, embedding and storing queues.
+
+The load of a lane is reported as the number of queued tasks, read from the
+Redis broker, and the recent wait times of documents before parsing started.
+"""
+
+import statistics
+from redis.exceptions import RedisError
+from app.config import app_config
+from app.connection import (
+    redis_connection as default_connection,
+    sync_redis_connection as default_sync_connection,
+    redis,
+    sync_redis,
+)
+from app.models import IngestionLane, LaneStats
+from app.utils.logger import logger
+
+
+def select_lane(page_count: int, size: int) -> IngestionLane:
+    """Selects the ingestion lane of a document by its estimated cost.
+
+    Args:
+        page_count (int): Total number of pages in the document.
+        size (int): Size of the document in bytes.
+
+    Returns:
+        IngestionLane: The fast lane for small documents, the bulk lane otherwise.
+    """
+    if (
+        page_count <= app_config.ingestion_fast_lane_max_pages
+        and size <= app_config.ingestion_fast_lane_max_bytes
+    ):
+        return IngestionLane.FAST
+    return IngestionLane.BULK
+
+
+def lane_queue(queue: str, lane: IngestionLane | str) -> str:
+    """Returns the name of a stage queue in a lane.
+
+    Args:
+        queue (str): The base name of the stage queue, e.g. "parsing".
+        lane (IngestionLane | str): The ingestion lane.
+
+    Returns:
+        str: The queue name, e.g. "parsing.fast".
+    """
+    return f"{queue}.{IngestionLane(lane).value}"
+
+
+def _wait_key(lane: IngestionLane | str) -> str:
+    return f"ingestion_wait:{IngestionLane(lane).value}"
+
+
+def record_wait(
+    lane: IngestionLane | str,
+    seconds: float,
+    redis_conn: sync_redis.Redis | None = None,
+) -> None:
+    """Records how long a document waited in a lane before parsing started,
+    keeping only the most recent `ingestion_wait_samples` samples. Blocking,
+    meant for the celery worker.
+
+    Args:
+        lane (IngestionLane | str): The ingestion lane.
+        seconds (float): The wait time in seconds.
+        redis_conn (sync_redis.Redis|None): Optional blocking redis connection
+
+    Returns:
+        None: This function does not return any value.
+    """
+    connection = redis_conn or default_sync_connection
+    key = _wait_key(lane)
+    try:
+        with connection.pipeline(transaction=False) as pipe:
+            pipe.lpush(key, max(seconds, 0.0))
+            pipe.ltrim(key, 0, app_config.ingestion_wait_samples - 1)
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not record the wait time of the {lane} lane: {e}")
+
+
+async def load_lane_stats(redis_conn: redis.Redis | None = None) -> list[LaneStats]:
+    """Loads the queue depth and recent wait times of every ingestion lane.
+
+    Args:
+        redis_conn (redis.Redis|None): Optional redis connection, must be
+            connected to the celery broker database.
+
+    Returns:
+        list[LaneStats]: The load of each lane, or an empty list if Redis is
+        unavailable.
+    """
+    connection = redis_conn or default_connection
+    stats = []
+    for lane in IngestionLane:
+        queues = [
+            lane_queue(app_config.ingestion_parse_queue, lane),
+            lane_queue(app_config.ingestion_embed_queue, lane),
+            lane_queue(app_config.ingestion_store_queue, lane),
+        ]
+        try:
+            async with connection.pipeline(transaction=False) as pipe:
+                for queue in queues:
+                    pipe.llen(queue)
+                pipe.lrange(_wait_key(lane), 0, -1)
+                *depths, waits = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Could not load the ingestion lane stats: {e}")
+            return []
+
+        waits = [float(wait) for wait in waits]
+        stats.append(
+            LaneStats(
+                lane=lane,
+                queued=sum(depths),
+                wait_samples=len(waits),
+                wait_p50=round(statistics.median(waits), 3) if waits else None,
+                wait_max=round(max(waits), 3) if waits else None,
+            )
+        )
+    return stats
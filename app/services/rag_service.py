@@ -2,86 +2,628 @@
 Module for implementing a Retrieval-Augmented Generation (RAG) chain.
 
 This module sets up a RAG chain using LangChain to enhance question-answering 
-capabilities for PDF documents. It leverages chromadb vector store for document 
+capabilities for PDF documents. It leverages the configured vector store for document 
 retrieval, Google Generative AI for natural language processing, and manages 
 chat history for context-aware responses. The module includes functionality 
 to build and invoke the RAG chain while ensuring proper error handling 
-for missing documents.
+for missing documents. The chain is invoked asynchronously, and blocking
+setup work is moved to a bounded thread pool to keep the event loop free.
+
+Before retrieval, a follow-up question is rewritten from the chat history
+into a standalone question with an LLM call. With the adaptive
+`query_rewrite_mode`, the rewrite is skipped on the first turn and for
+questions which are clearly standalone, and otherwise runs concurrently
+with a speculative retrieval of the raw question, reused when the rewrite
+does not change the question materially.
+
+With `retrieval_mode="hybrid"`, the BM25 and vector results of a document
+are fused with reciprocal rank fusion, and exact keyword lookups confidently
+answered by the BM25 index skip the query embedding call altogether.
+
+Several documents can be chatted with at once: their vector stores are
+searched concurrently, the results are merged into a single top-k and
+answered with one LLM call. The history of such a chat is kept under the
+ID of the document set.
+
+The retrieved chunks are compressed before the LLM call, merging the
+overlapping chunks of a page, dropping near-duplicates and trimming the
+context to a token budget, see app/services/context_service.py. The estimated
+tokens saved are logged and returned with the chain output.
+
+Documents ingested with the "full" context mode, see `full_context_max_tokens`,
+skip the question rewrite and retrieval: their whole text is passed as the
+context. The system prompt and the document text come first and are the same
+on every turn, so the prompt prefix can be cached by the model provider.
+
+Only the most recent turns of a chat are passed verbatim to the LLM, older
+turns are replaced by a rolling summary refreshed in the background, see
+app/services/summary_service.py.
 """
 
+import asyncio
+import heapq
+import re
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 
-from langchain_chroma import Chroma
+from langchain_core.vectorstores import VectorStore
 from app.config import app_config, env_config
 from app.exceptions import NoDocumentsException
-from app.services.history_service import load_history, save_history
-from app.services.vector_service import load_vectorstore
+from app.models import ContextMode
+from app.services.context_service import ContextCompression, compress_context
+from app.services.document_service import load_document_text
+from app.services.history_service import aappend_turn
+from app.services.summary_service import (
+    CompactedHistory,
+    aload_compacted_history,
+    format_summary,
+    schedule_summary_refresh,
+)
+from app.services.lexical import BM25Index, load_lexical_index, tokenize
+from app.services.vector_service import (
+    load_vectorstore,
+    merge_search_results,
+    search_by_vector,
+)
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
-from langchain.chains.retrieval import create_retrieval_chain
+from langchain.schema import Document
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
+from langchain_core.retrievers import BaseRetriever
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from app.services.embeddings import gemini_embeddings
+from app.utils.async_utils import run_blocking
+from app.utils.cache_utils import LRUCache
+from app.utils.hash_utils import generate_document_set_id
 from app.utils.logger import logger
-from langchain_core.runnables import Runnable
+from app.utils.parse_utils import estimate_tokens, normalize_query
+from langchain_core.runnables import (
+    Runnable,
+    RunnableConfig,
+    RunnableLambda,
+    RunnablePassthrough,
+)
+
+CONTEXTUALIZE_Q_SYSTEM_PROMPT = (
+    "Given a chat history and the latest user question "
+    "which might reference context in the chat history, "
+    "formulate a standalone question which can be understood "
+    "without the chat history. Do NOT answer the question, just "
+    "reformulate it if needed and otherwise return it as is."
+)
+RETRIEVAL_K = 4
+# words referring to earlier turns, a question using them needs the history
+REFERRING_WORDS = frozenset(
+    "it its this that these those they them their he she him her his there "
+    "above previous earlier same former latter again also else more one ones".split()
+)
+# names the source of each chunk when answering over several documents
+MULTI_DOCUMENT_PROMPT = PromptTemplate.from_template(
+    "Source: {filename}\n{page_content}"
+)
+
+
+@dataclass
+class RAGComponents:
+    """Per-document objects that are expensive to build and safe to reuse
+    across chat turns.
+
+    Attributes:
+        vectorstore (VectorStore): The document's vector store handle.
+        retriever (BaseRetriever): Retriever over the vector store.
+        llm (ChatGoogleGenerativeAI): The chat model client.
+        chain (Runnable): The retrieval chain, or the chain passing the whole
+            document in the "full" context mode. The chat history is passed
+            at invocation time, so the chain does not depend on the turn.
+        context_mode (ContextMode): How the context of the document is built.
+    """
+
+    vectorstore: VectorStore
+    retriever: BaseRetriever
+    llm: ChatGoogleGenerativeAI
+    chain: Runnable
+    context_mode: ContextMode = ContextMode.RETRIEVAL
+
+
+rag_chain_cache = LRUCache(
+    maxsize=app_config.rag_chain_cache_size, ttl=app_config.rag_chain_cache_ttl
+)
+# builds in progress, shared by concurrent requests missing on the same document
+_pending_builds: dict[str, asyncio.Future] = {}
+# bumped by each invalidation of a document, or of every document under None,
+# so a build started before an invalidation is not cached
+_generations: dict[Optional[str], int] = {}
+
+
+class MultiDocumentRetriever(BaseRetriever):
+    """Retriever over the vector stores of several documents. The query is
+    embedded once, the stores are searched concurrently and the results are
+    merged into a single top-k by relevance score.
+
+    Attributes:
+        vectorstores (list[VectorStore]): The vector stores of the documents.
+        embeddings (Embeddings): The embedding function for the query.
+        k (int): Number of documents to return in total.
+    """
+
+    vectorstores: list[VectorStore]
+    embeddings: Embeddings
+    k: int = RETRIEVAL_K
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        embedding = self.embeddings.embed_query(query)
+        return self._merge(
+            [search_by_vector(vs, embedding, self.k) for vs in self.vectorstores]
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        results = await asyncio.gather(
+            *(
+                run_blocking(search_by_vector, vs, embedding, self.k)
+                for vs in self.vectorstores
+            )
+        )
+        return self._merge(results)
+
+    def _merge(self, results: list[list[tuple[Document, float]]]) -> list[Document]:
+        return [doc for doc, _ in merge_search_results(results, self.k)]
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever over a document fusing its BM25 and vector results with
+    reciprocal rank fusion. When the best BM25 match contains the query terms
+    and clearly outscores the runner-up, e.g. for a lookup like "what is
+    clause 14.2", the BM25 results are returned alone and the query is not
+    embedded.
+
+    Attributes:
+        vectorstore (VectorStore): The document's vector store.
+        lexical_index (BM25Index): The document's BM25 index.
+        k (int): Number of documents to return.
+    """
+
+    vectorstore: VectorStore
+    lexical_index: BM25Index
+    k: int = RETRIEVAL_K
 
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        lexical, confident = self._search_lexical(query)
+        if confident:
+            return lexical
+        return self._fuse(lexical, self.vectorstore.similarity_search(query, k=self.k))
 
-def _build_rag_chain(pdf_id: str, chat_history: list[tuple] = []):
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        lexical, confident = await run_blocking(self._search_lexical, query)
+        if confident:
+            return lexical
+        vector = await self.vectorstore.asimilarity_search(query, k=self.k)
+        return self._fuse(lexical, vector)
+
+    def _search_lexical(self, query: str) -> tuple[list[Document], bool]:
+        """Returns the BM25 results, and True if they are confident enough
+        to skip the vector search."""
+        results = self.lexical_index.search(query, self.k)
+        if not results:
+            return [], False
+
+        coverage = self.lexical_index.coverage(query, results[0][0])
+        margin = (
+            results[0][1] / results[1][1] if len(results) > 1 else float("inf")
+        )
+        confident = (
+            coverage >= app_config.hybrid_lexical_min_coverage
+            and margin >= app_config.hybrid_lexical_min_margin
+        )
+        if confident:
+            logger.debug(f"answering from the lexical index alone: {query!r}")
+        return [doc for doc, _ in results], confident
+
+    def _fuse(self, *results: list[Document]) -> list[Document]:
+        scores: dict[tuple, float] = {}
+        documents: dict[tuple, Document] = {}
+        for ranked in results:
+            for rank, document in enumerate(ranked):
+                # chunks from both indexes are matched by their position
+                key = (
+                    document.metadata.get("page"),
+                    document.metadata.get("start_index"),
+                    document.page_content,
+                )
+                documents.setdefault(key, document)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (
+                    app_config.hybrid_rrf_k + rank + 1
+                )
+        return [documents[key] for key in heapq.nlargest(self.k, scores, key=scores.get)]
+
+
+def _build_rag_components(pdf_id: str) -> RAGComponents:
     logger.debug(f"setting up RAG chain for: {pdf_id}")
-    vectorstore: Chroma = load_vectorstore(
+    vectorstore: VectorStore = load_vectorstore(
         col_name=pdf_id,
-        from_dir=str(app_config.chroma_path),
+        from_dir=str(app_config.vectorstore_path),
         use_embeddings=gemini_embeddings,
     )
 
-    if not vectorstore.get()["documents"]:
+    # only fetch a single chunk instead of every chunk in the collection
+    first = vectorstore.get(limit=1, include=["metadatas"])
+    if not first["ids"]:
         raise NoDocumentsException
 
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
+    retriever = _build_retriever(pdf_id, vectorstore)
     llm = ChatGoogleGenerativeAI(
         model="gemini-1.5-flash",
         api_key=env_config.google_api_key,
     )
 
-    contextualize_q_system_prompt = (
-        "Given a chat history and the latest user question "
-        "which might reference context in the chat history, "
-        "formulate a standalone question which can be understood "
-        "without the chat history. Do NOT answer the question, just "
-        "reformulate it if needed and otherwise return it as is."
+    if first["metadatas"][0].get("context_mode") == ContextMode.FULL.value:
+        text = load_document_text(pdf_id)
+        if text is not None:
+            logger.debug(f"passing the whole document as the context: {pdf_id}")
+            return RAGComponents(
+                vectorstore=vectorstore,
+                retriever=retriever,
+                llm=llm,
+                chain=_build_full_context_chain(llm, text),
+                context_mode=ContextMode.FULL,
+            )
+        logger.warning(f"Could not find the text of '{pdf_id}', using retrieval")
+
+    return RAGComponents(
+        vectorstore=vectorstore,
+        retriever=retriever,
+        llm=llm,
+        chain=_build_chain(llm, retriever),
     )
+
+
+def _build_retriever(pdf_id: str, vectorstore: VectorStore) -> BaseRetriever:
+    if app_config.retrieval_mode == "hybrid":
+        lexical_index = load_lexical_index(pdf_id)
+        # documents ingested before the lexical index existed have none
+        if len(lexical_index):
+            return HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index)
+    return vectorstore.as_retriever(search_kwargs={"k": RETRIEVAL_K})
+
+
+def _build_chain(
+    llm: ChatGoogleGenerativeAI,
+    retriever: BaseRetriever,
+    document_prompt: Optional[PromptTemplate] = None,
+) -> Runnable:
+    # the summary of the older turns closes the system prompts, since the
+    # model only accepts a system message at the start
     contextualize_q_prompt = ChatPromptTemplate.from_messages(
         [
-            ("system", contextualize_q_system_prompt),
-            *chat_history[
-                1:-1
-            ],  # do not include the first system message and the last human input
+            ("system", CONTEXTUALIZE_Q_SYSTEM_PROMPT + "{history_summary}"),
+            MessagesPlaceholder("chat_history"),
             ("human", "{input}"),
         ]
     )
-    history_aware_retriever = create_history_aware_retriever(
-        llm, retriever, contextualize_q_prompt
-    )
+    history_aware_retriever = _build_query_planner(llm, retriever, contextualize_q_prompt)
 
-    qa_prompt = ChatPromptTemplate.from_messages(chat_history)
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-    return create_retrieval_chain(history_aware_retriever, question_answer_chain)
+    question_answer_chain = create_stuff_documents_chain(
+        llm, _build_qa_prompt(), document_prompt=document_prompt
+    )
+    retrieval = (
+        history_aware_retriever
+        | RunnableLambda(_compress_context, name="compress_context")
+    ).with_config(run_name="retrieve_documents")
+    # like `create_retrieval_chain`, also returning the compression report
+    return (
+        RunnablePassthrough.assign(context_compression=retrieval)
+        .assign(context=lambda inputs: inputs["context_compression"].documents)
+        .assign(answer=question_answer_chain)
+    ).with_config(run_name="retrieval_chain")
 
 
-def invoke_rag_chain(pdf_id: str, query: str, user_id: str = None):
-    chat_history = load_history(pdf_id, user_id) or app_config.default_history
+def _build_full_context_chain(llm: ChatGoogleGenerativeAI, text: str) -> Runnable:
+    """Builds a chain answering from the whole text of a document, without
+    rewriting the question or retrieving chunks. The system prompt followed by
+    the document is the same on every turn, so it forms a cacheable prefix."""
+    context = [Document(page_content=text)]
+    question_answer_chain = create_stuff_documents_chain(llm, _build_qa_prompt())
+    return (
+        RunnablePassthrough.assign(context=lambda _: context)
+        .assign(answer=question_answer_chain)
+    ).with_config(run_name="full_context_chain")
 
-    chain: Runnable = _build_rag_chain(pdf_id, chat_history)
-    output: dict = chain.invoke({"input": query, "chat_history": chat_history})
 
-    chat_history.pop(-1)
-    chat_history.extend(
+def _build_qa_prompt() -> ChatPromptTemplate:
+    # the summary of the older turns closes the system prompt, after the
+    # context, so the system prompt and context form a stable prefix
+    role, system_prompt = app_config.default_history[0]
+    return ChatPromptTemplate.from_messages(
         [
-            ("human", query),
-            ("ai", output.get("answer")),
+            (role, system_prompt + "{history_summary}"),
+            MessagesPlaceholder("chat_history"),
             ("human", "{input}"),
         ]
     )
-    save_history(pdf_id, chat_history, user_id)
+
+
+def _compress_context(documents: list[Document]) -> ContextCompression:
+    if not app_config.context_compression_enabled:
+        tokens = sum(estimate_tokens(document.page_content) for document in documents)
+        return ContextCompression(documents, tokens, tokens, len(documents))
+
+    compression = compress_context(documents)
+    logger.info(
+        f"compressed the context from {compression.retrieved} chunks to "
+        f"{len(compression.documents)} passages, {compression.input_tokens} -> "
+        f"{compression.output_tokens} tokens ({compression.tokens_saved} saved)"
+    )
+    return compression
+
+
+def _build_query_planner(
+    llm: ChatGoogleGenerativeAI,
+    retriever: BaseRetriever,
+    contextualize_q_prompt: ChatPromptTemplate,
+) -> Runnable:
+    """Builds the retrieval step of a chain, taking the chain input and
+    returning the documents of the question, rewritten from the chat history
+    if needed, see `query_rewrite_mode`."""
+    rewrite_chain = (contextualize_q_prompt | llm | StrOutputParser()).with_config(
+        run_name="rewrite_query"
+    )
+
+    def plan(inputs: dict, config: RunnableConfig) -> list[Document]:
+        query = inputs["input"]
+        if _needs_rewrite(inputs):
+            query = rewrite_chain.invoke(inputs, config)
+        return retriever.invoke(query, config)
+
+    async def aplan(inputs: dict, config: RunnableConfig) -> list[Document]:
+        query = inputs["input"]
+        if not _needs_rewrite(inputs):
+            return await retriever.ainvoke(query, config)
+        if app_config.query_rewrite_mode != "adaptive":
+            rewritten = await rewrite_chain.ainvoke(inputs, config)
+            return await retriever.ainvoke(rewritten, config)
+
+        # retrieve with the raw question while it is rewritten
+        speculative = asyncio.ensure_future(retriever.ainvoke(query, config))
+        # the result is dropped when the rewrite changes the question
+        speculative.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            rewritten = await rewrite_chain.ainvoke(inputs, config)
+        except BaseException:
+            speculative.cancel()
+            raise
+
+        if _same_query(query, rewritten):
+            logger.debug(f"reusing the retrieval of the raw question: {query!r}")
+            return await speculative
+        speculative.cancel()
+        logger.debug(f"retrieving with the rewritten question: {query!r} -> {rewritten!r}")
+        return await retriever.ainvoke(rewritten, config)
+
+    return RunnableLambda(plan, afunc=aplan, name="plan_retrieval")
+
+
+def _needs_rewrite(inputs: dict) -> bool:
+    if app_config.query_rewrite_mode == "always":
+        return True
+    has_history = inputs.get("history_summary") or any(
+        role == "human" for role, _ in inputs["chat_history"]
+    )
+    return bool(has_history) and not _is_standalone(inputs["input"])
+
+
+def _is_standalone(query: str) -> bool:
+    if REFERRING_WORDS.intersection(re.findall(r"\w+", query.lower())):
+        return False
+    return len(set(tokenize(query))) >= app_config.query_rewrite_min_terms
+
+
+def _same_query(query: str, rewritten: str) -> bool:
+    if normalize_query(query) == normalize_query(rewritten):
+        return True
+    terms, rewritten_terms = set(tokenize(query)), set(tokenize(rewritten))
+    if not terms or not rewritten_terms:
+        return False
+    overlap = len(terms & rewritten_terms) / len(terms | rewritten_terms)
+    return overlap >= app_config.query_rewrite_min_overlap
+
+
+async def get_rag_components(pdf_id: str, partial: bool = False) -> RAGComponents:
+    """Returns the cached RAG components of a document, building them in the
+    blocking thread pool on a miss.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        partial (bool, optional): True if the document is still being ingested.
+            The components are then built for every call and not cached, so
+            no handle to the partial vector store outlives the ingestion.
+
+    Returns:
+        RAGComponents: The document's vector store, retriever, llm and chain.
+
+    Raises:
+        NoDocumentsException: If the document has no vector data. Failed
+            builds are not cached.
+    """
+    if partial:
+        return await run_blocking(_build_rag_components, pdf_id)
+
+    components = rag_chain_cache.get(pdf_id)
+    if components is None:
+        generation = _generation(pdf_id)
+        build = _pending_builds.get(pdf_id)
+        if build is None:
+            build = asyncio.ensure_future(run_blocking(_build_rag_components, pdf_id))
+            _pending_builds[pdf_id] = build
+            build.add_done_callback(lambda done: _remove_pending_build(pdf_id, done))
+        components = await build
+        # the document was invalidated during the build, which may have read
+        # the previous index
+        if _generation(pdf_id) == generation:
+            rag_chain_cache.set(pdf_id, components)
+    logger.debug(f"RAG chain cache stats: {rag_chain_cache.stats()}")
+    return components
+
+
+def invalidate_rag_chain(pdf_id: Optional[str]) -> None:
+    """Drops the cached RAG components of a document, e.g. after it is re-ingested.
+    Called by the invalidation listener of each API worker, see
+    `listen_invalidations`, since documents are re-ingested by the celery worker.
+
+    Args:
+        pdf_id (Optional[str]): The ID of the PDF document, or None to drop
+            the components of every document.
+    """
+    _generations[pdf_id] = _generations.get(pdf_id, 0) + 1
+    # later requests start a new build instead of joining a stale one
+    if pdf_id is None:
+        _pending_builds.clear()
+        rag_chain_cache.clear()
+        logger.debug("invalidated every cached RAG chain")
+    else:
+        _pending_builds.pop(pdf_id, None)
+        if rag_chain_cache.invalidate(pdf_id):
+            logger.debug(f"invalidated cached RAG chain for: {pdf_id}")
+
+
+def _generation(pdf_id: str) -> tuple[int, int]:
+    return _generations.get(None, 0), _generations.get(pdf_id, 0)
+
+
+def _remove_pending_build(pdf_id: str, build: asyncio.Future) -> None:
+    # an invalidation may have replaced the build
+    if _pending_builds.get(pdf_id) is build:
+        del _pending_builds[pdf_id]
+
+
+def _get_turn_history(chat_history: list[tuple]) -> list[tuple]:
+    # do not include the first system message and the last human input
+    return chat_history[1:-1]
+
+
+def _chain_input(query: str, compacted: CompactedHistory) -> dict:
+    chat_history = compacted.history or list(app_config.default_history)
+    return {
+        "input": query,
+        "chat_history": _get_turn_history(chat_history),
+        "history_summary": format_summary(compacted.summary),
+    }
+
+
+async def _save_turn(
+    history_id: str,
+    query: str,
+    answer: str,
+    compacted: CompactedHistory,
+    llm: ChatGoogleGenerativeAI,
+    user_id: str = None,
+) -> None:
+    await aappend_turn(history_id, query, answer, user_id)
+    if app_config.history_summary_enabled and compacted.truncated:
+        # fold the turns leaving the verbatim history into the summary
+        schedule_summary_refresh(history_id, llm, user_id)
+
+
+async def invoke_rag_chain(
+    pdf_id: str, query: str, user_id: str = None, partial: bool = False
+):
+    components = await get_rag_components(pdf_id, partial)
+    return await _invoke_with_history(
+        components.chain, components.llm, pdf_id, query, user_id
+    )
+
+
+async def invoke_multi_rag_chain(
+    pdf_ids: list[str], query: str, user_id: str = None, partial: bool = False
+) -> dict:
+    """Answers a query over several documents with a single retrieval pass
+    and a single LLM call. The chat history is kept under the ID of the
+    document set, see `generate_document_set_id`.
+
+    Args:
+        pdf_ids (list[str]): The IDs of the PDF documents to chat with.
+        query (str): The user's message.
+        user_id (str, optional): The ID of the user associated with the history.
+        partial (bool, optional): True if any of the documents is still being ingested.
+
+    Returns:
+        dict: The chain output, with the answer under `answer`, the
+        compressed chunks of all documents under `context` and the
+        `ContextCompression` report under `context_compression`.
+
+    Raises:
+        NoDocumentsException: If any of the documents has no vector data.
+    """
+    components = await asyncio.gather(
+        *(get_rag_components(pdf_id, partial) for pdf_id in pdf_ids)
+    )
+    retriever = MultiDocumentRetriever(
+        vectorstores=[c.vectorstore for c in components],
+        embeddings=gemini_embeddings,
+    )
+    # chains are cheap to assemble, the per-document handles are cached
+    llm = components[0].llm
+    chain = _build_chain(llm, retriever, MULTI_DOCUMENT_PROMPT)
+    return await _invoke_with_history(
+        chain, llm, generate_document_set_id(pdf_ids), query, user_id
+    )
+
+
+async def _invoke_with_history(
+    chain: Runnable,
+    llm: ChatGoogleGenerativeAI,
+    history_id: str,
+    query: str,
+    user_id: str = None,
+) -> dict:
+    compacted = await aload_compacted_history(history_id, user_id)
+
+    output: dict = await chain.ainvoke(_chain_input(query, compacted))
+
+    await _save_turn(history_id, query, output.get("answer"), compacted, llm, user_id)
 
     return output  # , chat_history
+
+
+async def stream_rag_chain(
+    pdf_id: str, query: str, user_id: str = None, partial: bool = False
+) -> AsyncIterator[str]:
+    """Streams the answer of the RAG chain token by token. The chat history
+    is saved once the whole answer has been generated.
+
+    Args:
+        pdf_id (str): The ID of the PDF document to chat with.
+        query (str): The user's message.
+        user_id (str, optional): The ID of the user associated with the history.
+        partial (bool, optional): True if the document is still being ingested.
+
+    Yields:
+        str: The next chunk of the generated answer.
+
+    Raises:
+        NoDocumentsException: If the document has no vector data.
+    """
+    compacted = await aload_compacted_history(pdf_id, user_id)
+
+    components = await get_rag_components(pdf_id, partial)
+    answer = []
+    async for chunk in components.chain.astream(_chain_input(query, compacted)):
+        token = chunk.get("answer")
+        if token:
+            answer.append(token)
+            yield token
+
+    await _save_turn(pdf_id, query, "".join(answer), compacted, components.llm, user_id)
@@ -0,0 +1,190 @@
+"""
+Module for library-wide semantic search over every uploaded document.
+
+A router index holds a few centroid vectors per document: the normalized mean
+of the chunk vectors of each ingestion window, saved as the window is indexed.
+A search embeds the query once, ranks the documents by their closest centroid
+in the router index, and then searches the chunk indexes of the top documents
+only. The router index is a single collection of the configured vector backend,
+so the number of chunk indexes searched per query stays bounded by
+`search_max_documents` however many documents are uploaded. Every ingestion
+writes to it, so its writers hold an exclusive lock file shared across
+threads and processes.
+
+Scores are relevance scores of the configured backend, higher is more relevant.
+"""
+
+import asyncio
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+import numpy as np
+from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
+from app.config import app_config
+from app.services.embeddings import gemini_embeddings
+from app.services.vector_service import (
+    load_vectorstore,
+    save_vectorstore,
+    search_by_vector,
+)
+from app.utils.async_utils import run_blocking
+from app.utils.file_utils import lock_file
+from app.utils.logger import logger
+
+ROUTER_COLLECTION = "document-router"
+
+
+def save_centroid(
+    pdf_id: str,
+    chunks: list[Document],
+    vectors: list[list[float]],
+    dir_path: Optional[str] = None,
+) -> None:
+    """Saves the centroid of the vectors of an indexed window of a document
+    to the router index. Centroids are keyed by the first page of the window,
+    so a retried window replaces its centroid.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        chunks (list[Document]): The chunks of the window.
+        vectors (list[list[float]]): The vectors of the chunks.
+        dir_path (Optional[str], optional): The directory of the router index.
+            Defaults to the vector store directory.
+    """
+    if not chunks:
+        return
+
+    # average the directions of the chunks, not their magnitudes
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+    centroid = _normalize(matrix.mean(axis=0))
+
+    metadata = chunks[0].metadata
+    page = metadata.get("page", 0)
+    document = Document(
+        page_content=metadata.get("filename", ""),
+        metadata={
+            "document_id": pdf_id,
+            "filename": metadata.get("filename", ""),
+            "page": page,
+            "chunk_count": len(chunks),
+        },
+    )
+    with _router_lock(dir_path):
+        save_vectorstore(
+            col_name=ROUTER_COLLECTION,
+            documents=[document],
+            embeddings=gemini_embeddings,
+            dir_path=dir_path or app_config.vectorstore_path,
+            vectors=[centroid.tolist()],
+            ids=[str(uuid.uuid5(uuid.NAMESPACE_URL, f"{pdf_id}:{page}"))],
+        )
+
+
+def remove_centroids(pdf_id: str, dir_path: Optional[str] = None) -> None:
+    """Removes every centroid of a document from the router index.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        dir_path (Optional[str], optional): The directory of the router index.
+            Defaults to the vector store directory.
+    """
+    with _router_lock(dir_path):
+        router = _load_router(dir_path)
+        ids = router.get(where={"document_id": pdf_id}, include=[])["ids"]
+        if ids:
+            router.delete(ids=ids)
+
+
+@contextmanager
+def _router_lock(dir_path: Optional[str] = None) -> Iterator[None]:
+    """Holds the write lock of the router index, so documents ingested at
+    the same time do not overwrite each other's centroids."""
+    path = Path(dir_path or app_config.vectorstore_path)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / f"{ROUTER_COLLECTION}.lock", "ab") as f, lock_file(f):
+        yield
+
+
+def route_query(
+    embedding: list[float], max_documents: int, dir_path: Optional[str] = None
+) -> list[tuple[str, float]]:
+    """Ranks the documents by their closest centroid to a query vector.
+
+    Args:
+        embedding (list[float]): The query vector.
+        max_documents (int): Maximum number of documents to return.
+        dir_path (Optional[str], optional): The directory of the router index.
+            Defaults to the vector store directory.
+
+    Returns:
+        list[tuple[str, float]]: The document IDs and centroid relevance
+        scores, most relevant first.
+    """
+    # a document may have several centroids, fetch more to fill the top documents
+    candidates = search_by_vector(
+        _load_router(dir_path),
+        embedding,
+        max_documents * app_config.search_router_oversampling,
+    )
+
+    documents: dict[str, float] = {}
+    for centroid, score in candidates:
+        documents.setdefault(centroid.metadata["document_id"], score)
+    return list(documents.items())[:max_documents]
+
+
+async def search_library(
+    query: str, k: int, max_documents: Optional[int] = None
+) -> list[list[tuple[Document, float]]]:
+    """Searches the chunks of the documents most relevant to a query.
+
+    The query is embedded once, routed to the top documents through the
+    router index, and their chunk indexes are searched concurrently.
+
+    Args:
+        query (str): The search query.
+        k (int): Number of chunks to return per document.
+        max_documents (Optional[int], optional): Maximum number of documents
+            to search. Defaults to `search_max_documents` from the config.
+
+    Returns:
+        list[list[tuple[Document, float]]]: The chunks and relevance scores of
+        each routed document, most relevant first, in the routing order.
+        Documents without matching chunks are omitted.
+    """
+    embedding = await gemini_embeddings.aembed_query(query)
+    routed = await run_blocking(
+        route_query, embedding, max_documents or app_config.search_max_documents
+    )
+    logger.debug(f"routed search to {len(routed)} documents")
+
+    results = await asyncio.gather(
+        *(run_blocking(_search_document, pdf_id, embedding, k) for pdf_id, _ in routed)
+    )
+    return [result for result in results if result]
+
+
+def _search_document(
+    pdf_id: str, embedding: list[float], k: int
+) -> list[tuple[Document, float]]:
+    vectorstore = load_vectorstore(
+        col_name=pdf_id,
+        from_dir=app_config.vectorstore_path,
+        use_embeddings=gemini_embeddings,
+    )
+    return search_by_vector(vectorstore, embedding, k)
+
+
+def _load_router(dir_path: Optional[str] = None) -> VectorStore:
+    return load_vectorstore(
+        col_name=ROUTER_COLLECTION,
+        from_dir=dir_path or app_config.vectorstore_path,
+        use_embeddings=gemini_embeddings,
+    )
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
@@ -0,0 +1,378 @@
+"""
+Module for tracking the ingestion status of documents in Redis.
+
+Each document has a Redis hash holding its current ingestion state
+(queued, parsing, embedding, partial, ready or failed), progress counts and the
+time each state was entered, so the state can be read in O(1) and
+stage timings can be derived. The celery worker updates the status with
+blocking calls, while the API reads it asynchronously.
+
+The ready and failed states are final: the windows of a document are stored
+in parallel, so a state is only moved with an atomic compare-and-set, and a
+final state is only left when a new ingestion starts parsing the document.
+
+Status tracking is best effort: Redis errors are logged and do not fail
+the upload, chat or ingestion that triggered them.
+"""
+
+import time
+from typing import Optional
+from redis.exceptions import RedisError
+from app.connection import (
+    redis_connection as default_connection,
+    sync_redis_connection as default_sync_connection,
+    redis,
+    sync_redis,
+)
+from app.models import IngestionLane, IngestionState, IngestionStatus
+from app.utils.logger import logger
+
+# order in which the states are entered, used to derive stage timings
+_STATE_ORDER = [
+    IngestionState.QUEUED,
+    IngestionState.PARSING,
+    IngestionState.EMBEDDING,
+    IngestionState.PARTIAL,
+]
+_FINAL_STATES = [IngestionState.READY, IngestionState.FAILED]
+
+# moves the state unless it is final, ARGV holds the new state followed by
+# the fields to set
+_SET_STATE_SCRIPT = f"""
+local state = redis.call('HGET', KEYS[1], 'state')
+if ARGV[1] ~= '{IngestionState.PARSING.value}'
+    and (state == '{IngestionState.READY.value}' or state == '{IngestionState.FAILED.value}') then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+return 1
+"""
+
+# counts ARGV[1] stored windows and sets the number of windows if ARGV[2] is
+# not empty, returns 1 to a single caller once every window is stored
+_COMPLETE_WINDOW_SCRIPT = """
+local stored = redis.call('HINCRBY', KEYS[1], 'stored_windows', ARGV[1])
+if ARGV[2] ~= '' then
+    redis.call('HSET', KEYS[1], 'window_count', ARGV[2])
+end
+local total = tonumber(redis.call('HGET', KEYS[1], 'window_count'))
+if total and stored >= total then
+    return redis.call('HSETNX', KEYS[1], 'windows_done', 1)
+end
+return 0
+"""
+_WINDOW_FIELDS = ["stored_windows", "window_count", "windows_done"]
+
+
+def _status_key(pdf_id: str) -> str:
+    return f"ingestion:{pdf_id}"
+
+
+def _state_fields(state: IngestionState, **progress) -> dict:
+    fields = {"state": state.value, f"{state.value}_at": time.time()}
+    fields.update({k: v for k, v in progress.items() if v is not None})
+    return fields
+
+
+async def init_status(
+    pdf_id: str, redis_conn: redis.Redis | None = None
+) -> None:
+    """Resets the status of a document to queued, discarding older progress.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        redis_conn (redis.Redis|None): Optional redis connection
+
+    Returns:
+        None: This function does not return any value.
+    """
+    connection = redis_conn or default_connection
+    key = _status_key(pdf_id)
+    try:
+        async with connection.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=_state_fields(IngestionState.QUEUED))
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not initialize the ingestion status of {pdf_id}: {e}")
+
+
+async def set_task_id(
+    pdf_id: str,
+    task_id: str,
+    lane: IngestionLane | None = None,
+    redis_conn: redis.Redis | None = None,
+) -> None:
+    """Attaches the processing task ID and ingestion lane to the status of a document.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        task_id (str): The ID of the celery task processing the document.
+        lane (IngestionLane|None): The ingestion lane the document was routed to.
+        redis_conn (redis.Redis|None): Optional redis connection
+
+    Returns:
+        None: This function does not return any value.
+    """
+    connection = redis_conn or default_connection
+    fields = {"task_id": task_id}
+    if lane is not None:
+        fields["lane"] = IngestionLane(lane).value
+    try:
+        await connection.hset(_status_key(pdf_id), mapping=fields)
+    except RedisError as e:
+        logger.warning(f"Could not save the task id of {pdf_id}: {e}")
+
+
+def set_state(
+    pdf_id: str,
+    state: IngestionState,
+    redis_conn: sync_redis.Redis | None = None,
+    **progress,
+) -> bool:
+    """Moves a document to a new ingestion state, recording the transition
+    time and any progress counts. A document in a final state (ready or
+    failed) is only moved back to parsing, by a new ingestion. Blocking,
+    meant for the celery worker.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        state (IngestionState): The state to move to.
+        redis_conn (sync_redis.Redis|None): Optional blocking redis connection
+        **progress: Progress fields to save alongside the state, e.g.
+            `page_count`, `chunk_count`, `embedded_chunks` or `error`.
+            None values are ignored.
+
+    Returns:
+        bool: Whether the state was saved, False if the document is in a
+        final state or Redis is unavailable.
+    """
+    connection = redis_conn or default_sync_connection
+    fields = _state_fields(state, **progress)
+    args = [item for field in fields.items() for item in field]
+    try:
+        saved = connection.eval(
+            _SET_STATE_SCRIPT, 1, _status_key(pdf_id), state.value, *args
+        )
+    except RedisError as e:
+        logger.warning(f"Could not save the ingestion state of {pdf_id}: {e}")
+        return False
+
+    if not saved:
+        logger.info(f"Not moving {pdf_id} to {state.value}, its ingestion has ended")
+    return bool(saved)
+
+
+def get_state(
+    pdf_id: str, redis_conn: sync_redis.Redis | None = None
+) -> Optional[IngestionState]:
+    """Loads the current ingestion state of a document, like `load_state`.
+    Blocking, meant for the celery worker.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        redis_conn (sync_redis.Redis|None): Optional blocking redis connection
+
+    Returns:
+        Optional[IngestionState]: The current state, or None if the document
+        has no status or Redis is unavailable.
+    """
+    connection = redis_conn or default_sync_connection
+    try:
+        state = connection.hget(_status_key(pdf_id), "state")
+    except RedisError as e:
+        logger.warning(f"Could not load the ingestion state of {pdf_id}: {e}")
+        return None
+
+    if state is None:
+        return None
+    return IngestionState(_decode(state))
+
+
+def reset_windows(pdf_id: str, redis_conn: sync_redis.Redis | None = None) -> None:
+    """Resets the stored window counts of a document before its windows are
+    queued. Blocking, meant for the celery worker.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        redis_conn (sync_redis.Redis|None): Optional blocking redis connection
+
+    Returns:
+        None: This function does not return any value.
+    """
+    connection = redis_conn or default_sync_connection
+    try:
+        connection.hdel(_status_key(pdf_id), *_WINDOW_FIELDS)
+    except RedisError as e:
+        logger.warning(f"Could not reset the ingestion progress of {pdf_id}: {e}")
+
+
+def complete_window(
+    pdf_id: str,
+    window_count: Optional[int] = None,
+    redis_conn: sync_redis.Redis | None = None,
+) -> bool:
+    """Atomically counts a stored window of a document, or sets the number of
+    windows once the whole document is parsed, as windows are stored while
+    the next ones are parsed. Blocking, meant for the celery worker.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        window_count (Optional[int], optional): The number of windows of the
+            document, set by the parsing task instead of counting a window.
+            Defaults to None.
+        redis_conn (sync_redis.Redis|None): Optional blocking redis connection
+
+    Returns:
+        bool: True for the single call completing the last window, once the
+        number of windows is known, False otherwise or if Redis is unavailable.
+    """
+    connection = redis_conn or default_sync_connection
+    stored = 0 if window_count is not None else 1
+    try:
+        done = connection.eval(
+            _COMPLETE_WINDOW_SCRIPT,
+            1,
+            _status_key(pdf_id),
+            stored,
+            "" if window_count is None else window_count,
+        )
+    except RedisError as e:
+        logger.warning(f"Could not save the ingestion progress of {pdf_id}: {e}")
+        return False
+    return bool(done)
+
+
+def set_progress(
+    pdf_id: str, redis_conn: sync_redis.Redis | None = None, **progress
+) -> None:
+    """Updates the progress counts of a document without changing its state.
+    Blocking, meant for the celery worker.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        redis_conn (sync_redis.Redis|None): Optional blocking redis connection
+        **progress: Progress fields to save. None values are ignored.
+
+    Returns:
+        None: This function does not return any value.
+    """
+    connection = redis_conn or default_sync_connection
+    fields = {k: v for k, v in progress.items() if v is not None}
+    if not fields:
+        return
+    try:
+        connection.hset(_status_key(pdf_id), mapping=fields)
+    except RedisError as e:
+        logger.warning(f"Could not save the ingestion progress of {pdf_id}: {e}")
+
+
+def incr_progress(
+    pdf_id: str, field: str, amount: int, redis_conn: sync_redis.Redis | None = None
+) -> Optional[int]:
+    """Atomically increments a progress count of a document, e.g. when several
+    tasks embed parts of the same document in parallel. Blocking, meant for
+    the celery worker.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        field (str): The progress field to increment, e.g. `embedded_chunks`.
+        amount (int): The amount to add.
+        redis_conn (sync_redis.Redis|None): Optional blocking redis connection
+
+    Returns:
+        Optional[int]: The count after the increment, or None if Redis is unavailable.
+    """
+    connection = redis_conn or default_sync_connection
+    try:
+        return connection.hincrby(_status_key(pdf_id), field, amount)
+    except RedisError as e:
+        logger.warning(f"Could not save the ingestion progress of {pdf_id}: {e}")
+        return None
+
+
+async def load_state(
+    pdf_id: str, redis_conn: redis.Redis | None = None
+) -> Optional[IngestionState]:
+    """Loads only the current ingestion state of a document in O(1).
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        redis_conn (redis.Redis|None): Optional redis connection
+
+    Returns:
+        Optional[IngestionState]: The current state, or None if the document
+        has no status or Redis is unavailable.
+    """
+    connection = redis_conn or default_connection
+    try:
+        state = await connection.hget(_status_key(pdf_id), "state")
+    except RedisError as e:
+        logger.warning(f"Could not load the ingestion state of {pdf_id}: {e}")
+        return None
+
+    if state is None:
+        return None
+    return IngestionState(_decode(state))
+
+
+async def load_status(
+    pdf_id: str, redis_conn: redis.Redis | None = None
+) -> Optional[IngestionStatus]:
+    """Loads the full ingestion status of a document, with stage timings.
+
+    Args:
+        pdf_id (str): The ID of the PDF document.
+        redis_conn (redis.Redis|None): Optional redis connection
+
+    Returns:
+        Optional[IngestionStatus]: The ingestion status, or None if the
+        document has no status or Redis is unavailable.
+    """
+    connection = redis_conn or default_connection
+    try:
+        raw = await connection.hgetall(_status_key(pdf_id))
+    except RedisError as e:
+        logger.warning(f"Could not load the ingestion status of {pdf_id}: {e}")
+        return None
+    if not raw:
+        return None
+
+    fields = {_decode(k): _decode(v) for k, v in raw.items()}
+    state = IngestionState(fields["state"])
+    return IngestionStatus(
+        document_id=pdf_id,
+        state=state,
+        task_id=fields.get("task_id"),
+        lane=fields.get("lane"),
+        page_count=fields.get("page_count"),
+        chunk_count=fields.get("chunk_count"),
+        embedded_chunks=fields.get("embedded_chunks", 0),
+        indexed_pages=fields.get("indexed_pages", 0),
+        error=fields.get("error"),
+        timings=_get_timings(fields, state),
+    )
+
+
+def _get_timings(fields: dict, state: IngestionState) -> dict[str, float]:
+    """Derives the seconds spent in each stage from the state entry times.
+    Stages that are still running are measured up to now."""
+    entered_at = [
+        (s.value, float(fields[f"{s.value}_at"]))
+        for s in _STATE_ORDER
+        if f"{s.value}_at" in fields
+    ]
+
+    end = time.time()
+    if state in _FINAL_STATES and f"{state.value}_at" in fields:
+        end = float(fields[f"{state.value}_at"])
+
+    timings = {}
+    for i, (stage, started_at) in enumerate(entered_at):
+        finished_at = entered_at[i + 1][1] if i + 1 < len(entered_at) else end
+        timings[stage] = round(max(finished_at - started_at, 0.0), 3)
+    return timings
+
+
+def _decode(value: bytes | str) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
@@ -0,0 +1,210 @@
+"""
+Module for compacting the chat history passed to the LLM.
+
+Only the most recent turns of a chat are passed verbatim, up to
+`history_max_turns` turns and `history_token_budget` estimated tokens. The
+older turns are folded into a rolling summary, passed in the system prompts
+instead. The summary is refreshed by a background task once turns leave the
+verbatim window, so answers never wait for it, and the prompt of a turn stays
+bounded however long the chat runs.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from app.config import app_config
+from app.services.history_service import (
+    count_turns,
+    load_history,
+    load_summary,
+    load_turns,
+    save_summary,
+)
+from app.utils.async_utils import run_blocking
+from app.utils.logger import logger
+
+SUMMARIZE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You maintain the summary of a conversation between a user and an AI "
+            "assistant answering questions about PDF documents. Update the summary "
+            "with the new turns, keeping the facts, names, numbers, questions and "
+            "conclusions needed to continue the conversation. Answer with the "
+            "updated summary only, in at most {max_words} words.",
+        ),
+        ("human", "Current summary:\n{summary}\n\nNew turns:\n{turns}"),
+    ]
+)
+
+# refreshes in progress, one per conversation
+_pending_refreshes: dict[tuple[str, Optional[str]], asyncio.Future] = {}
+
+
+@dataclass
+class CompactedHistory:
+    """The chat history of a conversation as passed to the LLM.
+
+    Attributes:
+        history (list[tuple]): The system prompt, the greeting, the most recent
+            turns and the input placeholder, or an empty list without history.
+        summary (str): Summary of the turns older than the verbatim ones.
+        summarized_turns (int): Number of oldest turns covered by the summary.
+        window_start (int): Index of the oldest turn passed verbatim.
+    """
+
+    history: list[tuple]
+    summary: str = ""
+    summarized_turns: int = 0
+    window_start: int = 0
+
+    @property
+    def window_turns(self) -> int:
+        """Number of turns passed verbatim."""
+        # system prompt, greeting and input placeholder around the turns
+        return max(len(self.history) - 3, 0) // 2
+
+    @property
+    def stale(self) -> bool:
+        """True if turns older than the verbatim ones are missing from the summary."""
+        return self.window_start > self.summarized_turns
+
+    @property
+    def truncated(self) -> bool:
+        """True if older turns are left out of the verbatim history, or will
+        be once the next turn is appended."""
+        return (
+            self.window_start > 0 or self.window_turns >= app_config.history_max_turns
+        )
+
+
+def load_compacted_history(history_id: str, user_id: str = None) -> CompactedHistory:
+    """Loads the most recent turns of a conversation fitting the history
+    limits, and the summary of the older turns.
+
+    Args:
+        history_id (str): The ID of the conversation, a document or document set ID.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        CompactedHistory: The verbatim turns and the summary.
+    """
+    history = load_history(
+        history_id,
+        user_id,
+        max_turns=app_config.history_max_turns,
+        token_budget=app_config.history_token_budget,
+    )
+    if not app_config.history_summary_enabled:
+        return CompactedHistory(history=history)
+
+    compacted = CompactedHistory(history, *load_summary(history_id, user_id))
+    compacted.window_start = count_turns(history_id, user_id) - compacted.window_turns
+    return compacted
+
+
+async def aload_compacted_history(
+    history_id: str, user_id: str = None
+) -> CompactedHistory:
+    """Asynchronously loads the most recent turns of a conversation fitting
+    the history limits, and the summary of the older turns.
+
+    Args:
+        history_id (str): The ID of the conversation, a document or document set ID.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        CompactedHistory: The verbatim turns and the summary.
+    """
+    return await run_blocking(load_compacted_history, history_id, user_id)
+
+
+def format_summary(summary: str) -> str:
+    """Formats a summary for the end of a system prompt.
+
+    Args:
+        summary (str): The summary, possibly empty.
+
+    Returns:
+        str: The text to append to the system prompt, empty without summary.
+    """
+    if not summary:
+        return ""
+    return f"\n\nSummary of the earlier conversation:\n{summary}"
+
+
+def schedule_summary_refresh(
+    history_id: str, llm: BaseChatModel, user_id: str = None
+) -> asyncio.Future:
+    """Refreshes the summary of a conversation in the background, unless a
+    refresh of the conversation is already in progress.
+
+    Args:
+        history_id (str): The ID of the conversation, a document or document set ID.
+        llm (BaseChatModel): The chat model writing the summary.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        asyncio.Future: The refresh in progress, resolving to True if the
+        summary was updated.
+    """
+    key = (history_id, user_id)
+    refresh = _pending_refreshes.get(key)
+    if refresh is None:
+        refresh = asyncio.ensure_future(refresh_summary(history_id, llm, user_id))
+        _pending_refreshes[key] = refresh
+        refresh.add_done_callback(lambda _: _pending_refreshes.pop(key, None))
+    return refresh
+
+
+async def refresh_summary(
+    history_id: str, llm: BaseChatModel, user_id: str = None
+) -> bool:
+    """Folds the turns which left the verbatim history into the summary of
+    a conversation. Best effort, errors are logged.
+
+    Args:
+        history_id (str): The ID of the conversation, a document or document set ID.
+        llm (BaseChatModel): The chat model writing the summary.
+        user_id (str, optional): The ID of the user associated with the history.
+
+    Returns:
+        bool: True if the summary was updated.
+    """
+    try:
+        compacted = await aload_compacted_history(history_id, user_id)
+        if not compacted.stale:
+            return False
+
+        turns = await run_blocking(
+            load_turns,
+            history_id,
+            user_id,
+            compacted.summarized_turns,
+            compacted.window_start,
+        )
+        summary = await (SUMMARIZE_PROMPT | llm | StrOutputParser()).ainvoke(
+            {
+                "max_words": app_config.history_summary_max_words,
+                "summary": compacted.summary or "(empty)",
+                "turns": _format_turns(turns),
+            }
+        )
+        saved = await run_blocking(
+            save_summary, history_id, summary.strip(), compacted.window_start, user_id
+        )
+        if saved:
+            logger.debug(
+                f"summarized {compacted.window_start} turns of the chat history of {history_id}"
+            )
+        return saved
+    except Exception as e:
+        logger.warning(f"Could not refresh the chat history summary of {history_id}: {e}")
+        return False
+
+
+def _format_turns(turns: list[tuple[str, str]]) -> str:
+    return "\n\n".join(f"User: {query}\nAssistant: {answer}" for query, answer in turns)
@@ -1,11 +1,23 @@
 """
-Module for managing vector stores using LangChain and Chroma.
+Module for managing vector stores using LangChain.
+
+Two backends are available, selected with `vector_backend` in app/config.py:
+- chroma: A Chroma collection per document.
+- numpy: A memory-mapped NumPy matrix per document, searched by brute force.
 """
 
+import heapq
+import uuid
 from pathlib import Path
+from typing import Optional
 from langchain.schema import Document
 from langchain_chroma import Chroma
 from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from app.config import app_config
+from app.services.vectorstores import NumpyVectorStore
+
+VECTOR_BACKENDS = ("chroma", "numpy")
 
 
 def save_vectorstore(
@@ -13,18 +25,44 @@ def save_vectorstore(
     documents: list[Document],
     embeddings: Embeddings,
     dir_path: str,
-) -> Chroma:
-    """Saves a list of documents into a Chroma vector store.
+    vectors: Optional[list[list[float]]] = None,
+    backend: Optional[str] = None,
+    ids: Optional[list[str]] = None,
+) -> VectorStore:
+    """Saves a list of documents into a vector store.
 
     Args:
         col_name (str | Path): The name of the collection to save the documents.
         documents (list[Document]): A list of Document objects to save.
         embeddings (Embeddings): The embedding function to use for the documents.
         dir_path (str): The directory path for persistent storage.
+        vectors (Optional[list[list[float]]], optional): Precomputed vectors of
+            the documents, in the same order. If provided, the vectors are
+            upserted as is and the embedding function is not called.
+        backend (Optional[str], optional): The vector store backend, one of
+            `VECTOR_BACKENDS`. Defaults to `vector_backend` from the config.
+        ids (Optional[list[str]], optional): Ids of the documents, used with
+            precomputed vectors. Derived from the chunk position if omitted.
 
     Returns:
-        Chroma: The Chroma vector store instance after saving the documents.
+        VectorStore: The vector store instance after saving the documents.
+
+    Raises:
+        ValueError: If the backend is unknown.
     """
+    backend = _get_backend(backend)
+    if backend == "numpy":
+        if vectors is None:
+            vectors = embeddings.embed_documents([doc.page_content for doc in documents])
+        return _upsert_vectors(
+            col_name, documents, vectors, embeddings, dir_path, backend, ids
+        )
+
+    if vectors is not None:
+        return _upsert_vectors(
+            col_name, documents, vectors, embeddings, dir_path, backend, ids
+        )
+
     return Chroma.from_documents(
         collection_name=col_name,
         # documents=filter_complex_metadata(documents),
@@ -37,18 +75,33 @@ def save_vectorstore(
 
 
 def load_vectorstore(
-    col_name: str, from_dir: str | Path, use_embeddings: Embeddings
-) -> Chroma:
-    """Loads a Chroma vector store from a specified directory.
+    col_name: str,
+    from_dir: str | Path,
+    use_embeddings: Embeddings,
+    backend: Optional[str] = None,
+) -> VectorStore:
+    """Loads a vector store from a specified directory.
 
     Args:
         col_name (str): The name of the collection to load.
         from_dir (str | Path): The directory from which to load the vector store.
         use_embeddings (Embeddings): The embedding function to use with the vector store.
+        backend (Optional[str], optional): The vector store backend, one of
+            `VECTOR_BACKENDS`. Defaults to `vector_backend` from the config.
 
     Returns:
-        Chroma: The loaded Chroma vector store instance.
+        VectorStore: The loaded vector store instance.
+
+    Raises:
+        ValueError: If the backend is unknown.
     """
+    if _get_backend(backend) == "numpy":
+        return NumpyVectorStore(
+            collection_name=str(col_name),
+            embedding_function=use_embeddings,
+            persist_directory=from_dir,
+        )
+
     vectorstore_disk = Chroma(
         collection_name=col_name,
         embedding_function=use_embeddings,
@@ -57,3 +110,106 @@ def load_vectorstore(
         ),  # implicit conversion to prevnet the windowspath issue
     )
     return vectorstore_disk
+
+
+def search_by_vector(
+    vectorstore: VectorStore, embedding: list[float], k: int
+) -> list[tuple[Document, float]]:
+    """Searches a vector store by a query vector, scoring the results by
+    relevance, higher is more relevant (in [0, 1] for normalized embeddings).
+    Scores of stores of the same backend are comparable, so results of
+    several stores can be merged.
+
+    Args:
+        vectorstore (VectorStore): The vector store to search.
+        embedding (list[float]): The query vector.
+        k (int): Number of documents to return.
+
+    Returns:
+        list[tuple[Document, float]]: The documents and relevance scores,
+        most relevant first.
+    """
+    if isinstance(vectorstore, NumpyVectorStore):
+        results = vectorstore.similarity_search_by_vector_with_score(embedding, k=k)
+    else:
+        # returns distances, despite the name
+        results = vectorstore.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k
+        )
+    relevance = vectorstore._select_relevance_score_fn()
+    return [(doc, relevance(score)) for doc, score in results]
+
+
+def merge_search_results(
+    results: list[list[tuple[Document, float]]], k: int
+) -> list[tuple[Document, float]]:
+    """Merges the search results of several vector stores into a single top-k.
+
+    Args:
+        results (list[list[tuple[Document, float]]]): The results of each store,
+            scored by `search_by_vector`.
+        k (int): Number of documents to return.
+
+    Returns:
+        list[tuple[Document, float]]: The documents and relevance scores,
+        most relevant first.
+    """
+    return heapq.nlargest(
+        k,
+        (result for results_ in results for result in results_),
+        key=lambda result: result[1],
+    )
+
+
+def _upsert_vectors(
+    col_name: str | Path,
+    documents: list[Document],
+    vectors: list[list[float]],
+    embeddings: Embeddings,
+    dir_path: str,
+    backend: str,
+    ids: Optional[list[str]] = None,
+) -> VectorStore:
+    """Upserts documents with precomputed vectors into a vector store.
+    Chunk ids default to ids derived from the chunk position, so re-ingesting
+    a document replaces its chunks instead of duplicating them.
+    """
+    if len(documents) != len(vectors):
+        raise ValueError("Number of documents and vectors must match.")
+
+    vectorstore = load_vectorstore(col_name, dir_path, embeddings, backend=backend)
+    if ids is None:
+        ids = [_chunk_id(str(col_name), doc, i) for i, doc in enumerate(documents)]
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.add_embeddings(
+            texts=[doc.page_content for doc in documents],
+            vectors=vectors,
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids,
+        )
+        return vectorstore
+
+    collection = vectorstore._collection
+    batch_size = vectorstore._client.get_max_batch_size()
+    for start in range(0, len(documents), batch_size):
+        end = start + batch_size
+        collection.upsert(
+            ids=ids[start:end],
+            embeddings=vectors[start:end],
+            documents=[doc.page_content for doc in documents[start:end]],
+            metadatas=[doc.metadata or None for doc in documents[start:end]],
+        )
+    return vectorstore
+
+
+def _chunk_id(col_name: str, document: Document, index: int) -> str:
+    page = document.metadata.get("page", "")
+    start_index = document.metadata.get("start_index", index)
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{col_name}:{page}:{start_index}"))
+
+
+def _get_backend(backend: Optional[str]) -> str:
+    backend = backend or app_config.vector_backend
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend: {backend}")
+    return backend
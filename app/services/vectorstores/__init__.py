@@ -0,0 +1 @@
+from .numpy_vectorstore import NumpyVectorStore
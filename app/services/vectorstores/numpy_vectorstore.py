@@ -0,0 +1,428 @@
+"""
+Module for an in-process vector store backed by NumPy.
+
+Each collection is persisted as a directory holding a float32 `.npy` matrix
+of L2-normalized vectors and a JSON sidecar with the ids, texts and metadata
+of the rows. Every write creates a new matrix file named by a version, and
+the sidecar, replaced last, points to it, so a single atomic replace switches
+readers from one write to the next. Writes read, modify and rewrite the whole
+collection, so they hold an exclusive lock on a lock file of the collection,
+shared by every thread and process writing to it. At query time the matrix is memory-mapped and searched by brute
+force with a single matrix-vector product and `argpartition`, which is faster
+than an approximate index for the few hundred chunks of a typical PDF.
+
+Scores are cosine similarities, higher is more similar.
+"""
+
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from app.utils.file_utils import lock_file
+
+# matrix of collections written before matrix files were versioned
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.json"
+# key of the sidecar naming the matrix file of the same write
+VECTORS_KEY = "vectors_file"
+# locked by the writers of the collection
+LOCK_FILE = ".lock"
+
+
+class NumpyVectorStore(VectorStore):
+    """Brute-force vector store over a memory-mapped float32 matrix.
+
+    Attributes:
+        collection_name (str): The name of the collection.
+        persist_directory (Path): The directory holding the collections.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        embedding_function: Embeddings,
+        persist_directory: str | Path,
+    ):
+        """Initializes a handle to a collection. The collection is loaded
+        lazily on the first read.
+
+        Args:
+            collection_name (str): The name of the collection.
+            embedding_function (Embeddings): The embedding function for texts and queries.
+            persist_directory (str | Path): The directory holding the collections.
+        """
+        self.collection_name = str(collection_name)
+        self._embedding_function = embedding_function
+        self.persist_directory = Path(persist_directory)
+        self._lock = threading.Lock()
+        # (matrix, chunks) snapshot, replaced as a whole so readers never
+        # see a matrix and chunks from different writes
+        self._data: Optional[tuple[np.ndarray, dict]] = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    @property
+    def _collection_path(self) -> Path:
+        return self.persist_directory / self.collection_name
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        collection_name: str = "default",
+        persist_directory: str | Path = ".",
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        """Creates a collection from texts, embedding them with the given function.
+
+        Args:
+            texts (list[str]): The texts to add.
+            embedding (Embeddings): The embedding function.
+            metadatas (Optional[list[dict]], optional): Metadata of each text.
+            collection_name (str, optional): The name of the collection.
+            persist_directory (str | Path, optional): The directory holding the collections.
+            ids (Optional[list[str]], optional): Ids of the texts. Random if omitted.
+
+        Returns:
+            NumpyVectorStore: The vector store holding the texts.
+        """
+        store = cls(collection_name, embedding, persist_directory)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        """Embeds and adds texts to the collection.
+
+        Args:
+            texts (Iterable[str]): The texts to add.
+            metadatas (Optional[list[dict]], optional): Metadata of each text.
+            ids (Optional[list[str]], optional): Ids of the texts. Random if omitted.
+
+        Returns:
+            list[str]: The ids of the added texts.
+        """
+        texts = list(texts)
+        vectors = self._embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        vectors: list[list[float]],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        """Adds texts with precomputed vectors to the collection. Rows with
+        existing ids are replaced. Concurrent writers of the collection, in
+        any thread or process, are serialized.
+
+        Args:
+            texts (list[str]): The texts to add.
+            vectors (list[list[float]]): The vectors of the texts.
+            metadatas (Optional[list[dict]], optional): Metadata of each text.
+            ids (Optional[list[str]], optional): Ids of the texts. Random if omitted.
+
+        Returns:
+            list[str]: The ids of the added texts.
+
+        Raises:
+            ValueError: If the number of texts, vectors, metadatas and ids do not
+                match, or the vector dimension differs from the collection.
+        """
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        if not len(texts) == len(vectors) == len(metadatas) == len(ids):
+            raise ValueError("Number of texts, vectors, metadatas and ids must match.")
+
+        new_matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self._write_lock():
+            matrix, chunks = self._read()
+            if len(chunks["ids"]) and matrix.shape[1] != new_matrix.shape[1]:
+                raise ValueError("Vector dimension does not match the collection.")
+
+            # keep the rows that are not replaced, then append the new ones
+            replaced = set(ids)
+            keep = [i for i, id_ in enumerate(chunks["ids"]) if id_ not in replaced]
+            matrix = np.concatenate([matrix[keep], new_matrix]) if keep else new_matrix
+            chunks = {
+                key: [chunks[key][i] for i in keep] + new
+                for key, new in (("ids", ids), ("documents", texts), ("metadatas", metadatas))
+            }
+            self._write(matrix, chunks)
+        return ids
+
+    def delete(self, ids: Optional[list[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Deletes rows by id, or the whole collection if no ids are given.
+
+        Args:
+            ids (Optional[list[str]], optional): The ids to delete.
+
+        Returns:
+            Optional[bool]: True when the deletion succeeded.
+        """
+        with self._write_lock():
+            if ids is None:
+                try:
+                    os.remove(self._collection_path / CHUNKS_FILE)
+                except FileNotFoundError:
+                    pass
+                self._remove_vectors()
+                self._data = None
+                return True
+
+            matrix, chunks = self._read()
+            removed = set(ids)
+            keep = [i for i, id_ in enumerate(chunks["ids"]) if id_ not in removed]
+            self._write(
+                matrix[keep],
+                {key: [values[i] for i in keep] for key, values in chunks.items()},
+            )
+        return True
+
+    def get(
+        self,
+        ids: Optional[list[str]] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        include: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """Gets rows of the collection, with the same result format as Chroma.
+
+        Args:
+            ids (Optional[list[str]], optional): Only return these ids.
+            where (Optional[dict], optional): Only return rows whose metadata
+                equals all of the given key value pairs.
+            limit (Optional[int], optional): Maximum number of rows to return.
+            include (Optional[list[str]], optional): Fields to include besides
+                the ids, "documents" and/or "metadatas". Defaults to both.
+
+        Returns:
+            dict[str, Any]: The "ids" and included fields of the rows.
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        _, chunks = self._load()
+
+        rows = self._filter(chunks, where)
+        if ids is not None:
+            wanted = set(ids)
+            rows = [i for i in rows if chunks["ids"][i] in wanted]
+        rows = rows[:limit] if limit is not None else rows
+
+        result = {"ids": [chunks["ids"][i] for i in rows]}
+        for field in ("documents", "metadatas"):
+            result[field] = [chunks[field][i] for i in rows] if field in include else None
+        return result
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> list[Document]:
+        """Returns the k documents most similar to a query.
+
+        Args:
+            query (str): The query text.
+            k (int, optional): Number of documents to return. Defaults to 4.
+            filter (Optional[dict], optional): Metadata equality filter.
+
+        Returns:
+            list[Document]: The most similar documents, most similar first.
+        """
+        docs_and_scores = self.similarity_search_with_score(query, k, filter=filter)
+        return [doc for doc, _ in docs_and_scores]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        """Returns the k documents most similar to a query with their cosine similarity.
+
+        Args:
+            query (str): The query text.
+            k (int, optional): Number of documents to return. Defaults to 4.
+            filter (Optional[dict], optional): Metadata equality filter.
+
+        Returns:
+            list[tuple[Document, float]]: The documents and scores, most similar first.
+        """
+        vector = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(vector, k, filter=filter)
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        """Returns the k documents most similar to a vector.
+
+        Args:
+            embedding (list[float]): The query vector.
+            k (int, optional): Number of documents to return. Defaults to 4.
+            filter (Optional[dict], optional): Metadata equality filter.
+
+        Returns:
+            list[Document]: The most similar documents, most similar first.
+        """
+        docs_and_scores = self.similarity_search_by_vector_with_score(
+            embedding, k, filter=filter
+        )
+        return [doc for doc, _ in docs_and_scores]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+    ) -> list[tuple[Document, float]]:
+        """Returns the k documents most similar to a vector with their cosine similarity.
+
+        Args:
+            embedding (list[float]): The query vector.
+            k (int, optional): Number of documents to return. Defaults to 4.
+            filter (Optional[dict], optional): Metadata equality filter.
+
+        Returns:
+            list[tuple[Document, float]]: The documents and scores, most similar first.
+        """
+        matrix, chunks = self._load()
+        rows = None if filter is None else np.asarray(self._filter(chunks, filter), dtype=np.intp)
+        if rows is not None:
+            matrix = matrix[rows]
+        if k <= 0 or matrix.shape[0] == 0:
+            return []
+
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        scores = matrix @ query
+
+        # partial sort, only the top k rows are ordered
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            row = int(rows[i]) if rows is not None else int(i)
+            doc = Document(
+                id=chunks["ids"][row],
+                page_content=chunks["documents"][row],
+                metadata=chunks["metadatas"][row] or {},
+            )
+            results.append((doc, float(scores[i])))
+        return results
+
+    def _select_relevance_score_fn(self):
+        # cosine similarity in [-1, 1] to a relevance score in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """Holds the write lock of the collection. Writers read the collection
+        from disk once locked, as their snapshot may predate another write."""
+        self._collection_path.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self._collection_path / LOCK_FILE, "ab") as f:
+            with lock_file(f):
+                yield
+
+    def _load(self) -> tuple[np.ndarray, dict]:
+        data = self._data
+        if data is None:
+            data = self._data = self._read()
+        return data
+
+    def _read(self, retries: int = 1) -> tuple[np.ndarray, dict]:
+        try:
+            with open(self._collection_path / CHUNKS_FILE, "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+        except FileNotFoundError:
+            return np.empty((0, 0), dtype=np.float32), _empty_chunks()
+
+        vectors_file = chunks.pop(VECTORS_KEY, VECTORS_FILE)
+        try:
+            matrix = np.load(self._collection_path / vectors_file, mmap_mode="r")
+        except FileNotFoundError:
+            if retries:
+                # removed by a write that replaced the chunks after they were
+                # read, the new chunks point to the new vectors
+                return self._read(retries - 1)
+            matrix = None
+
+        if matrix is None or matrix.shape[0] != len(chunks["ids"]):
+            raise ValueError(
+                f"Collection '{self.collection_name}' is corrupted, "
+                "the vectors do not match the chunks."
+            )
+        return matrix, chunks
+
+    def _write(self, matrix: np.ndarray, chunks: dict) -> None:
+        self._collection_path.mkdir(parents=True, exist_ok=True)
+        version = uuid.uuid4().hex
+        vectors_file = f"vectors.{version}.npy"
+
+        # the new vectors are not read before the chunks point to them, and
+        # replacing the chunks switches readers to the new write atomically
+        chunks_tmp = self._collection_path / f"{CHUNKS_FILE}.{version}.part"
+        try:
+            with open(self._collection_path / vectors_file, "wb") as f:
+                np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+            with open(chunks_tmp, "w", encoding="utf-8") as f:
+                json.dump({**chunks, VECTORS_KEY: vectors_file}, f)
+            os.replace(chunks_tmp, self._collection_path / CHUNKS_FILE)
+        except BaseException:
+            for path in (chunks_tmp, self._collection_path / vectors_file):
+                if path.exists():
+                    os.remove(path)
+            raise
+
+        self._remove_vectors(keep=vectors_file)
+        # drop the old memory map, the next read maps the new file
+        self._data = None
+
+    def _remove_vectors(self, keep: Optional[str] = None) -> None:
+        """Removes the matrix files of previous writes. Readers holding one
+        open keep their memory map, readers about to open one retry."""
+        for path in self._collection_path.glob("vectors*.npy"):
+            if path.name == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # mapped files can not be removed on Windows, the next write
+                # removes them
+                pass
+
+    @staticmethod
+    def _filter(chunks: dict, where: Optional[dict]) -> list[int]:
+        if not where:
+            return list(range(len(chunks["ids"])))
+        return [
+            i
+            for i, metadata in enumerate(chunks["metadatas"])
+            if all((metadata or {}).get(key) == value for key, value in where.items())
+        ]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _empty_chunks() -> dict:
+    return {"ids": [], "documents": [], "metadatas": []}
@@ -1,15 +1,75 @@
 """
 Module for initiating the Celery tasks, using a Redis broker.
+
+Documents are ingested by a pipeline of tasks running on separate queues, so
+CPU-bound parsing and I/O-bound embedding can be scaled independently and a
+large document does not hold a single worker slot for its whole ingestion:
+
+    parse_pdf_task (parsing.<lane> queue): streams the document page by page
+        into windows of chunks
+        -> per window, queued as soon as it is parsed:
+           embed_chunks_task (embedding.<lane> queue): embeds the window
+           -> store_vectors_task (storing.<lane> queue): upserts the window
+        -> finish_ingestion_task (storing.<lane> queue): marks the document as
+           ready, queued by whichever of the parsing task and the store tasks
+           completes the last window
+
+Documents are routed to the fast or bulk lane by their estimated cost, see
+app/services/queue_service.py.
+
+Stored windows are counted atomically in the ingestion status, as the number
+of windows is only known once the whole document is parsed. Each window is
+queryable as soon as it is upserted, and the document is
+flagged as partial once `ingestion_partial_min_pages` pages are indexed, so
+users can chat with the first pages of a large document while the rest is
+being ingested.
+
+Documents fitting a single window and `full_context_max_tokens` also get
+their text stored, so chats pass it as a whole instead of retrieved chunks.
+
+The chunks are staged as a JSON lines file in the shared data directory
+between the stages, so only document ids and chunk ranges travel through the
+broker, and every task reads only the chunks of its own window.
 """
 
+import json
 import os
-from typing import Any
-from celery import Celery
+import time
+from itertools import islice
+from typing import Any, Callable, Optional
+from celery import Celery, chain
+from celery.result import AsyncResult
+from langchain.schema import Document
 from app.config import env_config, app_config
 from app.utils.logger import logger
-from app.services.document_service import load_document, split_text
-from app.services.embeddings import gemini_embeddings
+from app.services.document_service import (
+    delete_document_text,
+    iter_chunk_windows,
+    load_document,
+    save_document_text,
+    select_context_mode,
+    split_text,
+)
+from app.services.embeddings import (
+    CachedEmbeddings,
+    embed_documents_batched,
+    gemini_embeddings,
+)
 from app.services.vector_service import save_vectorstore
+from app.services.rag_service import invalidate_rag_chain
+from app.services.qa_cache_service import invalidate_qa
+from app.services.search_service import remove_centroids, save_centroid
+from app.services.lexical import load_lexical_index, save_lexical_index
+from app.services.status_service import (
+    complete_window,
+    get_state,
+    incr_progress,
+    reset_windows,
+    set_progress,
+    set_state,
+)
+from app.services.queue_service import lane_queue, record_wait
+from app.models import ContextMode, IngestionLane, IngestionState
 
 REDIS_URL = str(env_config.redis_url)
 
@@ -18,18 +78,40 @@ app = Celery(
     broker=REDIS_URL,
     backend=REDIS_URL,
 )
+# default routes, the lane queues are set per document by start_ingestion
+app.conf.task_routes = {
+    "app.tasks.parse_pdf_task": {
+        "queue": lane_queue(app_config.ingestion_parse_queue, IngestionLane.FAST)
+    },
+    "app.tasks.embed_chunks_task": {
+        "queue": lane_queue(app_config.ingestion_embed_queue, IngestionLane.FAST)
+    },
+    "app.tasks.store_vectors_task": {
+        "queue": lane_queue(app_config.ingestion_store_queue, IngestionLane.FAST)
+    },
+    "app.tasks.finish_ingestion_task": {
+        "queue": lane_queue(app_config.ingestion_store_queue, IngestionLane.FAST)
+    },
+}
 if app_config.is_testing:
     app.conf.update(
         task_always_eager=True,
         task_eager_propagates=True,
+        result_backend="cache+memory://",
     )
 
 
 def process_pdf(file_uuid: str, bind: Any = None) -> None:
-    """Processes a PDF file by loading it, splitting it into chunks,
-    and saving those chunks to a vector store. Can bind with celery
+    """Processes a PDF file progressively: the pages are streamed into windows
+    of chunks, and each window is embedded in concurrent batches and saved to
+    the vector store before the next pages are read, so memory usage is
+    bounded by the window size. The document is flagged as partial once
+    `ingestion_partial_min_pages` pages are queryable. Can bind with celery
     tasks using the bind parameter.
 
+    Runs every stage in the calling thread, see `start_ingestion` for the
+    staged pipeline.
+
     Args:
         file_uuid (str): The unique identifier for the PDF file.
         bind (Any, optional): An optional Celery context,
@@ -40,46 +122,502 @@ def process_pdf(file_uuid: str, bind: Any = None) -> None:
         Exception: Raises an exception if an error occurs during
         processing or saving to the vector store.
     """
-    task_str = "standalone"
-    if bind:
-        task_str = f"task-{bind.request.id}"
-
+    task_str = _task_str(bind)
     logger.info(f"{task_str}: processing document - {file_uuid}")
-    pdf_path = app_config.pdf_path / f"{file_uuid}.pdf"
-    
-    if not os.path.exists(pdf_path):
-        raise FileNotFoundError
 
     try:
-        # prepare document chunks
-        docs = load_document(pdf_path, file_uuid)
-        chunks = split_text(docs)
-
-        # save chunks to vector store
-        save_vectorstore(
-            col_name=file_uuid,
-            documents=chunks,
-            embeddings=gemini_embeddings,
-            dir_path=app_config.chroma_path,
-        )
-        logger.info(f"{task_str}: saved '{file_uuid}' to vectorstore")
+        pdf_path = _pdf_path(file_uuid)
+        set_state(file_uuid, IngestionState.PARSING)
+
+        page_count, chunk_count = None, 0
+        for window in iter_chunk_windows(
+            pdf_path, file_uuid, app_config.ingestion_embedding_task_size
+        ):
+            if page_count is None:
+                page_count = window[0].metadata["page_count"]
+                _save_context(file_uuid, window)
+                set_state(
+                    file_uuid,
+                    IngestionState.EMBEDDING,
+                    page_count=page_count,
+                    embedded_chunks=0,
+                    indexed_pages=0,
+                )
+
+            # embed the window in concurrent batches
+            vectors = embed_documents_batched(
+                [chunk.page_content for chunk in window],
+                gemini_embeddings,
+                on_progress=_progress_counter(file_uuid),
+            )
+            _upsert(file_uuid, window, vectors)
+            chunk_count += len(window)
+            _mark_indexed(file_uuid, _count_pages(window), page_count)
+            logger.info(f"{task_str}: indexed {chunk_count} chunks of '{file_uuid}'")
+
+        if not chunk_count:
+            raise ValueError("No text could be extracted from the document.")
+        _finish(file_uuid, chunk_count, task_str)
+    except Exception as e:
+        _fail(file_uuid, e, task_str)
+        raise e
+
+
+def embed_pdf(
+    file_uuid: str, bind: Any = None
+) -> tuple[list[Document], list[list[float]]]:
+    """Loads a PDF file as a whole, splits it into chunks and embeds the chunks
+    in concurrent batches, without saving them. The chunks and vectors can be
+    passed to another process to be saved with `store_pdf`.
+
+    Args:
+        file_uuid (str): The unique identifier for the PDF file.
+        bind (Any, optional): An optional Celery context. Defaults to None.
+
+    Returns:
+        tuple[list[Document], list[list[float]]]: The chunks and their vectors.
+
+    Raises:
+        Exception: Raises an exception if an error occurs during processing.
+    """
+    task_str = _task_str(bind)
+    try:
+        chunks = _parse(file_uuid, task_str)
 
+        # embed chunks in concurrent batches
+        vectors = embed_documents_batched(
+            [chunk.page_content for chunk in chunks],
+            gemini_embeddings,
+            on_progress=lambda done: set_progress(file_uuid, embedded_chunks=done),
+        )
+        logger.info(f"{task_str}: embedded {len(chunks)} chunks of '{file_uuid}'")
     except Exception as e:
-        # intercept exception to log and roll-back
-        logger.error(f"{task_str}: error processing the document, removing the file...")
-        if os.path.isfile(pdf_path):
-            os.remove(pdf_path)
+        _fail(file_uuid, e, task_str)
+        raise e
+
+    return chunks, vectors
+
 
-        # reraise the exception
+def store_pdf(
+    file_uuid: str,
+    chunks: list[Document],
+    vectors: list[list[float]],
+    bind: Any = None,
+) -> None:
+    """Saves the embedded chunks of a PDF file to the vector store.
+
+    Args:
+        file_uuid (str): The unique identifier for the PDF file.
+        chunks (list[Document]): The chunks of the document.
+        vectors (list[list[float]]): The vectors of the chunks.
+        bind (Any, optional): An optional Celery context. Defaults to None.
+
+    Raises:
+        Exception: Raises an exception if an error occurs while saving to
+        the vector store.
+    """
+    task_str = _task_str(bind)
+    try:
+        _store(file_uuid, chunks, vectors, task_str)
+    except Exception as e:
+        _fail(file_uuid, e, task_str)
         raise e
 
 
+def start_ingestion(
+    file_uuid: str, lane: IngestionLane = IngestionLane.FAST
+) -> AsyncResult:
+    """Starts the staged ingestion pipeline of a document in an ingestion lane.
+
+    Args:
+        file_uuid (str): The unique identifier for the PDF file.
+        lane (IngestionLane, optional): The lane to run the parsing and
+            embedding stages in. Defaults to the fast lane.
+
+    Returns:
+        AsyncResult: The result of the parsing task, whose id identifies
+        the ingestion.
+    """
+    return parse_pdf_task.apply_async(
+        args=[file_uuid],
+        kwargs={"lane": IngestionLane(lane).value, "enqueued_at": time.time()},
+        queue=lane_queue(app_config.ingestion_parse_queue, lane),
+    )
+
+
 @app.task(bind=True)
 def process_pdf_task(self, file_uuid: str):
-    """Celery task wrapper for processing a PDF file.
+    """Celery task wrapper for processing a PDF file in a single task.
 
     Args:
         self: The current task instance.
         file_uuid (str): The unique identifier for the PDF file.
     """
     process_pdf(file_uuid, bind=self)
+
+
+@app.task(bind=True)
+def parse_pdf_task(
+    self,
+    file_uuid: str,
+    lane: str = IngestionLane.FAST.value,
+    enqueued_at: Optional[float] = None,
+):
+    """Streams a PDF file into windows of chunks, queuing the embedding and
+    upsert of each window over `embed_chunks_task` and `store_vectors_task`
+    subtasks as soon as the window is parsed. `finish_ingestion_task` is
+    queued once every window is stored.
+
+    Args:
+        self: The current task instance.
+        file_uuid (str): The unique identifier for the PDF file.
+        lane (str, optional): The ingestion lane of the document, the
+            embedding and storing subtasks run in the same lane. Defaults to "fast".
+        enqueued_at (Optional[float], optional): Time the task was queued,
+            used to record the wait time of the lane. Defaults to None.
+    """
+    task_str = _task_str(self)
+    logger.info(f"{task_str}: parsing document - {file_uuid} ({lane} lane)")
+    if enqueued_at is not None:
+        record_wait(lane, time.time() - enqueued_at)
+
+    embed_queue = lane_queue(app_config.ingestion_embed_queue, lane)
+    store_queue = lane_queue(app_config.ingestion_store_queue, lane)
+
+    def queue_window(start: int, end: int, pages: int, page_count: int):
+        chain(
+            embed_chunks_task.s(file_uuid, start, end).set(queue=embed_queue),
+            store_vectors_task.s(file_uuid, start, end, pages, page_count, lane).set(
+                queue=store_queue
+            ),
+        ).apply_async()
+
+    try:
+        windows = _save_chunks(file_uuid, task_str, queue_window)
+    except Exception as e:
+        _fail(file_uuid, e, task_str)
+        raise e
+
+    if windows is None:
+        logger.info(f"{task_str}: '{file_uuid}' failed, stopped parsing")
+    elif complete_window(file_uuid, window_count=len(windows)):
+        # every window was stored while the document was parsed
+        finish_ingestion_task.apply_async(args=[file_uuid], queue=store_queue)
+
+
+@app.task(bind=True)
+def embed_chunks_task(self, file_uuid: str, start: int, end: int) -> Optional[list]:
+    """Embeds a range of the staged chunks of a document.
+
+    With the embedding cache enabled, the vectors are persisted by the cache
+    and not returned, keeping them out of the result backend.
+
+    Args:
+        self: The current task instance.
+        file_uuid (str): The unique identifier for the PDF file.
+        start (int): Index of the first chunk to embed.
+        end (int): Index after the last chunk to embed.
+
+    Returns:
+        Optional[list]: The vectors of the chunks, or None if they are cached.
+    """
+    task_str = _task_str(self)
+    try:
+        chunks = _load_chunks(file_uuid, start, end)
+        vectors = embed_documents_batched(
+            [chunk.page_content for chunk in chunks],
+            gemini_embeddings,
+            on_progress=_progress_counter(file_uuid),
+        )
+        logger.info(f"{task_str}: embedded chunks {start}-{end} of '{file_uuid}'")
+    except Exception as e:
+        _fail(file_uuid, e, task_str)
+        raise e
+
+    if isinstance(gemini_embeddings, CachedEmbeddings):
+        return None
+    return vectors
+
+
+@app.task(bind=True)
+def store_vectors_task(
+    self,
+    vectors: Optional[list],
+    file_uuid: str,
+    start: int,
+    end: int,
+    pages: int,
+    total_pages: int,
+    lane: str = IngestionLane.FAST.value,
+):
+    """Upserts a window of embedded chunks into the vector store, making
+    them queryable, and queues `finish_ingestion_task` if it completes the
+    last window. Stops early if another window failed the document, and
+    removes the indexes again if it failed during the upsert.
+
+    Args:
+        self: The current task instance.
+        vectors (Optional[list]): The result of the embedding subtask.
+        file_uuid (str): The unique identifier for the PDF file.
+        start (int): Index of the first chunk of the window.
+        end (int): Index after the last chunk of the window.
+        pages (int): Number of pages in the window.
+        total_pages (int): Number of pages of the document.
+        lane (str, optional): The ingestion lane of the document. Defaults
+            to "fast".
+    """
+    task_str = _task_str(self)
+    if get_state(file_uuid) == IngestionState.FAILED:
+        logger.info(f"{task_str}: '{file_uuid}' failed, skipping chunks {start}-{end}")
+        return
+
+    try:
+        chunks = _load_chunks(file_uuid, start, end)
+        if vectors is None:
+            # the embedding subtask persisted the vectors in the embedding cache
+            vectors = gemini_embeddings.embed_documents(
+                [chunk.page_content for chunk in chunks]
+            )
+
+        _upsert(file_uuid, chunks, vectors)
+        if get_state(file_uuid) == IngestionState.FAILED:
+            # a sibling window failed while this one was upserting
+            _remove_indexes(file_uuid)
+            return
+        _mark_indexed(file_uuid, pages, total_pages)
+        logger.info(f"{task_str}: indexed chunks {start}-{end} of '{file_uuid}'")
+    except Exception as e:
+        _fail(file_uuid, e, task_str)
+        raise e
+
+    if complete_window(file_uuid):
+        finish_ingestion_task.apply_async(
+            args=[file_uuid], queue=lane_queue(app_config.ingestion_store_queue, lane)
+        )
+
+
+@app.task(bind=True)
+def finish_ingestion_task(self, file_uuid: str):
+    """Marks a document as ready once every window is upserted.
+
+    Args:
+        self: The current task instance.
+        file_uuid (str): The unique identifier for the PDF file.
+    """
+    try:
+        _finish(file_uuid, _count_chunks(file_uuid), _task_str(self))
+    finally:
+        _remove_chunks(file_uuid)
+
+
+def _task_str(bind: Any) -> str:
+    if bind:
+        return f"task-{bind.request.id}"
+    return "standalone"
+
+
+def _pdf_path(file_uuid: str):
+    pdf_path = app_config.pdf_path / f"{file_uuid}.pdf"
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError
+    return pdf_path
+
+
+def _parse(file_uuid: str, task_str: str) -> list[Document]:
+    pdf_path = _pdf_path(file_uuid)
+
+    # prepare document chunks
+    set_state(file_uuid, IngestionState.PARSING)
+    docs = load_document(pdf_path, file_uuid)
+    chunks = split_text(docs)
+    if not chunks:
+        raise ValueError("No text could be extracted from the document.")
+    select_context_mode(docs, chunks)
+    _save_context(file_uuid, chunks)
+
+    set_state(
+        file_uuid,
+        IngestionState.EMBEDDING,
+        page_count=docs[0].metadata["page_count"],
+        chunk_count=len(chunks),
+        embedded_chunks=0,
+    )
+    logger.info(f"{task_str}: split '{file_uuid}' into {len(chunks)} chunks")
+    return chunks
+
+
+def _store(
+    file_uuid: str, chunks: list[Document], vectors: list[list[float]], task_str: str
+) -> None:
+    _upsert(file_uuid, chunks, vectors)
+    _finish(file_uuid, len(chunks), task_str, indexed_pages=_count_pages(chunks))
+
+
+def _upsert(file_uuid: str, chunks: list[Document], vectors: list[list[float]]) -> None:
+    # save chunks to vector store, chunk ids are deterministic so retried
+    # windows replace their chunks
+    save_vectorstore(
+        col_name=file_uuid,
+        documents=chunks,
+        embeddings=gemini_embeddings,
+        dir_path=app_config.vectorstore_path,
+        vectors=vectors,
+    )
+    save_lexical_index(file_uuid, chunks)
+    # route library-wide searches to the document
+    save_centroid(file_uuid, chunks, vectors)
+
+
+def _save_context(file_uuid: str, first_window: list[Document]) -> None:
+    """Stores the text of a document answered as a whole, or removes the
+    text stored by a previous ingestion of the document."""
+    if first_window[0].metadata.get("context_mode") == ContextMode.FULL.value:
+        save_document_text(file_uuid, first_window)
+    else:
+        delete_document_text(file_uuid)
+
+
+def _finish(file_uuid: str, chunk_count: int, task_str: str, **progress) -> None:
+    if isinstance(gemini_embeddings, CachedEmbeddings):
+        logger.info(f"{task_str}: embedding cache stats {gemini_embeddings.stats()}")
+
+    logger.info(f"{task_str}: saved '{file_uuid}' to vectorstore")
+    set_state(
+        file_uuid,
+        IngestionState.READY,
+        chunk_count=chunk_count,
+        embedded_chunks=chunk_count,
+        **progress,
+    )
+
+    # drop the stale chain cached by this process, e.g. an API worker
+    # reloading the document
+    invalidate_rag_chain(file_uuid)
+    # answers cached from a previous ingestion of the document are stale, the
+    # API workers also drop their cached chain on the broadcast invalidation
+    invalidate_qa(file_uuid)
+
+
+def _progress_counter(file_uuid: str) -> Callable[[int], None]:
+    """Returns an embedding progress callback adding the newly embedded
+    chunks to the document's count, which is shared by parallel tasks."""
+    done = 0
+
+    def on_progress(total: int):
+        nonlocal done
+        incr_progress(file_uuid, "embedded_chunks", total - done)
+        done = total
+
+    return on_progress
+
+
+def _count_pages(chunks: list[Document]) -> int:
+    return len({chunk.metadata.get("page") for chunk in chunks})
+
+
+def _mark_indexed(file_uuid: str, pages: int, total_pages: int) -> None:
+    """Adds newly indexed pages to the document's count, flagging the document
+    as partial once enough pages are queryable, unless it is complete."""
+    indexed = incr_progress(file_uuid, "indexed_pages", pages)
+    threshold = app_config.ingestion_partial_min_pages
+    if indexed is None or not threshold:
+        return
+    if indexed - pages < threshold <= indexed < total_pages:
+        set_state(file_uuid, IngestionState.PARTIAL)
+
+
+def _fail(file_uuid: str, e: Exception, task_str: str) -> None:
+    # intercept exception to log and roll-back
+    logger.error(f"{task_str}: error processing the document, removing the file...")
+    set_state(file_uuid, IngestionState.FAILED, error=f"{e.__class__.__name__}: {e}")
+    _remove_indexes(file_uuid)
+    pdf_path = app_config.pdf_path / f"{file_uuid}.pdf"
+    if os.path.isfile(pdf_path):
+        os.remove(pdf_path)
+    _remove_chunks(file_uuid)
+
+
+def _remove_indexes(file_uuid: str) -> None:
+    try:
+        remove_centroids(file_uuid)
+        load_lexical_index(file_uuid).delete()
+        delete_document_text(file_uuid)
+    except Exception as remove_error:
+        logger.warning(f"Could not remove the indexes of '{file_uuid}': {remove_error}")
+
+
+def _chunks_path(file_uuid: str):
+    return app_config.tmp_path / f"{file_uuid}.chunks.jsonl"
+
+
+def _save_chunks(
+    file_uuid: str,
+    task_str: str,
+    on_window: Callable[[int, int, int, int], None],
+) -> Optional[list[tuple[int, int, int]]]:
+    """Streams the chunks of a document to its chunks file window by window,
+    calling `on_window` with the start, end and page count of each window
+    and the page count of the document once the window is written.
+
+    Returns:
+        Optional[list[tuple[int, int, int]]]: The start, end and page count of
+        each window, or None if a window failed the document while parsing.
+    """
+    pdf_path = _pdf_path(file_uuid)
+    set_state(file_uuid, IngestionState.PARSING)
+    reset_windows(file_uuid)
+
+    windows = []
+    with open(_chunks_path(file_uuid), "w", encoding="utf-8") as f:
+        for window in iter_chunk_windows(
+            pdf_path, file_uuid, app_config.ingestion_embedding_task_size
+        ):
+            page_count = window[0].metadata["page_count"]
+            if not windows:
+                _save_context(file_uuid, window)
+                set_state(
+                    file_uuid,
+                    IngestionState.EMBEDDING,
+                    page_count=page_count,
+                    embedded_chunks=0,
+                    indexed_pages=0,
+                )
+            elif get_state(file_uuid) == IngestionState.FAILED:
+                # the failure removed the chunks file, stop queuing windows
+                return None
+
+            start = windows[-1][1] if windows else 0
+            windows.append((start, start + len(window), _count_pages(window)))
+            for chunk in window:
+                f.write(
+                    json.dumps({"page_content": chunk.page_content, "metadata": chunk.metadata})
+                    + "\n"
+                )
+            # the tasks of the window read it as soon as they are queued
+            f.flush()
+            on_window(*windows[-1], page_count)
+
+    if not windows:
+        raise ValueError("No text could be extracted from the document.")
+    chunk_count = windows[-1][1]
+    set_progress(file_uuid, chunk_count=chunk_count)
+    logger.info(f"{task_str}: split '{file_uuid}' into {chunk_count} chunks")
+    return windows
+
+
+def _load_chunks(file_uuid: str, start: int, end: int) -> list[Document]:
+    # only the lines of the window are parsed
+    with open(_chunks_path(file_uuid), "r", encoding="utf-8") as f:
+        return [Document(**json.loads(line)) for line in islice(f, start, end)]
+
+
+def _count_chunks(file_uuid: str) -> int:
+    with open(_chunks_path(file_uuid), "r", encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+
+def _remove_chunks(file_uuid: str) -> None:
+    try:
+        os.remove(_chunks_path(file_uuid))
+    except FileNotFoundError:
+        pass
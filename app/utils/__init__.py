@@ -1,3 +1,5 @@
-from .file_utils import init_dirs
+from .file_utils import init_dirs, lock_file
 from .hash_utils import generate_uuid_from_file
-from .parse_utils import generate_safe_key
+from .parse_utils import estimate_tokens, generate_safe_key, normalize_query
+from .cache_utils import LRUCache
+from .async_utils import run_blocking
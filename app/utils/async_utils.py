@@ -0,0 +1,36 @@
+"""
+Module for running blocking code from async contexts.
+
+Blocking calls (e.g. vector store setup, PDF parsing, hashing) are moved to a
+bounded thread pool so they do not stall the event loop, while the pool size
+caps how many of them can run at the same time.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+from app.config import app_config
+
+T = TypeVar("T")
+
+blocking_executor = ThreadPoolExecutor(
+    max_workers=app_config.blocking_io_workers, thread_name_prefix="blocking-io"
+)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a blocking function in the bounded thread pool.
+
+    Args:
+        func (Callable[..., T]): The blocking function to run.
+        *args (Any): Positional arguments passed to the function.
+        **kwargs (Any): Keyword arguments passed to the function.
+
+    Returns:
+        T: The return value of the function.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        blocking_executor, functools.partial(func, *args, **kwargs)
+    )
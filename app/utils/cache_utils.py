@@ -0,0 +1,270 @@
+"""
+Module for in-process caching utilities.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class FrequencySketch:
+    """A count-min sketch estimating how often keys were accessed recently.
+
+    Counters saturate at 15 and are halved once `sample_size` accesses are
+    recorded, so the estimates favor recent popularity, as in TinyLFU.
+
+    Attributes:
+        width (int): Number of counters per row, a power of two.
+        depth (int): Number of rows, each indexed by a different hash.
+        sample_size (int): Number of recorded accesses between two agings.
+    """
+
+    MAX_COUNT = 15
+    # odd multipliers of the rows, the high bits of the products are used
+    # as indexes, so keys colliding in one row rarely collide in the others
+    SEEDS = (
+        0x9E3779B97F4A7C15,
+        0xC2B2AE3D27D4EB4F,
+        0x165667B19E3779F9,
+        0xD6E8FEB86659FD93,
+        0xFF51AFD7ED558CCD,
+        0xC4CEB9FE1A85EC53,
+        0x94D049BB133111EB,
+        0xBF58476D1CE4E5B9,
+    )
+
+    def __init__(self, capacity: int, depth: int = 4):
+        """Initializes a sketch sized for a cache of a given capacity.
+
+        Args:
+            capacity (int): The number of entries of the cache.
+            depth (int, optional): Number of hashes per key, at most 8.
+                Defaults to 4.
+        """
+        if not 0 < depth <= len(self.SEEDS):
+            raise ValueError(f"depth must be between 1 and {len(self.SEEDS)}")
+        self.width = 1 << max(4, (4 * capacity - 1).bit_length())
+        self._shift = 64 - (self.width.bit_length() - 1)
+        self.depth = depth
+        self.sample_size = 10 * capacity
+        self._rows = [bytearray(self.width) for _ in range(depth)]
+        self._additions = 0
+
+    def increment(self, key: Hashable) -> None:
+        """Records an access to a key.
+
+        Args:
+            key (Hashable): The accessed key.
+        """
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: Hashable) -> int:
+        """Returns the estimated number of recent accesses to a key.
+
+        Args:
+            key (Hashable): The key to look up.
+
+        Returns:
+            int: The estimate, never below the true count since the last aging.
+        """
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def _indexes(self, key: Hashable) -> list[int]:
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        return [
+            ((h * seed) & 0xFFFFFFFFFFFFFFFF) >> self._shift
+            for seed in self.SEEDS[: self.depth]
+        ]
+
+    def _age(self) -> None:
+        for row in self._rows:
+            for index, count in enumerate(row):
+                if count:
+                    row[index] = count >> 1
+        self._additions //= 2
+
+
+class LRUCache:
+    """A thread-safe, size-bounded LRU cache with optional TTL expiry.
+
+    Entries are evicted in least recently used order once `maxsize` is
+    reached, and are treated as missing once they are older than `ttl`
+    seconds. Hit, miss and eviction counters are kept for monitoring.
+
+    With `admission` enabled, the access frequency of the keys is tracked by
+    a `FrequencySketch`, and a new key only replaces the least recently used
+    entry of a full cache if it was requested at least as often, so a burst
+    of one-off keys does not flush the popular ones (TinyLFU admission).
+
+    Attributes:
+        maxsize (int): Maximum number of entries to keep.
+        ttl (float | None): Time to live of an entry in seconds, or None
+            to keep entries until they are evicted.
+        admission (bool): Whether new keys must pass the frequency admission
+            filter when the cache is full.
+        hits (int): Number of successful lookups.
+        misses (int): Number of failed lookups.
+        evictions (int): Number of entries removed by size or TTL limits.
+    """
+
+    def __init__(
+        self, maxsize: int = 128, ttl: Optional[float] = None, admission: bool = False
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.admission = admission
+        self._sketch = FrequencySketch(maxsize) if admission else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data and not self._is_expired(self._data[key][0])
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value for a key, marking it as recently used.
+
+        Args:
+            key (Hashable): The key to look up.
+            default (Any, optional): The value to return on a miss.
+
+        Returns:
+            Any: The cached value, or `default` if the key is missing or expired.
+        """
+        with self._lock:
+            if self._sketch is not None:
+                self._sketch.increment(key)
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            created_at, value = entry
+            if self._is_expired(created_at):
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> bool:
+        """Stores a value, evicting the least recently used entries if full.
+
+        Args:
+            key (Hashable): The key to store the value under.
+            value (Any): The value to store.
+
+        Returns:
+            bool: True if the value was stored, False if a new key was
+            rejected by the admission filter.
+        """
+        with self._lock:
+            if (
+                self._sketch is not None
+                and key not in self._data
+                and len(self._data) >= self.maxsize
+            ):
+                victim = next(iter(self._data))
+                if self._sketch.estimate(key) < self._sketch.estimate(victim):
+                    return False
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Returns the cached value for a key, building and storing it on a miss.
+
+        The factory is called outside of the lock, so a slow build does not
+        block lookups of other keys. Exceptions raised by the factory are
+        propagated and nothing is cached.
+
+        Args:
+            key (Hashable): The key to look up.
+            factory (Callable[[], Any]): Builds the value on a miss.
+
+        Returns:
+            Any: The cached or newly built value.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+
+        value = factory()
+        self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Removes a key from the cache.
+
+        Args:
+            key (Hashable): The key to remove.
+
+        Returns:
+            bool: True if the key was cached, otherwise False.
+        """
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def invalidate_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Removes the entries matching a predicate, scanning the whole cache.
+
+        Args:
+            predicate (Callable[[Hashable, Any], bool]): Called with the key and
+                value of each entry, True to remove the entry.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Returns the cache counters.
+
+        Returns:
+            dict: Size, limits, hits, misses, evictions and the hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - created_at > self.ttl
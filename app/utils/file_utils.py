@@ -3,8 +3,19 @@ Module for file level utilities.
 """
 
 import pathlib
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
 from app.utils.logger import logger
 
+try:
+    import fcntl
+
+    msvcrt = None
+except ImportError:  # Windows
+    import msvcrt
+
+    fcntl = None
+
 
 def init_dirs(*paths: tuple[pathlib.Path]) -> None:
     """Create directories if they do not already exist.
@@ -21,3 +32,39 @@ def init_dirs(*paths: tuple[pathlib.Path]) -> None:
             path.mkdir(parents=True, exist_ok=True)
     except Exception as e:
         logger.exception(e)
+
+
+@contextmanager
+def lock_file(file: BinaryIO) -> Iterator[None]:
+    """Holds an exclusive lock on an open file, shared by every process
+    opening the same file, e.g. to serialize appends.
+
+    Args:
+        file (BinaryIO): The open file to lock.
+
+    Yields:
+        None: The lock is held until the context exits.
+    """
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+        return
+
+    # lock the first byte, which can be locked even past the end of the file
+    file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            break
+        except OSError:
+            # LK_LOCK gives up after 10 seconds, keep waiting
+            continue
+    try:
+        yield
+    finally:
+        # also flushes the writes before they are visible to other processes
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -6,8 +6,11 @@ import hashlib
 import uuid
 
 
+HASH_CHUNK_SIZE = 1024**2  # 1 MB
+
+
 def get_file_hash(file_path: str) -> bytes:
-    """Compute the SHA-256 hash of a file.
+    """Compute the SHA-256 hash of a file, reading it in fixed-size chunks.
 
     Args:
         file_path (str): The path to the file for which to compute the hash.
@@ -15,8 +18,23 @@ def get_file_hash(file_path: str) -> bytes:
     Returns:
         bytes: The SHA-256 hash of the file as a byte string.
     """
+    file_hash = hashlib.sha256()
     with open(file_path, "rb") as f:
-        return hashlib.sha256(f.read()).digest()
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.digest()
+
+
+def generate_uuid_from_hash(file_hash: bytes) -> uuid.UUID:
+    """Generate a UUID from a file hash, using the first 16 bytes.
+
+    Args:
+        file_hash (bytes): The SHA-256 hash of the file.
+
+    Returns:
+        uuid.UUID: A UUID generated from the first 16 bytes of the hash.
+    """
+    return uuid.UUID(bytes=file_hash[:16])
 
 
 def generate_uuid_from_file(file_path: str) -> uuid.UUID:
@@ -28,5 +46,20 @@ def generate_uuid_from_file(file_path: str) -> uuid.UUID:
     Returns:
         uuid.UUID: A UUID generated from the first 16 bytes of the file's hash.
     """
-    file_hash = get_file_hash(file_path)
-    return uuid.UUID(bytes=file_hash[:16])
+    return generate_uuid_from_hash(get_file_hash(file_path))
+
+
+def generate_document_set_id(pdf_ids: list[str]) -> str:
+    """Generate a stable ID for a set of documents, independent of their order
+    and of duplicates. A single document keeps its own ID.
+
+    Args:
+        pdf_ids (list[str]): The IDs of the documents.
+
+    Returns:
+        str: The ID of the document set.
+    """
+    unique_ids = sorted(set(pdf_ids))
+    if len(unique_ids) == 1:
+        return unique_ids[0]
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, ",".join(unique_ids)))
@@ -2,37 +2,55 @@
 Module for handling parsing logics.
 """
 
-import re
+import hashlib
+import unicodedata
 
+# rough average of characters per token of the LLM tokenizers for English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of LLM tokens of a text from its length, without
+    calling a tokenizer.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
 
-def generate_safe_key(chat_id: str, user_query: str) -> str:
-    """Generates a safe Redis key based on the chat ID and user query.
 
-    This function normalizes whitespace in the user query, sanitizes it
-    by removing unwanted characters, limits the length of both the
-    chat ID and user query, and constructs a formatted Redis key.
+def normalize_query(user_query: str) -> str:
+    """Normalizes a user query for cache lookups, so questions differing only
+    in case, Unicode form, whitespace or trailing punctuation match.
 
     Args:
-        chat_id (str): The unique identifier for the chat, limited to 50 characters.
-        user_query (str): The user's query, which is sanitized and limited to 100 characters.
+        user_query (str): The user's query.
 
     Returns:
-        str: A formatted Redis key in the form of "app:{chat_id}:{user_query}".
+        str: The normalized query.
     """
+    user_query = unicodedata.normalize("NFKC", user_query).casefold()
+    # Normalize whitespace and drop trailing punctuation
+    return " ".join(user_query.split()).rstrip("?!. ")
 
-    # Normalize whitespace
-    user_query = " ".join(user_query.split()).strip().replace(" ", "_")
 
-    # Sanitize user_query: Remove unwanted characters and limit length
-    user_query = re.sub(
-        r"[^a-zA-Z0-9\s:_-]", "", user_query
-    )  # Replace invalid chars with '_'
-    user_query = user_query[:100]  # Limit user query length
+def generate_safe_key(chat_id: str, user_query: str) -> str:
+    """Generates a safe Redis key based on the chat ID and user query.
 
-    # Limit chat_id length if necessary
-    chat_id = chat_id[:50]  # Limit chat_id length
+    The normalized query is hashed, so the key has a fixed length whatever
+    the query, and two queries share a key only if they normalize to the same
+    text, e.g. long queries with a common prefix or non-ASCII queries never
+    collide.
 
-    # Create the Redis key
-    redis_key = f"app:{chat_id}:{user_query}"
+    Args:
+        chat_id (str): The unique identifier for the chat.
+        user_query (str): The user's query.
 
-    return redis_key
+    Returns:
+        str: A formatted Redis key in the form of "app:{chat_id}:{query_hash}".
+    """
+    query_hash = hashlib.sha256(normalize_query(user_query).encode("utf-8")).hexdigest()
+    return f"app:{chat_id}:{query_hash}"
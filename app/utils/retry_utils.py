@@ -0,0 +1,89 @@
+"""
+Module for retrying calls with jittered exponential backoff.
+"""
+
+import random
+import time
+from typing import Callable, TypeVar
+from app.utils.logger import logger
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """Checks whether an error is a rate limit (429) or server (5xx) error.
+
+    Client libraries often wrap the original API error, so the whole
+    exception chain is inspected for an HTTP status code.
+
+    Args:
+        exc (BaseException): The raised exception.
+
+    Returns:
+        bool: True if the call that raised the error can be retried.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        for attr in ("code", "status_code"):
+            code = getattr(exc, attr, None)
+            if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+                return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Computes a full jitter exponential backoff delay.
+
+    Args:
+        attempt (int): The number of the failed attempt, starting from 0.
+        base_delay (float): The delay cap of the first retry in seconds.
+        max_delay (float): The upper bound of the delay in seconds.
+
+    Returns:
+        float: A random delay between 0 and min(max_delay, base_delay * 2^attempt).
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def retry_with_backoff(
+    func: Callable[[], T],
+    max_retries: int,
+    base_delay: float,
+    max_delay: float,
+    is_retryable: Callable[[BaseException], bool] = is_retryable_error,
+) -> T:
+    """Calls a function, retrying retryable errors with jittered exponential backoff.
+
+    Args:
+        func (Callable[[], T]): The function to call.
+        max_retries (int): Maximum number of retries after the first attempt.
+        base_delay (float): The delay cap of the first retry in seconds.
+        max_delay (float): The upper bound of a single delay in seconds.
+        is_retryable (Callable[[BaseException], bool], optional): Decides
+            whether an error can be retried. Defaults to `is_retryable_error`.
+
+    Returns:
+        T: The return value of the function.
+
+    Raises:
+        Exception: The last error, if it is not retryable or the retries
+            are exhausted.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(
+                f"Retryable error ({e.__class__.__name__}), retrying in {delay:.2f}s "
+                f"({attempt + 1}/{max_retries})"
+            )
+            time.sleep(delay)
+            attempt += 1
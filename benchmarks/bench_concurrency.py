@@ -0,0 +1,133 @@
+"""
+Benchmark for event loop responsiveness while chats are in flight.
+
+Measures the latency of `/ping` and `/v1/history/{pdf_id}` on an idle
+application, then again while a number of `/v1/chat/{pdf_id}` requests are
+running against a fake LLM with a fixed latency. With a non-blocking chat
+path, the p99 latencies of both runs should stay roughly the same.
+
+Runs fully offline: the Gemini LLM and embeddings are replaced with fakes and
+the QA cache is bypassed, so no API key or Redis instance is required.
+
+Usage:
+    python -m benchmarks.bench_concurrency --chats 16 --llm-latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import time
+
+# use the testing data directory and disable rate limiters before the app loads
+os.environ["IS_TESTING"] = "1"
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+from unittest.mock import patch
+
+import httpx
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.config import app_config
+from app.services.vector_service import save_vectorstore
+from app.utils import init_dirs
+from benchmarks.common import SlowFakeChatModel, summarize, write_results
+
+PDF_ID = "bc466009-0aea-25e2-8e58-f5ccdc717e74"
+MOCK_PDF_PATH = os.path.join("tests", "mock", "pdf", f"{PDF_ID}.pdf")
+
+
+async def _sample(client: httpx.AsyncClient, url: str, samples: int) -> list[float]:
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        await asyncio.sleep(0.005)  # spread the samples over the chat window
+    return latencies
+
+
+async def _chat_forever(
+    client: httpx.AsyncClient, stop: asyncio.Event, counter: list, user: str
+):
+    while not stop.is_set():
+        response = await client.post(
+            f"/{app_config.api_version}/chat/{PDF_ID}",
+            json={"message": "question?"},
+            headers={"x-token": user},
+        )
+        response.raise_for_status()
+        counter.append(1)
+
+
+async def run(chats: int, samples: int) -> dict:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        urls = {
+            "ping": "/ping",
+            "history": f"/{app_config.api_version}/history/{PDF_ID}",
+        }
+        results = {"idle": {}, "under_load": {}}
+
+        for name, url in urls.items():
+            results["idle"][name] = summarize(await _sample(client, url, samples))
+
+        stop = asyncio.Event()
+        completed = []
+        workers = [
+            asyncio.create_task(_chat_forever(client, stop, completed, f"user{i}"))
+            for i in range(chats)
+        ]
+        await asyncio.sleep(0.1)  # let the chats get in flight
+        for name, url in urls.items():
+            results["under_load"][name] = summarize(await _sample(client, url, samples))
+        stop.set()
+        await asyncio.gather(*workers)
+
+        results["completed_chats"] = len(completed)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chats", type=int, default=16, help="concurrent chats")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds")
+    parser.add_argument("--samples", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--output", type=str, default=None, help="JSON output path")
+    args = parser.parse_args()
+
+    init_dirs(app_config.vectorstore_path, app_config.history_path, app_config.pdf_path)
+    shutil.copy(MOCK_PDF_PATH, app_config.pdf_path / f"{PDF_ID}.pdf")
+
+    embeddings = DeterministicFakeEmbedding(size=64)
+    save_vectorstore(
+        col_name=PDF_ID,
+        documents=[Document(f"chunk {i}", metadata={"i": i}) for i in range(8)],
+        embeddings=embeddings,
+        dir_path=app_config.vectorstore_path,
+    )
+
+    async def _no_cache(*args, **kwargs):
+        return None
+
+    try:
+        with patch("app.services.rag_service.gemini_embeddings", embeddings), patch(
+            "app.services.rag_service.ChatGoogleGenerativeAI",
+            lambda **kwargs: SlowFakeChatModel(latency=args.llm_latency),
+        ), patch("app.routes.chat.load_qa", _no_cache), patch(
+            "app.routes.chat.save_qa", _no_cache
+        ):
+            results = asyncio.run(run(args.chats, args.samples))
+    finally:
+        shutil.rmtree(app_config.data_path, ignore_errors=True)
+
+    results["params"] = vars(args)
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark for PDF text extraction engines.
+
+Measures the pages per second of each extraction engine on the mock PDFs in
+`tests/mock/pdf`: PyMuPDF sequentially, PyMuPDF over a process pool, the
+page iterator used by progressive ingestion over the same pool, and
+Unstructured. Engines that can not run (e.g. Unstructured without poppler
+installed) are reported with their error.
+
+Usage:
+    python -m benchmarks.bench_extraction --repeat 3
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+os.environ["IS_TESTING"] = "1"
+
+from app.services.extraction import extract_with_unstructured, pymupdf_extraction
+
+MOCK_PDF_DIR = os.path.join("tests", "mock", "pdf")
+
+
+def _engines(workers: int) -> dict:
+    return {
+        "pymupdf": lambda path: pymupdf_extraction.extract_pages(path),
+        f"pymupdf_parallel_{workers}": lambda path: pymupdf_extraction.extract_pages(
+            path, parallel_min_pages=1, workers=workers
+        ),
+        f"pymupdf_iter_{workers}": lambda path: list(
+            pymupdf_extraction.iter_pages(path, parallel_min_pages=1, workers=workers)
+        ),
+        "unstructured": extract_with_unstructured,
+    }
+
+
+def run(repeat: int, workers: int) -> dict:
+    results = {}
+    for path in sorted(glob.glob(os.path.join(MOCK_PDF_DIR, "*.pdf"))):
+        file_results = {}
+        for name, extract in _engines(workers).items():
+            try:
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    pages = extract(path)
+                    timings.append(time.perf_counter() - start)
+            except Exception as e:
+                file_results[name] = {"error": f"{e.__class__.__name__}: {e}"}
+                continue
+
+            best = min(timings)
+            file_results[name] = {
+                "pages": len(pages),
+                "best_s": round(best, 4),
+                "pages_per_s": round(len(pages) / best, 1),
+            }
+        results[os.path.basename(path)] = file_results
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per engine")
+    parser.add_argument("--workers", type=int, default=4, help="parallel processes")
+    parser.add_argument("--output", type=str, default=None, help="JSON output path")
+    args = parser.parse_args()
+
+    results = {"results": run(args.repeat, args.workers), "params": vars(args)}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
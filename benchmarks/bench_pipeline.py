@@ -0,0 +1,210 @@
+"""
+Benchmark for every stage of the ingestion and chat pipeline.
+
+Measures, on one of the mock PDFs:
+- upload: `validate_pdf` and `handle_file_upload` (streaming, hashing, PDF check)
+- ingestion: `load_document`, `split_text` and `save_vectorstore` per backend
+- retrieval: `load_vectorstore` with a fresh handle plus a similarity search
+- QA cache: `save_qa` and `load_qa` against an in-memory Redis stand-in, a
+  hit from Redis and from the in-process cache, a miss includes the search of
+  the semantic index
+- chat: the full `/v1/chat/{pdf_id}` route, cold (chain not cached), warm
+  (chain cached, QA cache miss) and on a QA cache hit
+
+Runs fully offline with deterministic fake embeddings and a fake LLM, so no
+API key or Redis instance is required. Write the results to JSON with
+`--output` and compare two runs with `python -m benchmarks.compare`.
+
+Usage:
+    python -m benchmarks.bench_pipeline --repeat 5 --output bench.json
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import time
+
+# use the testing data directory and disable rate limiters before the app loads
+os.environ["IS_TESTING"] = "1"
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+from io import BytesIO
+from unittest.mock import patch
+
+import httpx
+from fastapi import UploadFile
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from starlette.datastructures import Headers
+
+from app.config import app_config
+from app.services.document_service import (
+    handle_file_upload,
+    load_document,
+    split_text,
+    validate_pdf,
+)
+from app.services.qa_cache_service import load_qa, local_qa_cache, save_qa
+from app.services.vector_service import VECTOR_BACKENDS, load_vectorstore, save_vectorstore
+from app.utils import init_dirs
+from benchmarks.common import (
+    InMemoryRedis,
+    SlowFakeChatModel,
+    ameasure,
+    measure,
+    summarize,
+    write_results,
+)
+
+DEFAULT_PDF = os.path.join("tests", "mock", "pdf", "bc466009-0aea-25e2-8e58-f5ccdc717e74.pdf")
+
+
+def _upload_file(content: bytes, filename: str) -> UploadFile:
+    return UploadFile(
+        BytesIO(content),
+        size=len(content),
+        filename=filename,
+        headers=Headers({"content-type": "application/pdf"}),
+    )
+
+
+async def bench_upload(pdf_path: str, repeat: int) -> dict:
+    with open(pdf_path, "rb") as f:
+        content = f.read()
+    filename = os.path.basename(pdf_path)
+
+    async def upload():
+        document = await handle_file_upload(_upload_file(content, filename))
+        # remove the stored file, the next upload would be a duplicate otherwise
+        os.remove(app_config.pdf_path / f"{document.document_id}.pdf")
+
+    return {
+        "validate_pdf": await ameasure(
+            lambda: validate_pdf(_upload_file(content, filename)), repeat
+        ),
+        "handle_file_upload": await ameasure(upload, repeat),
+    }
+
+
+def bench_ingestion(pdf_path: str, repeat: int, embeddings, k: int) -> dict:
+    pdf_id = os.path.splitext(os.path.basename(pdf_path))[0]
+    results = {"load_document": measure(lambda: load_document(pdf_path, pdf_id), repeat)}
+
+    docs = load_document(pdf_path, pdf_id)
+    results["split_text"] = measure(lambda: split_text(docs), repeat)
+    chunks = split_text(docs)
+    results["pages"], results["chunks"] = len(docs), len(chunks)
+
+    for backend in VECTOR_BACKENDS:
+        dir_path = app_config.data_path / f"bench_{backend}"
+        results[f"save_vectorstore_{backend}"] = measure(
+            lambda: save_vectorstore(pdf_id, chunks, embeddings, dir_path, backend=backend),
+            repeat,
+        )
+        results[f"load_vectorstore_query_{backend}"] = measure(
+            lambda: load_vectorstore(
+                pdf_id, dir_path, embeddings, backend=backend
+            ).similarity_search("what is this document about?", k=k),
+            repeat,
+        )
+    return results
+
+
+async def bench_qa_cache(repeat: int) -> dict:
+    redis_conn = InMemoryRedis()
+    pdf_id, query, answer = "pdf", "what is this document about?", "answer " * 100
+
+    async def load_from_redis():
+        if local_qa_cache is not None:
+            local_qa_cache.clear()
+        return await load_qa(pdf_id, query, redis_conn)
+
+    results = {
+        "save_qa": await ameasure(lambda: save_qa(pdf_id, query, answer, redis_conn), repeat),
+        "load_qa_hit": await ameasure(load_from_redis, repeat),
+        "load_qa_hit_local": await ameasure(lambda: load_qa(pdf_id, query, redis_conn), repeat),
+        "load_qa_miss": await ameasure(lambda: load_qa(pdf_id, "other", redis_conn), repeat),
+    }
+    return results
+
+
+async def bench_chat(pdf_path: str, repeat: int, embeddings) -> dict:
+    from app.main import app
+    from app.services.rag_service import rag_chain_cache
+
+    pdf_id = os.path.splitext(os.path.basename(pdf_path))[0]
+    shutil.copy(pdf_path, app_config.pdf_path / f"{pdf_id}.pdf")
+    chunks = split_text(load_document(pdf_path, pdf_id))
+    save_vectorstore(pdf_id, chunks, embeddings, app_config.vectorstore_path)
+
+    url = f"/{app_config.api_version}/chat/{pdf_id}"
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        counter = iter(range(10**9))
+
+        async def chat(message: str):
+            response = await client.post(url, json={"message": message})
+            response.raise_for_status()
+
+        async def cold():
+            rag_chain_cache.clear()
+            await chat(f"question {next(counter)}?")
+
+        return {
+            "chat_cold": await ameasure(cold, repeat),
+            "chat_warm": await ameasure(lambda: chat(f"question {next(counter)}?"), repeat),
+            "chat_qa_cache_hit": await ameasure(lambda: chat("question 0?"), repeat),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pdf", type=str, default=DEFAULT_PDF, help="PDF to benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage")
+    parser.add_argument("--k", type=int, default=4, help="retrieved chunks per query")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="fake LLM latency in seconds")
+    parser.add_argument("--output", type=str, default=None, help="JSON output path")
+    args = parser.parse_args()
+
+    init_dirs(
+        app_config.vectorstore_path,
+        app_config.history_path,
+        app_config.tmp_path,
+        app_config.pdf_path,
+    )
+    embeddings = DeterministicFakeEmbedding(size=768)
+    redis_conn = InMemoryRedis()
+
+    start = time.perf_counter()
+    try:
+        with patch("app.tasks.gemini_embeddings", embeddings), patch(
+            "app.services.rag_service.gemini_embeddings", embeddings
+        ), patch(
+            "app.services.qa_cache_service.gemini_embeddings", embeddings
+        ), patch(
+            "app.services.rag_service.ChatGoogleGenerativeAI",
+            lambda **kwargs: SlowFakeChatModel(latency=args.llm_latency),
+        ), patch(
+            "app.services.qa_cache_service.default_connection", redis_conn
+        ), patch(
+            "app.services.status_service.default_connection", redis_conn
+        ):
+            results = {
+                "upload": asyncio.run(bench_upload(args.pdf, args.repeat)),
+                "ingestion": bench_ingestion(args.pdf, args.repeat, embeddings, args.k),
+                "qa_cache": asyncio.run(bench_qa_cache(args.repeat)),
+                "chat": asyncio.run(bench_chat(args.pdf, args.repeat, embeddings)),
+            }
+    finally:
+        shutil.rmtree(app_config.data_path, ignore_errors=True)
+
+    results = {
+        "results": results,
+        "total": summarize([time.perf_counter() - start]),
+        "params": vars(args),
+    }
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
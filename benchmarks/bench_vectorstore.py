@@ -0,0 +1,100 @@
+"""
+Benchmark for vector store query latency per backend.
+
+Builds a collection of random unit vectors for each collection size with both
+the Chroma and NumPy backends, then measures the latency of top-k searches by
+vector. Query embedding is excluded, so only the vector store itself is timed.
+
+Runs fully offline, no API key is required.
+
+Usage:
+    python -m benchmarks.bench_vectorstore --sizes 200 1000 5000 --queries 200
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+os.environ["IS_TESTING"] = "1"
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import FakeEmbeddings
+
+from app.services.vector_service import VECTOR_BACKENDS, load_vectorstore, save_vectorstore
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def run(sizes: list[int], queries: int, dim: int, k: int) -> dict:
+    rng = np.random.default_rng(0)
+    embeddings = FakeEmbeddings(size=dim)
+    results = {}
+
+    for size in sizes:
+        vectors = rng.standard_normal((size, dim)).astype(np.float32)
+        documents = [
+            Document(page_content=f"chunk {i}", metadata={"page": i // 10, "start_index": i})
+            for i in range(size)
+        ]
+        query_vectors = rng.standard_normal((queries, dim)).tolist()
+
+        size_results = {}
+        for backend in VECTOR_BACKENDS:
+            dir_path = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+            try:
+                save_vectorstore(
+                    "benchmark",
+                    documents,
+                    embeddings,
+                    dir_path,
+                    vectors=vectors.tolist(),
+                    backend=backend,
+                )
+                # fresh handle, like the first chat turn of a document
+                vectorstore = load_vectorstore("benchmark", dir_path, embeddings, backend=backend)
+                vectorstore.similarity_search_by_vector(query_vectors[0], k=k)  # warm up
+
+                latencies = []
+                for query in query_vectors:
+                    start = time.perf_counter()
+                    vectorstore.similarity_search_by_vector(query, k=k)
+                    latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                shutil.rmtree(dir_path, ignore_errors=True)
+
+            size_results[backend] = {
+                "p50_ms": round(statistics.median(latencies), 3),
+                "p95_ms": round(_percentile(latencies, 0.95), 3),
+                "mean_ms": round(statistics.fmean(latencies), 3),
+            }
+        results[str(size)] = size_results
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 5000], help="chunks per collection")
+    parser.add_argument("--queries", type=int, default=200, help="queries per backend")
+    parser.add_argument("--dim", type=int, default=768, help="vector dimension")
+    parser.add_argument("--k", type=int, default=4, help="results per query")
+    parser.add_argument("--output", type=str, default=None, help="JSON output path")
+    args = parser.parse_args()
+
+    results = {"results": run(args.sizes, args.queries, args.dim, args.k), "params": vars(args)}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Shared helpers for the offline benchmarks.
+
+Provides a fake chat model with a fixed latency, an in-memory stand-in for
+the async Redis client, latency summaries and JSON result output, so every
+benchmark runs without network access and reports results in the same format.
+"""
+
+import asyncio
+import fnmatch
+import json
+import statistics
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Fake chat model that answers after a fixed delay, blocking on the sync
+    path and yielding to the event loop on the async path."""
+
+    latency: float = 0.5
+    answer: str = "answer"
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(self.answer))])
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any
+    ):
+        await asyncio.sleep(self.latency)
+        for word in self.answer.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+class InMemoryRedis:
+    """In-memory stand-in for the subset of the async Redis client used by
+    the application. Values are returned as bytes like the real client, and
+    expiry times are stored but not enforced."""
+
+    def __init__(self):
+        self.data: dict[str, Any] = {}
+        self.expiry: dict[str, float] = {}
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self.data.get(key)
+        return value if isinstance(value, bytes) else None
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, **kwargs) -> bool:
+        self.data[key] = self._encode(value)
+        if ex is not None:
+            self.expiry[key] = time.time() + ex
+        return True
+
+    async def getex(self, key: str, ex: Optional[int] = None) -> Optional[bytes]:
+        value = await self.get(key)
+        if value is not None and ex is not None:
+            self.expiry[key] = time.time() + ex
+        return value
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        if key not in self.data:
+            return False
+        self.expiry[key] = time.time() + seconds
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def keys(self, pattern: str = "*") -> list[bytes]:
+        return [k.encode("utf-8") for k in self.data if fnmatch.fnmatch(k, pattern)]
+
+    async def hget(self, key: str, field: str) -> Optional[bytes]:
+        return self.data.get(key, {}).get(field)
+
+    async def hset(self, key: str, field: Optional[str] = None, value: Any = None, mapping: Optional[dict] = None) -> int:
+        fields = dict(mapping or {})
+        if field is not None:
+            fields[field] = value
+        hash_ = self.data.setdefault(key, {})
+        hash_.update({k: self._encode(v) for k, v in fields.items()})
+        return len(fields)
+
+    async def hgetall(self, key: str) -> dict[bytes, bytes]:
+        return {k.encode("utf-8"): v for k, v in self.data.get(key, {}).items()}
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        hash_ = self.data.setdefault(key, {})
+        value = int(hash_.get(field, b"0")) + amount
+        hash_[field] = self._encode(value)
+        return value
+
+    async def lpush(self, key: str, *values: Any) -> int:
+        list_ = self.data.setdefault(key, [])
+        for value in values:
+            list_.insert(0, self._encode(value))
+        return len(list_)
+
+    async def ltrim(self, key: str, start: int, end: int) -> bool:
+        if key in self.data:
+            self.data[key] = self.data[key][start : end + 1 if end != -1 else None]
+        return True
+
+    async def lrange(self, key: str, start: int, end: int) -> list[bytes]:
+        return list(self.data.get(key, [])[start : end + 1 if end != -1 else None])
+
+    async def sadd(self, key: str, *values: Any) -> int:
+        set_ = self.data.setdefault(key, set())
+        added = {self._encode(value) for value in values} - set_
+        set_.update(added)
+        return len(added)
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    """Pipeline of an `InMemoryRedis`, queuing the commands until `execute`."""
+
+    def __init__(self, redis_conn: InMemoryRedis):
+        self._redis = redis_conn
+        self._commands = []
+
+    async def __aenter__(self) -> "InMemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._commands = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [await getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Returns the nearest-rank percentile of the samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict:
+    """Summarizes latency samples in seconds as milliseconds."""
+    return {
+        "n": len(samples),
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int) -> dict:
+    """Calls a function `repeat` times and summarizes the latencies."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def ameasure(func: Callable[[], Awaitable[Any]], repeat: int) -> dict:
+    """Awaits a coroutine function `repeat` times and summarizes the latencies."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def write_results(results: dict, output: Optional[str]) -> None:
+    """Prints the results as JSON and writes them to `output` if given."""
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,90 @@
+"""
+Compares two benchmark result files, e.g. from two commits.
+
+Every latency (keys ending in `_ms` or `_s`) found in both files is compared,
+and latencies that grew by more than the threshold are reported as
+regressions. Exits with status 1 if any regression is found, so the
+comparison can gate a CI job.
+
+Usage:
+    python -m benchmarks.compare base.json new.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+
+LATENCY_SUFFIXES = ("_ms", "_s")
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """Flattens nested results into dotted paths of their latency values."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and str(key).endswith(LATENCY_SUFFIXES):
+            flat[path] = float(value)
+    return flat
+
+
+def compare(base: dict, new: dict, threshold: float) -> list[dict]:
+    """Compares the latencies present in both results.
+
+    Args:
+        base (dict): The baseline results.
+        new (dict): The results to compare against the baseline.
+        threshold (float): Relative growth above which a latency regressed.
+
+    Returns:
+        list[dict]: One entry per latency, with both values, the relative
+        change and whether it regressed.
+    """
+    base_flat = flatten(base.get("results", base))
+    new_flat = flatten(new.get("results", new))
+
+    rows = []
+    for path in sorted(base_flat.keys() & new_flat.keys()):
+        before, after = base_flat[path], new_flat[path]
+        change = (after - before) / before if before else 0.0
+        rows.append(
+            {
+                "metric": path,
+                "base": before,
+                "new": after,
+                "change": round(change, 4),
+                "regression": change > threshold,
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("base", type=str, help="baseline results JSON")
+    parser.add_argument("new", type=str, help="new results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative growth")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows = compare(base, new, args.threshold)
+    width = max((len(row["metric"]) for row in rows), default=10)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['metric']:<{width}}  {row['base']:>12.3f}  {row['new']:>12.3f}  "
+            f"{row['change']:>+8.1%}  {flag}"
+        )
+
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n{len(rows)} metrics compared, {len(regressions)} regressions.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
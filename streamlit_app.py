@@ -1,4 +1,5 @@
 import base64
+import json
 import streamlit as st
 import requests
 import os
@@ -24,10 +25,27 @@ def upload_pdf(file):
     return response 
 
 def chat_with_pdf(pdf_id, message):
-    url = f"{API_BASE_URL}/chat/{pdf_id}"
+    """Streams the answer from the server-sent events, yielding tokens as they arrive."""
+    url = f"{API_BASE_URL}/chat/{pdf_id}/stream"
     payload = {"message": message}
-    response = requests.post(url, json=payload)
-    return response
+    with requests.post(url, json=payload, stream=True) as response:
+        if response.status_code != 200:
+            yield f"Error: {response.status_code}"
+            return
+
+        event, streamed = None, False
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):])
+                if event == "token":
+                    streamed = True
+                    yield data["token"]
+                elif event == "end" and not streamed:  # cached answer
+                    yield data["response"]
+                elif event == "error":
+                    yield f"Error: {data['detail']}"
 
 def get_chat_history(pdf_id):
     url = f"{API_BASE_URL}/history/{pdf_id}"
@@ -123,7 +141,7 @@ if st.session_state.pdf_id:
 
     message = st.text_area("Chat with the PDF")
     if st.button("Send") and message:
-        response = chat_with_pdf(pdf_id, message)
+        st.write_stream(chat_with_pdf(pdf_id, message))
         st.rerun()  # Refresh the app to update the chat history
 
     displayPDF(pdf_id)
@@ -1,9 +1,12 @@
+import asyncio
 import os
 import shutil
+import threading
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from app.config import app_config
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 
 @pytest.fixture(scope="function")
@@ -30,7 +33,7 @@ def valid_pdf_id():
 
 class TestAPISuite:
     
-    @patch('app.tasks.process_pdf_task.delay')  # Adjust the import path as necessary
+    @patch('app.tasks.parse_pdf_task.apply_async')  # Adjust the import path as necessary
     def test_upload_same_pdf(self, mock_process_pdf_task, client: TestClient, valid_pdf_path):
         mock_process_pdf_task.return_value.id = 'mock_task_id'  # Mock task ID
         
@@ -39,14 +42,14 @@ class TestAPISuite:
         response = client.post("/v1/pdf/", files={"file": open(valid_pdf_path, "rb")})
         assert response.status_code == 409
 
-    @patch('app.tasks.process_pdf_task.delay')  # Mock in all relevant tests
+    @patch('app.tasks.parse_pdf_task.apply_async')  # Mock in all relevant tests
     def test_upload_invalid_pdf(self, mock_process_pdf_task, client: TestClient):
         mock_process_pdf_task.return_value.id = 'mock_task_id'
         
         response = client.post("/v1/pdf/", files={"file": ("invalid", b"Invalid file content")})
         assert response.status_code == 422
 
-    @patch('app.tasks.process_pdf_task.delay')
+    @patch('app.tasks.parse_pdf_task.apply_async')
     def test_upload_empty_pdf(self, mock_process_pdf_task, client: TestClient):
         mock_process_pdf_task.return_value.id = 'mock_task_id'
         
@@ -67,13 +70,33 @@ class TestAPISuite:
         assert response.status_code == 200
         assert isinstance(response.json(), list)
 
+    @pytest.mark.asyncio
+    async def test_blocking_calls_run_concurrently(self, client: TestClient, valid_pdf_id):
+        # each request waits for the other one inside its blocking call, which
+        # only completes if both run in the thread pool at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def load_history(*args):
+            barrier.wait()
+            return []
+
+        transport = httpx.ASGITransport(app=client.app)
+        with patch('app.services.history_service.load_history', side_effect=load_history):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+                responses = await asyncio.gather(
+                    async_client.get(f"/v1/history/{valid_pdf_id}"),
+                    async_client.get(f"/v1/history/{valid_pdf_id}"),
+                )
+
+        assert [response.status_code for response in responses] == [200, 200]
+
     def test_delete_chat_history(self, client: TestClient, valid_pdf_path, valid_pdf_id):
         os.system(f"cp {valid_pdf_path} {app_config.history_path}/{valid_pdf_id}")
         
         response = client.delete(f"/v1/history/{valid_pdf_id}")
         assert response.status_code == 206
     
-    @patch('app.tasks.process_pdf_task.delay') 
+    @patch('app.tasks.parse_pdf_task.apply_async') 
     def test_pdf_upload(self, mock_process_pdf_task, client: TestClient, valid_pdf_path):
         mock_process_pdf_task.return_value.id = 'mock_task_id'
 
@@ -81,3 +104,201 @@ class TestAPISuite:
         assert response.status_code == 202
         json_response = response.json()
         assert json_response['task_id'] == 'mock_task_id'
+        assert json_response['monitor_url'] == f"/v1/pdf/{json_response['pdf_id']}/status"
+        assert json_response['lane'] == 'bulk'
+        assert mock_process_pdf_task.call_args.kwargs['queue'] == 'parsing.bulk'
+
+    @patch('app.tasks.parse_pdf_task.apply_async')
+    def test_bulk_pdf_upload(self, mock_process_pdf_task, client: TestClient, valid_pdf_path, valid_pdf_id):
+        mock_process_pdf_task.return_value.id = 'mock_task_id'
+
+        response = client.post(
+            "/v1/pdf/bulk",
+            files=[
+                ("files", ("first.pdf", open(valid_pdf_path, "rb"), "application/pdf")),
+                ("files", ("second.pdf", open(valid_pdf_path, "rb"), "application/pdf")),
+                ("files", ("invalid.pdf", b"Invalid file content", "application/pdf")),
+            ],
+        )
+        assert response.status_code == 202
+        results = response.json()
+        assert [r['status'] for r in results] == ['stored', 'duplicate', 'rejected']
+        assert results[0]['pdf_id'] == results[1]['pdf_id'] == valid_pdf_id
+        assert results[0]['task_id'] == 'mock_task_id'
+        assert results[0]['lane'] == 'bulk'
+        assert results[1]['task_id'] is None
+        # only the stored file is ingested, always through the bulk lane
+        mock_process_pdf_task.assert_called_once()
+        assert mock_process_pdf_task.call_args.kwargs['queue'] == 'parsing.bulk'
+
+    @patch('app.routes.document.load_lane_stats', new_callable=AsyncMock)
+    def test_get_ingestion_queues(self, mock_load_lane_stats, client: TestClient):
+        from app.models import IngestionLane, LaneStats
+        mock_load_lane_stats.return_value = [
+            LaneStats(lane=IngestionLane.FAST, queued=1, wait_samples=2, wait_p50=0.5, wait_max=1.0),
+            LaneStats(lane=IngestionLane.BULK, queued=0),
+        ]
+
+        response = client.get("/v1/pdf/queues")
+        assert response.status_code == 200
+        assert [lane["lane"] for lane in response.json()] == ["fast", "bulk"]
+
+    @patch('app.routes.document.load_status', new_callable=AsyncMock)
+    def test_get_document_status(self, mock_load_status, client: TestClient, valid_pdf_id):
+        from app.models import IngestionState, IngestionStatus
+        mock_load_status.return_value = IngestionStatus(document_id=valid_pdf_id, state=IngestionState.PARSING)
+
+        response = client.get(f"/v1/pdf/{valid_pdf_id}/status")
+        assert response.status_code == 200
+        assert response.json()["state"] == "parsing"
+
+    @patch('app.routes.document.load_status', new_callable=AsyncMock)
+    def test_get_document_status_not_found(self, mock_load_status, client: TestClient, valid_pdf_id):
+        mock_load_status.return_value = None
+
+        response = client.get(f"/v1/pdf/{valid_pdf_id}/status")
+        assert response.status_code == 404
+
+    @patch('app.routes.chat.load_state', new_callable=AsyncMock)
+    def test_chat_document_not_ready(self, mock_load_state, client: TestClient, valid_pdf_path, valid_pdf_id):
+        from app.models import IngestionState
+        mock_load_state.return_value = IngestionState.EMBEDDING
+        os.system(f"cp {valid_pdf_path} {app_config.pdf_path}")
+
+        response = client.post(f"/v1/chat/{valid_pdf_id}", json={"message": "question"})
+        assert response.status_code == 409
+
+    @patch('app.routes.chat.save_qa', new_callable=AsyncMock)
+    @patch('app.routes.chat.load_qa', new_callable=AsyncMock)
+    @patch('app.routes.chat.invoke_rag_chain', new_callable=AsyncMock)
+    @patch('app.routes.chat.load_state', new_callable=AsyncMock)
+    def test_chat_partial_document(self, mock_load_state, mock_invoke, mock_load_qa, mock_save_qa, client: TestClient, valid_pdf_path, valid_pdf_id):
+        from app.models import IngestionState
+        mock_load_state.return_value = IngestionState.PARTIAL
+        mock_load_qa.return_value = None
+        mock_invoke.return_value = {"answer": "early answer"}
+        os.system(f"cp {valid_pdf_path} {app_config.pdf_path}")
+
+        response = client.post(f"/v1/chat/{valid_pdf_id}", json={"message": "question"})
+        assert response.status_code == 200
+        assert response.json() == {"response": "early answer", "partial": True}
+        assert mock_invoke.call_args.kwargs["partial"] is True
+        # answers based on the first pages only are not cached
+        mock_save_qa.assert_not_awaited()
+
+    @patch('app.routes.chat.save_qa', new_callable=AsyncMock)
+    @patch('app.routes.chat.load_qa', new_callable=AsyncMock)
+    @patch('app.routes.chat.get_rag_components', new_callable=AsyncMock)
+    @patch('app.routes.chat.invoke_multi_rag_chain', new_callable=AsyncMock)
+    @patch('app.routes.chat.load_state', new_callable=AsyncMock)
+    def test_chat_with_multiple_pdfs(self, mock_load_state, mock_invoke, mock_components, mock_load_qa, mock_save_qa, client: TestClient, valid_pdf_path, valid_pdf_id):
+        from app.utils.hash_utils import generate_document_set_id
+        other_id = "4a564e8b-bd2c-52e5-3a81-16845a19e107"
+        os.system(f"cp {valid_pdf_path} {app_config.pdf_path}")
+        os.system(f"cp tests/mock/pdf/{other_id}.pdf {app_config.pdf_path}")
+        mock_load_state.return_value = None
+        mock_load_qa.return_value = None
+        mock_invoke.return_value = {"answer": "combined answer"}
+
+        response = client.post("/v1/chat/", json={"message": "question", "pdf_ids": [valid_pdf_id, other_id, valid_pdf_id]})
+        assert response.status_code == 200
+        chat_id = generate_document_set_id([other_id, valid_pdf_id])
+        assert response.json() == {"response": "combined answer", "partial": False, "chat_id": chat_id}
+        assert mock_invoke.call_args.kwargs["pdf_ids"] == [valid_pdf_id, other_id]
+        # history and cache are keyed by the document set
+        mock_load_qa.assert_awaited_once_with(chat_id, "question", pdf_ids=[valid_pdf_id, other_id])
+        mock_save_qa.assert_awaited_once_with(chat_id, "question", "combined answer", pdf_ids=[valid_pdf_id, other_id])
+
+    def test_chat_with_multiple_pdfs_not_found(self, client: TestClient, valid_pdf_path, valid_pdf_id):
+        os.system(f"cp {valid_pdf_path} {app_config.pdf_path}")
+
+        response = client.post("/v1/chat/", json={"message": "question", "pdf_ids": [valid_pdf_id, "missing"]})
+        assert response.status_code == 404
+
+        response = client.post("/v1/chat/", json={"message": "question", "pdf_ids": []})
+        assert response.status_code == 422
+
+    @patch('app.routes.chat.load_state', new_callable=AsyncMock)
+    @patch('app.routes.chat.load_qa', new_callable=AsyncMock)
+    def test_stream_chat_cache_hit(self, mock_load_qa, mock_load_state, client: TestClient, valid_pdf_path, valid_pdf_id):
+        mock_load_qa.return_value = "cached answer"
+        mock_load_state.return_value = None
+        os.system(f"cp {valid_pdf_path} {app_config.pdf_path}")
+
+        response = client.post(f"/v1/chat/{valid_pdf_id}/stream", json={"message": "question"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == 'event: end\ndata: {"response": "cached answer", "partial": false}\n\n'
+
+    @patch('app.routes.chat.save_qa', new_callable=AsyncMock)
+    @patch('app.routes.chat.load_qa', new_callable=AsyncMock)
+    @patch('app.routes.chat.get_rag_components', new_callable=AsyncMock)
+    @patch('app.routes.chat.stream_rag_chain')
+    @patch('app.routes.chat.load_state', new_callable=AsyncMock)
+    def test_stream_chat(self, mock_load_state, mock_stream, mock_components, mock_load_qa, mock_save_qa, client: TestClient, valid_pdf_path, valid_pdf_id):
+        async def tokens(**kwargs):
+            for token in ["Hello", " world"]:
+                yield token
+
+        mock_stream.side_effect = tokens
+        mock_load_qa.return_value = None
+        mock_load_state.return_value = None
+        os.system(f"cp {valid_pdf_path} {app_config.pdf_path}")
+
+        response = client.post(f"/v1/chat/{valid_pdf_id}/stream", json={"message": "question"})
+        assert response.status_code == 200
+        events = response.text.strip().split("\n\n")
+        assert events == [
+            'event: token\ndata: {"token": "Hello"}',
+            'event: token\ndata: {"token": " world"}',
+            'event: end\ndata: {"response": "Hello world", "partial": false}',
+        ]
+        mock_save_qa.assert_awaited_once_with(valid_pdf_id, "question", "Hello world")
+
+    def test_stream_chat_not_found(self, client: TestClient):
+        response = client.post("/v1/chat/missing/stream", json={"message": "question"})
+        assert response.status_code == 404
+
+    @patch('app.routes.search.search_library', new_callable=AsyncMock)
+    def test_search_documents(self, mock_search, client: TestClient):
+        from langchain.schema import Document
+
+        def chunk(pdf_id, page):
+            return Document(
+                page_content=f"{pdf_id} page {page}",
+                metadata={"document_id": pdf_id, "filename": f"{pdf_id}.pdf", "page": page},
+            )
+
+        mock_search.return_value = [
+            [(chunk("a", 1), 0.7), (chunk("a", 2), 0.4)],
+            [(chunk("b", 3), 0.9)],
+        ]
+
+        response = client.get("/v1/search/", params={"q": " topic ", "k": 2})
+        assert response.status_code == 200
+        mock_search.assert_awaited_once_with("topic", 2)
+        body = response.json()
+        assert [d["document_id"] for d in body["documents"]] == ["b", "a"]
+        assert [(r["document_id"], r["page"], r["score"]) for r in body["results"]] == [
+            ("b", 3, 0.9),
+            ("a", 1, 0.7),
+        ]
+
+        assert client.get("/v1/search/", params={"q": ""}).status_code == 422
+        assert client.get("/v1/search/", params={"q": "topic", "k": 0}).status_code == 422
+
+    @patch('app.routes.chat.load_qa_stats', new_callable=AsyncMock)
+    def test_get_qa_cache_stats(self, mock_load_stats, client: TestClient):
+        from app.models import QACacheStats
+        mock_load_stats.return_value = QACacheStats(exact_hits=3, semantic_hits=1, misses=4, hit_rate=0.5)
+
+        response = client.get("/v1/chat/cache")
+        assert response.status_code == 200
+        assert response.json() == {
+            "exact_hits": 3,
+            "semantic_hits": 1,
+            "misses": 4,
+            "local_hits": 0,
+            "hit_rate": 0.5,
+            "samples": [],
+        }
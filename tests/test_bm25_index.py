@@ -0,0 +1,73 @@
+import pytest
+from langchain.schema import Document
+from app.services.lexical import BM25Index, load_lexical_index, save_lexical_index, tokenize
+
+
+def _chunk(text, page, start_index=0):
+    return Document(page_content=text, metadata={"page": page, "start_index": start_index})
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index("document", tmp_path)
+    index.add_documents(
+        [
+            _chunk("Clause 14.2 covers the termination of the agreement.", 1),
+            _chunk("Clause 14.1 covers the notice period of the agreement.", 1, 60),
+        ],
+        segment="1",
+    )
+    index.add_documents(
+        [_chunk("The agreement is governed by the laws of England.", 2)], segment="2"
+    )
+    return index
+
+
+def test_tokenize():
+    assert tokenize("What is Clause 14.2, COVID-19?") == ["clause", "14.2", "covid-19"]
+
+
+def test_empty_index(tmp_path):
+    index = BM25Index("missing", tmp_path)
+    assert len(index) == 0
+    assert index.search("clause") == []
+
+
+def test_search(index):
+    results = index.search("clause 14.2", k=3)
+
+    # documents without a query term are omitted
+    assert [(doc.metadata["page"], doc.metadata["start_index"]) for doc, _ in results] == [(1, 0), (1, 60)]
+    assert results[0][1] > results[1][1] > 0
+    assert index.search("agreement", k=1)[0][0].metadata["page"] in (1, 2)
+
+
+def test_coverage(index):
+    top = index.search("what is clause 14.2")[0][0]
+
+    assert index.coverage("clause 14.2", top) == 1.0
+    assert 0.0 < index.coverage("clause 14.2 arbitration", top) < 1.0
+    assert index.coverage("arbitration", top) == 0.0
+
+
+def test_segments_are_persisted_and_replaced(index, tmp_path):
+    assert len(BM25Index("document", tmp_path)) == 3
+
+    index.add_documents([_chunk("Arbitration takes place in London.", 2)], segment="2")
+
+    reloaded = BM25Index("document", tmp_path)
+    assert len(reloaded) == 3
+    assert reloaded.search("england") == []
+    assert reloaded.search("arbitration")[0][0].page_content.startswith("Arbitration")
+
+
+def test_delete(index):
+    index.delete()
+    assert len(index) == 0
+
+
+def test_save_lexical_index(tmp_path):
+    save_lexical_index("document", [_chunk("first", 1), _chunk("second", 2)], tmp_path)
+    save_lexical_index("document", [_chunk("third", 3)], tmp_path)
+
+    assert len(load_lexical_index("document", tmp_path)) == 3
@@ -0,0 +1,130 @@
+import time
+import pytest
+from app.utils.cache_utils import FrequencySketch, LRUCache
+
+
+def test_lru_cache_hit_and_miss():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" becomes the least recently used
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.evictions == 1
+
+
+def test_lru_cache_ttl_expiry():
+    cache = LRUCache(maxsize=2, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_get_or_set():
+    cache = LRUCache(maxsize=2)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return "value"
+
+    assert cache.get_or_set("a", factory) == "value"
+    assert cache.get_or_set("a", factory) == "value"
+    assert len(calls) == 1
+
+
+def test_lru_cache_get_or_set_does_not_cache_errors():
+    cache = LRUCache(maxsize=2)
+
+    def factory():
+        raise KeyError
+
+    with pytest.raises(KeyError):
+        cache.get_or_set("a", factory)
+    assert "a" not in cache
+
+
+def test_lru_cache_invalidate():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+
+    assert cache.invalidate("a") is True
+    assert cache.invalidate("a") is False
+    assert cache.get("a") is None
+
+
+def test_lru_cache_stats():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_frequency_sketch():
+    sketch = FrequencySketch(capacity=8)
+    for _ in range(3):
+        sketch.increment("hot")
+    sketch.increment("cold")
+
+    assert sketch.estimate("hot") >= 3
+    assert sketch.estimate("cold") >= 1
+    assert sketch.estimate("hot") > sketch.estimate("unseen")
+
+
+def test_frequency_sketch_aging():
+    sketch = FrequencySketch(capacity=2)
+    for _ in range(sketch.sample_size):
+        sketch.increment("hot")
+
+    # counters saturate, then are halved once the sample is full
+    assert sketch.estimate("hot") == FrequencySketch.MAX_COUNT // 2
+
+
+def test_lru_cache_admission():
+    cache = LRUCache(maxsize=2, admission=True)
+    for key in ("a", "b"):
+        cache.get(key)
+        cache.get(key)
+        cache.set(key, key)
+
+    # a one-off key does not replace popular entries
+    cache.get("c")
+    assert cache.set("c", "c") is False
+    assert "c" not in cache and len(cache) == 2
+
+    # a key requested as often as the least recently used entry does
+    cache.get("d")
+    cache.get("d")
+    cache.get("d")
+    assert cache.set("d", "d") is True
+    assert "d" in cache and "a" not in cache
+
+
+def test_lru_cache_invalidate_if():
+    cache = LRUCache(maxsize=4)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+
+    assert cache.invalidate_if(lambda key, value: value % 2 == 1) == 2
+    assert "b" in cache and len(cache) == 1
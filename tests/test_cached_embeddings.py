@@ -0,0 +1,107 @@
+import pytest
+from unittest.mock import MagicMock
+from langchain_core.embeddings import Embeddings
+from redis.exceptions import RedisError
+from app.services.embeddings import CachedEmbeddings
+from app.services.embeddings.cached_embeddings import (
+    embedding_cache_key,
+    pack_vector,
+    unpack_vector,
+)
+
+
+class CountingEmbeddings(Embeddings):
+    model = "fake-model"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 0.5] for text in texts]
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return [float(len(text)), -0.5]
+
+
+@pytest.fixture
+def embeddings():
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def cached(embeddings, tmp_path):
+    return CachedEmbeddings(embeddings, cache_dir=tmp_path)
+
+
+def test_pack_vector_roundtrip():
+    data = pack_vector([1.0, -2.5, 0.25])
+    assert len(data) == 12  # float32
+    assert unpack_vector(data) == [1.0, -2.5, 0.25]
+
+
+def test_cache_key_depends_on_model():
+    assert embedding_cache_key("a", "text") != embedding_cache_key("b", "text")
+    assert embedding_cache_key("a", "text") == embedding_cache_key("a", "text")
+
+
+def test_embed_documents_only_embeds_misses(cached, embeddings):
+    assert cached.embed_documents(["one", "three"]) == [[3.0, 0.5], [5.0, 0.5]]
+    assert cached.embed_documents(["three", "fours", "fours"]) == [
+        [5.0, 0.5],
+        [5.0, 0.5],
+        [5.0, 0.5],
+    ]
+
+    assert embeddings.embedded == ["one", "three", "fours"]
+    assert cached.stats() == {"hits": 1, "misses": 4, "hit_ratio": 0.2}
+
+
+def test_reingestion_makes_no_calls(embeddings, tmp_path):
+    texts = ["chunk a", "chunk b"]
+    CachedEmbeddings(embeddings, cache_dir=tmp_path).embed_documents(texts)
+
+    # new instance, e.g. a restarted worker
+    cached = CachedEmbeddings(embeddings, cache_dir=tmp_path)
+    embeddings.embedded.clear()
+    cached.embed_documents(texts)
+
+    assert embeddings.embedded == []
+    assert cached.stats()["hit_ratio"] == 1.0
+
+
+def test_embed_query_is_cached_separately(cached, embeddings):
+    assert cached.embed_query("question") == [8.0, -0.5]
+    assert cached.embed_query("question") == [8.0, -0.5]
+    assert cached.embed_documents(["question"]) == [[8.0, 0.5]]
+
+    assert embeddings.embedded == ["question", "question"]
+
+
+def test_redis_tier(embeddings, tmp_path):
+    redis_conn = MagicMock()
+    redis_conn.mget.return_value = [pack_vector([1.0, 2.0]), None]
+    cached = CachedEmbeddings(
+        embeddings, cache_dir=tmp_path, redis_conn=redis_conn, redis_ttl=60
+    )
+
+    assert cached.embed_documents(["shared", "new"]) == [[1.0, 2.0], [3.0, 0.5]]
+    assert embeddings.embedded == ["new"]
+    pipe = redis_conn.pipeline.return_value.__enter__.return_value
+    pipe.set.assert_called_once()
+    assert pipe.set.call_args.kwargs["ex"] == 60
+
+    # the redis hit was copied to the disk tier
+    redis_conn.mget.reset_mock()
+    assert cached.embed_documents(["shared"]) == [[1.0, 2.0]]
+    redis_conn.mget.assert_not_called()
+
+
+def test_redis_errors_are_misses(embeddings, tmp_path):
+    redis_conn = MagicMock()
+    redis_conn.mget.side_effect = RedisError("down")
+    redis_conn.pipeline.side_effect = RedisError("down")
+    cached = CachedEmbeddings(embeddings, cache_dir=tmp_path, redis_conn=redis_conn)
+
+    assert cached.embed_documents(["text"]) == [[4.0, 0.5]]
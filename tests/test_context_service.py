@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import patch
+from langchain.schema import Document
+from app.config import app_config
+from app.services.context_service import compress_context
+
+page_text = " ".join(f"Sentence number {i} of the lease." for i in range(80))
+
+
+def _chunk(start, end, page=1, document_id="doc"):
+    return Document(
+        page_content=page_text[start:end],
+        metadata={"document_id": document_id, "page": page, "start_index": start},
+    )
+
+
+@pytest.fixture
+def config():
+    config = app_config.model_copy(update={"context_dedup_threshold": 0.9})
+    with patch('app.services.context_service.app_config', config):
+        yield config
+
+
+def test_compress_context_merges_overlaps(config):
+    # ranked out of document order, the second chunk overlaps the first one
+    documents = [_chunk(800, 1800), _chunk(0, 1000), _chunk(2400, 2600, page=2)]
+
+    compression = compress_context(documents, token_budget=0)
+
+    merged, other = compression.documents
+    assert merged.page_content == page_text[0:1800]
+    assert merged.metadata["start_index"] == 0
+    assert other is documents[2]
+    # the 200 overlapping characters are sent once
+    assert (compression.retrieved, compression.tokens_saved) == (3, 50)
+
+
+def test_compress_context_merges_adjacent_chunks(config):
+    # the splitter strips the whitespace between adjacent chunks
+    first, second = _chunk(0, 31), _chunk(32, 60)
+
+    compression = compress_context([first, second], token_budget=0)
+
+    assert [doc.page_content for doc in compression.documents] == [page_text[0:60]]
+
+
+def test_compress_context_keeps_distinct_chunks(config):
+    other = Document(
+        page_content=page_text[2000:2100],
+        metadata={"document_id": "other", "page": 1, "start_index": 0},
+    )
+    documents = [_chunk(0, 100), _chunk(500, 600), other]
+
+    compression = compress_context(documents, token_budget=0)
+
+    # chunks of other pages or documents are never merged
+    assert compression.documents == documents
+    assert compression.tokens_saved == 0
+
+
+def test_compress_context_drops_near_duplicates(config):
+    header = "Residential lease agreement between the landlord and the tenant, page header."
+    documents = [
+        Document(header + " The rent is due monthly."),
+        Document(page_text[:300]),
+        Document(header),
+    ]
+
+    compression = compress_context(documents, token_budget=0)
+
+    # repeated on every page, the header alone is only sent once
+    assert compression.documents == documents[:2]
+
+
+def test_compress_context_fits_budget(config):
+    documents = [_chunk(0, 400), _chunk(1000, 1800), _chunk(2000, 2100)]
+
+    compression = compress_context(documents, token_budget=200)
+
+    first, trimmed = compression.documents
+    assert first is documents[0]
+    # the lowest ranked chunks are trimmed at a sentence end, or dropped
+    assert page_text[1000:1800].startswith(trimmed.page_content)
+    assert trimmed.page_content.endswith(".")
+    assert compression.output_tokens <= 200
@@ -1,8 +1,13 @@
+import io
 import os
 import shutil
+import zipfile
 from fastapi import UploadFile
 import pytest
-from app.services.document_service import validate_pdf, handle_file_upload, load_document, split_text, list_all
+from unittest.mock import patch
+from app.exceptions import InvalidFileException
+from app.models import BulkUploadStatus
+from app.services.document_service import validate_pdf, handle_file_upload, handle_bulk_upload, iter_chunk_windows, store_multiple_documents, load_document, split_text, list_all, store_pdf_file, save_document_text, load_document_text, delete_document_text
 from app.config import app_config
 
 pytest_plugins = ('pytest_asyncio',)
@@ -111,7 +116,9 @@ async def test_upload_file(valid_pdf_path, valid_pdf_id, setup_dirs):
     
     res = await handle_file_upload(file)
     
-    assert res == valid_pdf_id
+    assert res.document_id == valid_pdf_id
+    assert res.page_count > 0
+    assert res.size == os.path.getsize(valid_pdf_path)
 
 @pytest.mark.asyncio
 async def test_upload_same_file(valid_pdf_path, valid_pdf_id, setup_dirs):
@@ -127,6 +134,179 @@ async def test_upload_same_file(valid_pdf_path, valid_pdf_id, setup_dirs):
         await handle_file_upload(file)
 
 
+@pytest.mark.asyncio
+async def test_upload_file_removes_temp_file(valid_pdf_path, valid_pdf_id, setup_dirs):
+    file = UploadFile(
+        filename=f'{valid_pdf_id}.pdf',
+        file=open(valid_pdf_path, 'rb'),
+        size=1,
+        headers={'content-type': 'application/pdf'}
+    )
+
+    await handle_file_upload(file)
+
+    assert not list(app_config.tmp_path.glob("*.part"))
+    assert os.path.isfile(app_config.pdf_path / f"{valid_pdf_id}.pdf")
+
+
+@pytest.mark.asyncio
+async def test_upload_invalid_file_content(setup_dirs):
+    file = UploadFile(
+        filename='test.pdf',
+        file=io.BytesIO(b"not a pdf"),
+        size=9,
+        headers={'content-type': 'application/pdf'}
+    )
+
+    with pytest.raises(InvalidFileException):
+        await handle_file_upload(file)
+    assert not list(app_config.tmp_path.glob("*.part"))
+    assert not os.listdir(app_config.pdf_path)
+
+
+def test_store_pdf_file(valid_pdf_path, valid_pdf_id, setup_dirs):
+    with open(valid_pdf_path, 'rb') as source:
+        res = store_pdf_file(source)
+
+    assert res.document_id == valid_pdf_id
+    assert res.size == os.path.getsize(valid_pdf_path)
+    assert os.path.isfile(app_config.pdf_path / f"{valid_pdf_id}.pdf")
+
+    # known files are skipped before their structure is checked
+    with open(valid_pdf_path, 'rb') as source, patch(
+        'app.services.document_service._check_pdf_structure'
+    ) as mock_check:
+        with pytest.raises(FileExistsError):
+            store_pdf_file(source)
+    mock_check.assert_not_called()
+    assert not list(app_config.tmp_path.glob("*.part"))
+
+
+def test_store_pdf_file_concurrent_upload(valid_pdf_path, valid_pdf_id, setup_dirs):
+    pdf_path = app_config.pdf_path / f"{valid_pdf_id}.pdf"
+
+    def check_pdf_structure(path):
+        # another upload of the same file is stored while this one is checked
+        pdf_path.write_bytes(b"stored by another upload")
+        return 3
+
+    with open(valid_pdf_path, 'rb') as source, patch(
+        'app.services.document_service._check_pdf_structure', side_effect=check_pdf_structure
+    ):
+        with pytest.raises(FileExistsError):
+            store_pdf_file(source)
+
+    assert pdf_path.read_bytes() == b"stored by another upload"
+    assert not list(app_config.tmp_path.glob("*.part"))
+
+
+@pytest.mark.asyncio
+async def test_handle_bulk_upload(valid_pdf_path, valid_pdf_id, setup_dirs):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.write(valid_pdf_path, f"docs/{valid_pdf_id}.pdf")  # duplicate of the pdf below
+        zip_file.writestr("docs/broken.pdf", b"not a pdf")
+        zip_file.writestr("docs/notes.txt", b"ignored")
+    archive.seek(0)
+
+    files = [
+        UploadFile(
+            filename='first.pdf',
+            file=open(valid_pdf_path, 'rb'),
+            size=1,
+            headers={'content-type': 'application/pdf'}
+        ),
+        UploadFile(
+            filename='archive.zip',
+            file=archive,
+            size=len(archive.getvalue()),
+            headers={'content-type': 'application/zip'}
+        ),
+        UploadFile(
+            filename='empty.pdf',
+            file=io.BytesIO(b""),
+            size=0,
+            headers={'content-type': 'application/pdf'}
+        ),
+    ]
+
+    results = await handle_bulk_upload(files)
+
+    assert [r.filename for r in results] == ['first.pdf', f'{valid_pdf_id}.pdf', 'broken.pdf', 'empty.pdf']
+    assert [r.status for r in results] == [
+        BulkUploadStatus.STORED,
+        BulkUploadStatus.DUPLICATE,
+        BulkUploadStatus.REJECTED,
+        BulkUploadStatus.REJECTED,
+    ]
+    assert results[0].pdf_id == results[1].pdf_id == valid_pdf_id
+    assert results[0].page_count == 3
+    assert results[3].error == 'Empty file'
+    assert os.listdir(app_config.pdf_path) == [f'{valid_pdf_id}.pdf']
+
+
+@pytest.mark.asyncio
+async def test_handle_bulk_upload_too_many_files(valid_pdf_path, setup_dirs):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        for i in range(3):
+            zip_file.writestr(f"{i}.pdf", b"not a pdf")
+    archive.seek(0)
+    files = [UploadFile(filename='archive.zip', file=archive, size=1)]
+
+    with patch('app.services.document_service.app_config', app_config.model_copy(update={"max_bulk_files": 2})):
+        with pytest.raises(InvalidFileException):
+            await handle_bulk_upload(files)
+
+
+@pytest.mark.asyncio
+async def test_handle_bulk_upload_too_many_files_stores_nothing(valid_pdf_path, setup_dirs):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.write(valid_pdf_path, "valid.pdf")
+        zip_file.writestr("broken.pdf", b"not a pdf")
+    archive.seek(0)
+    # the limit is only exceeded by the archive, after a valid pdf
+    files = [
+        UploadFile(
+            filename='first.pdf',
+            file=open(valid_pdf_path, 'rb'),
+            size=1,
+            headers={'content-type': 'application/pdf'}
+        ),
+        UploadFile(filename='archive.zip', file=archive, size=len(archive.getvalue())),
+    ]
+
+    with patch('app.services.document_service.app_config', app_config.model_copy(update={"max_bulk_files": 2})):
+        with pytest.raises(InvalidFileException):
+            await handle_bulk_upload(files)
+
+    # nothing is stored, so a retry within the limit is not reported as duplicates
+    assert not os.listdir(app_config.pdf_path)
+    assert not list(app_config.tmp_path.glob("*.part"))
+
+
+def test_store_multiple_documents(valid_pdf_id, setup_dirs, tmp_path):
+    shutil.copytree("tests/mock/pdf", tmp_path / "archive")
+    (tmp_path / "archive" / "broken.pdf").write_bytes(b"not a pdf")
+    os.system(f"cp tests/mock/pdf/{valid_pdf_id}.pdf {app_config.pdf_path}")
+
+    results = store_multiple_documents(str(tmp_path / "archive"), max_workers=2)
+
+    statuses = {r.filename: r.status for r in results}
+    assert statuses == {
+        f'{valid_pdf_id}.pdf': BulkUploadStatus.DUPLICATE,
+        'bc466009-0aea-25e2-8e58-f5ccdc717e74.pdf': BulkUploadStatus.STORED,
+        'broken.pdf': BulkUploadStatus.REJECTED,
+    }
+    assert sorted(list_all()) == sorted([valid_pdf_id, 'bc466009-0aea-25e2-8e58-f5ccdc717e74'])
+
+
+def test_store_multiple_documents_missing_dir(setup_dirs):
+    with pytest.raises(NotADirectoryError):
+        store_multiple_documents("does/not/exist")
+
+
 def test_load_document(valid_pdf_path, valid_pdf_id, setup_dirs):
     uploaded_pdf_path = f"{app_config.pdf_path}/{valid_pdf_id}.pdf"
     os.system(f"cp {valid_pdf_path} {uploaded_pdf_path}")
@@ -137,6 +317,44 @@ def test_load_document(valid_pdf_path, valid_pdf_id, setup_dirs):
     assert docs[0].metadata['page_count'] == 3
 
 
+def test_iter_chunk_windows(valid_pdf_path, valid_pdf_id):
+    windows = list(iter_chunk_windows(valid_pdf_path, valid_pdf_id, window_size=2))
+
+    chunks = split_text(load_document(valid_pdf_path, valid_pdf_id))
+    assert [c for window in windows for c in window] == chunks
+    assert len(windows) > 1
+    assert all(len(window) >= 2 for window in windows[:-1])
+    # windows hold whole pages
+    pages = [{c.metadata["page"] for c in window} for window in windows]
+    assert all(not a & b for a, b in zip(pages, pages[1:]))
+
+
+def test_iter_chunk_windows_context_mode(valid_pdf_path, valid_pdf_id):
+    # a document fitting a single window is passed to the LLM as a whole
+    (window,) = iter_chunk_windows(valid_pdf_path, valid_pdf_id)
+    assert {c.metadata["context_mode"] for c in window} == {"full"}
+
+    windows = iter_chunk_windows(valid_pdf_path, valid_pdf_id, window_size=2)
+    assert {c.metadata["context_mode"] for w in windows for c in w} == {"retrieval"}
+
+    config = app_config.model_copy(update={"full_context_max_tokens": 10})
+    with patch('app.services.document_service.app_config', config):
+        (window,) = iter_chunk_windows(valid_pdf_path, valid_pdf_id)
+    assert {c.metadata["context_mode"] for c in window} == {"retrieval"}
+
+
+def test_document_text(valid_pdf_path, valid_pdf_id, setup_dirs):
+    pages = load_document(valid_pdf_path, valid_pdf_id)
+    assert load_document_text(valid_pdf_id) is None
+
+    # the overlapping chunks are joined back into the text of the pages
+    save_document_text(valid_pdf_id, split_text(pages))
+    assert load_document_text(valid_pdf_id) == "\n\n".join(p.page_content.strip() for p in pages)
+
+    delete_document_text(valid_pdf_id)
+    assert load_document_text(valid_pdf_id) is None
+
+
 def test_split_text():
     from langchain.schema import Document
     
@@ -0,0 +1,71 @@
+import threading
+import pytest
+from unittest.mock import patch
+from langchain_core.embeddings import Embeddings
+from app.services.embeddings import embed_documents_batched
+
+
+class RateLimitError(Exception):
+    code = 429
+
+
+class FakeEmbeddings(Embeddings):
+    """Embeds a text as its length, failing the first call of the given texts."""
+
+    def __init__(self, fail_once=(), error=RateLimitError):
+        self.fail_once = set(fail_once)
+        self.error = error
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.calls += 1
+            failing = self.fail_once.intersection(texts)
+            self.fail_once -= failing
+        if failing:
+            raise self.error()
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    with patch("app.utils.retry_utils.time.sleep"):
+        yield
+
+
+def test_embed_documents_batched_keeps_order():
+    texts = ["a" * i for i in range(1, 11)]
+    progress = []
+
+    vectors = embed_documents_batched(
+        texts,
+        FakeEmbeddings(),
+        batch_size=3,
+        max_concurrency=4,
+        on_progress=progress.append,
+    )
+
+    assert vectors == [[float(i)] for i in range(1, 11)]
+    assert sorted(progress) == progress
+    assert progress[-1] == 10
+
+
+def test_embed_documents_batched_retries_rate_limits():
+    texts = ["a" * i for i in range(1, 7)]
+    embeddings = FakeEmbeddings(fail_once=["aaaa"])
+
+    vectors = embed_documents_batched(texts, embeddings, batch_size=2, max_concurrency=2)
+
+    assert vectors == [[float(i)] for i in range(1, 7)]
+    assert embeddings.calls == 4  # 3 batches + 1 retry
+
+
+def test_embed_documents_batched_raises_non_retryable_errors():
+    embeddings = FakeEmbeddings(fail_once=["aa"], error=ValueError)
+
+    with pytest.raises(ValueError):
+        embed_documents_batched(["a", "aa", "aaa"], embeddings, batch_size=1, max_concurrency=2)
@@ -0,0 +1,79 @@
+import os
+import pytest
+from unittest.mock import patch
+from app.services.extraction import extract_pages, iter_pages, pymupdf_extraction
+
+
+@pytest.fixture(scope="module")
+def valid_pdf_path():
+    return os.path.join("tests/mock/pdf", "4a564e8b-bd2c-52e5-3a81-16845a19e107.pdf")
+
+
+@pytest.fixture(scope="module")
+def large_pdf_path():
+    return os.path.join("tests/mock/pdf", "bc466009-0aea-25e2-8e58-f5ccdc717e74.pdf")
+
+
+def test_extract_pages_pymupdf(valid_pdf_path):
+    pages = extract_pages(valid_pdf_path, engine="pymupdf")
+
+    assert len(pages) == 3
+    assert all(page.strip() for page in pages)
+
+
+def test_extract_pages_unknown_engine(valid_pdf_path):
+    with pytest.raises(ValueError):
+        extract_pages(valid_pdf_path, engine="unknown")
+
+
+def test_iter_pages_matches_extract_pages(valid_pdf_path):
+    assert list(iter_pages(valid_pdf_path, engine="pymupdf")) == extract_pages(valid_pdf_path, engine="pymupdf")
+
+
+def test_parallel_extraction_matches_sequential(large_pdf_path):
+    sequential = pymupdf_extraction.extract_pages(large_pdf_path)
+    parallel = pymupdf_extraction.extract_pages(large_pdf_path, parallel_min_pages=1, workers=2)
+
+    assert parallel == sequential
+
+
+def test_parallel_iteration_matches_sequential(large_pdf_path):
+    sequential = pymupdf_extraction.extract_pages(large_pdf_path)
+    pages = pymupdf_extraction.iter_pages(large_pdf_path, parallel_min_pages=1, workers=2, range_pages=50)
+
+    with patch('os.cpu_count', return_value=2), patch.object(
+        pymupdf_extraction, '_process_pool', wraps=pymupdf_extraction._process_pool
+    ) as mock_pool:
+        assert list(pages) == sequential
+
+    mock_pool.assert_called_once_with(2)
+
+
+def test_parallel_iteration_unavailable(large_pdf_path):
+    sequential = pymupdf_extraction.extract_pages(large_pdf_path)
+    with patch('os.cpu_count', return_value=2), patch.object(
+        pymupdf_extraction, '_process_pool', side_effect=OSError
+    ):
+        pages = pymupdf_extraction.iter_pages(large_pdf_path, parallel_min_pages=1, workers=2)
+
+        assert list(pages) == sequential
+
+
+@patch('app.services.extraction.unstructured_extraction.extract_pages')
+def test_fallback_for_pages_without_text(mock_fallback, large_pdf_path):
+    mock_fallback.return_value = {0: "ocr text"}
+
+    pages = extract_pages(large_pdf_path, engine="pymupdf")
+
+    empty_pages = mock_fallback.call_args.args[1]
+    assert 0 in empty_pages
+    assert pages[0] == "ocr text"
+
+
+@patch('app.services.extraction.unstructured_extraction.extract_pages')
+def test_fallback_errors_are_skipped(mock_fallback, large_pdf_path):
+    mock_fallback.side_effect = OSError
+
+    pages = extract_pages(large_pdf_path, engine="pymupdf")
+
+    assert pages[0] == ""
@@ -1,7 +1,9 @@
 import os
 import pathlib
+import threading
 import pytest
-from app.utils.file_utils import init_dirs
+from unittest.mock import MagicMock, patch
+from app.utils.file_utils import init_dirs, lock_file
 
 @pytest.fixture(scope="function")
 def temp_dir():
@@ -29,3 +31,38 @@ def test_init_dirs_existing_directories(temp_dir):
 
     # Ensure it doesn't raise any errors and exists
     assert existing_dir.exists()
+
+
+def test_lock_file(tmp_path):
+    path = tmp_path / "records"
+    order = []
+
+    def append():
+        with open(path, "ab") as f, lock_file(f):
+            order.append("second")
+
+    with open(path, "ab") as f, lock_file(f):
+        thread = threading.Thread(target=append)
+        thread.start()
+        # the other handle waits for the lock
+        thread.join(0.2)
+        order.append("first")
+    thread.join()
+
+    assert order == ["first", "second"]
+
+
+def test_lock_file_without_fcntl(tmp_path):
+    # Windows has no fcntl, the first byte is locked with msvcrt instead
+    msvcrt = MagicMock()
+    msvcrt.locking.side_effect = [OSError("timed out"), None, None]
+    with patch('app.utils.file_utils.fcntl', None), patch('app.utils.file_utils.msvcrt', msvcrt):
+        with open(tmp_path / "records", "ab") as f, lock_file(f):
+            f.write(b"record")
+
+    assert [c.args[1:] for c in msvcrt.locking.call_args_list] == [
+        (msvcrt.LK_LOCK, 1),
+        (msvcrt.LK_LOCK, 1),
+        (msvcrt.LK_UNLCK, 1),
+    ]
+    assert (tmp_path / "records").read_bytes() == b"record"
@@ -1,7 +1,7 @@
 import os
 import uuid
 import pytest
-from app.utils.hash_utils import get_file_hash, generate_uuid_from_file 
+from app.utils.hash_utils import get_file_hash, generate_uuid_from_file, generate_document_set_id
 
 @pytest.fixture(scope="function")
 def sample_file():
@@ -34,3 +34,11 @@ def test_generate_uuid_from_file(sample_file, sample_file_2):
     assert isinstance(file_uuid_1, uuid.UUID)
     assert isinstance(file_uuid_1, uuid.UUID)
     assert file_uuid_1 == file_uuid_2
+
+def test_generate_document_set_id():
+    set_id = generate_document_set_id(["b", "a"])
+
+    assert set_id == generate_document_set_id(["a", "b", "a"])
+    assert set_id != generate_document_set_id(["a", "c"])
+    assert uuid.UUID(set_id)
+    assert generate_document_set_id(["a", "a"]) == "a"
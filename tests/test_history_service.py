@@ -1,10 +1,22 @@
+import asyncio
 import json
 import os
 import shutil
 import pytest
 from app.config import app_config
 
-from app.services.history_service import load_history, delete_history, save_history
+from app.services.history_service import (
+    aappend_turn,
+    adelete_history,
+    aload_history,
+    append_turn,
+    count_turns,
+    delete_history,
+    load_history,
+    load_summary,
+    load_turns,
+    save_summary,
+)
 
 
 @pytest.fixture(scope="function")
@@ -53,17 +65,113 @@ def test_load_user_history(valid_history_id, setup_dirs):
     assert history[0][1] == default_history[0][1]
     assert history[-2][1] != default_history[-2][1]
 
-def test_save_history(setup_dirs):
-    mock_history = [
-        ("system", "text"),
-        ("ai", "text"),
-        ("human", "{input}"),
+def test_append_turn(setup_dirs):
+    mock_pdf_id = "test_history"
+    append_turn(mock_pdf_id, "first question", "first answer")
+    append_turn(mock_pdf_id, "second question", "second answer")
+
+    records_path = os.path.join(app_config.history_path, f"{mock_pdf_id}.jsonl")
+    with open(records_path, 'r') as f:
+        records = [json.loads(line) for line in f]
+    assert records[1] == {"human": "second question", "ai": "second answer"}
+
+    history = load_history(mock_pdf_id)
+    assert history[0] == tuple(app_config.default_history[0])
+    assert history[2:-1] == [
+        ("human", "first question"),
+        ("ai", "first answer"),
+        ("human", "second question"),
+        ("ai", "second answer"),
+    ]
+    assert history[-1] == ("human", "{input}")
+
+def test_load_history_tail(setup_dirs):
+    mock_pdf_id = "test_history"
+    for i in range(5):
+        append_turn(mock_pdf_id, f"question {i}", f"answer {i}")
+
+    history = load_history(mock_pdf_id, max_turns=2)
+    assert history[2:-1] == [
+        ("human", "question 3"),
+        ("ai", "answer 3"),
+        ("human", "question 4"),
+        ("ai", "answer 4"),
     ]
+    assert len(load_history(mock_pdf_id, max_turns=10)) == 2 + 2 * 5 + 1
+
+def test_append_turn_converts_legacy_history(valid_history_id, setup_dirs):
+    legacy = load_history(valid_history_id)
+    append_turn(valid_history_id, "new question", "new answer")
+
+    assert not os.path.isfile(os.path.join(app_config.history_path, valid_history_id))
+    history = load_history(valid_history_id)
+    assert history[:-3] == legacy[:-1]
+    assert history[-3:-1] == [("human", "new question"), ("ai", "new answer")]
+
+def test_concurrent_appends(setup_dirs):
+    mock_pdf_id = "test_history"
+
+    async def chat():
+        await asyncio.gather(
+            *(aappend_turn(mock_pdf_id, f"question {i}", f"answer {i}") for i in range(20))
+        )
+        return await aload_history(mock_pdf_id, max_turns=20)
+
+    history = asyncio.run(chat())
+    # every turn is kept, none is overwritten by a concurrent request
+    assert sorted(message for role, message in history[2:-1] if role == "human") == sorted(
+        f"question {i}" for i in range(20)
+    )
+
+def test_delete_history(valid_history_id, setup_dirs):
+    mock_pdf_id = "test_history"
+    append_turn(mock_pdf_id, "question", "answer")
+    delete_history(mock_pdf_id)
+
+    assert load_history(mock_pdf_id) == []
+    # the records and their index are deleted
+    assert os.listdir(app_config.history_path) == [valid_history_id]
+
+def test_adelete_history(valid_history_id, setup_dirs):
+    mock_pdf_id = "test_history"
+
+    async def chat():
+        await aappend_turn(mock_pdf_id, "question", "answer")
+        await adelete_history(mock_pdf_id)
+
+    asyncio.run(chat())
+    assert load_history(mock_pdf_id) == []
+    assert os.listdir(app_config.history_path) == [valid_history_id]
+
+def test_load_history_token_budget(setup_dirs):
     mock_pdf_id = "test_history"
-    save_history(mock_pdf_id, mock_history)
+    append_turn(mock_pdf_id, "a" * 400, "b" * 400)
+    append_turn(mock_pdf_id, "question", "answer")
+
+    # the oldest turn does not fit the budget
+    history = load_history(mock_pdf_id, token_budget=100)
+    assert history[2:-1] == [("human", "question"), ("ai", "answer")]
+    assert load_history(mock_pdf_id, max_turns=0) == []
+
+def test_load_turns_and_count(valid_history_id, setup_dirs):
+    mock_pdf_id = "test_history"
+    for i in range(5):
+        append_turn(mock_pdf_id, f"question {i}", f"answer {i}")
+
+    assert count_turns(mock_pdf_id) == 5
+    assert load_turns(mock_pdf_id, start=1, stop=3) == [("question 1", "answer 1"), ("question 2", "answer 2")]
+    assert count_turns("missing") == 0
+    # histories saved as a JSON list are counted as well
+    assert count_turns(valid_history_id) == len(load_turns(valid_history_id)) > 0
+
+def test_summary(setup_dirs):
+    mock_pdf_id = "test_history"
+    assert load_summary(mock_pdf_id) == ("", 0)
+
+    assert save_summary(mock_pdf_id, "summary of 4 turns", 4)
+    # an older refresh does not overwrite a newer summary
+    assert not save_summary(mock_pdf_id, "summary of 2 turns", 2)
+    assert load_summary(mock_pdf_id) == ("summary of 4 turns", 4)
 
-    assert os.path.isfile(os.path.join(app_config.history_path, mock_pdf_id))
-    with open(os.path.join(app_config.history_path, mock_pdf_id), 'r') as f:
-        data = json.load(f)
-        assert isinstance(data[1], list)
-        assert tuple(data[1]) == mock_history[1]
\ No newline at end of file
+    delete_history(mock_pdf_id)
+    assert load_summary(mock_pdf_id) == ("", 0)
@@ -0,0 +1,141 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from unittest.mock import patch
+from langchain_core.embeddings import Embeddings
+from app.services.vectorstores import NumpyVectorStore
+
+
+class AxisEmbeddings(Embeddings):
+    """Embeds texts of the form "axis:<i>" as the unit vector of axis i."""
+
+    dim = 4
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = [0.0] * self.dim
+        vector[int(text.split(":")[1])] = 1.0
+        return vector
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NumpyVectorStore("collection", AxisEmbeddings(), tmp_path)
+
+
+def test_empty_collection(store):
+    assert store.get(limit=1, include=[])["ids"] == []
+    assert store.similarity_search("axis:0") == []
+
+
+def test_similarity_search_ranks_by_cosine(store):
+    store.add_embeddings(
+        texts=["a", "b", "c"],
+        vectors=[[1, 0, 0, 0], [1, 1, 0, 0], [0, 0, 1, 0]],
+        metadatas=[{"page": 1}, {"page": 2}, {"page": 3}],
+        ids=["a", "b", "c"],
+    )
+
+    results = store.similarity_search_with_score("axis:0", k=2)
+
+    assert [doc.page_content for doc, _ in results] == ["a", "b"]
+    assert results[0][0].metadata == {"page": 1}
+    assert results[0][1] == pytest.approx(1.0)
+    assert results[1][1] == pytest.approx(np.sqrt(0.5))
+
+
+def test_similarity_search_with_filter(store):
+    store.add_texts(["axis:0", "axis:1"], metadatas=[{"page": 1}, {"page": 2}])
+
+    results = store.similarity_search("axis:0", k=4, filter={"page": 2})
+
+    assert [doc.page_content for doc in results] == ["axis:1"]
+
+
+def test_persistence_and_upsert(store, tmp_path):
+    store.add_texts(["axis:0", "axis:1"], ids=["x", "y"])
+    store.add_texts(["axis:2"], ids=["x"])  # replaces "x"
+
+    reloaded = NumpyVectorStore("collection", AxisEmbeddings(), tmp_path)
+    result = reloaded.get()
+
+    assert sorted(result["ids"]) == ["x", "y"]
+    assert reloaded.similarity_search("axis:2", k=1)[0].page_content == "axis:2"
+    assert isinstance(reloaded._load()[0], np.memmap)
+
+
+def test_delete(store):
+    store.add_texts(["axis:0", "axis:1"], ids=["x", "y"])
+
+    store.delete(["x"])
+    assert store.get(include=[])["ids"] == ["y"]
+
+    store.delete()
+    assert store.get(include=[])["ids"] == []
+
+
+def test_mismatched_dimension(store):
+    store.add_texts(["axis:0"])
+    with pytest.raises(ValueError):
+        store.add_embeddings(["bad"], [[1.0, 0.0]])
+
+
+def test_retriever(store):
+    store.add_texts(["axis:0", "axis:1", "axis:3"])
+    retriever = store.as_retriever(search_kwargs={"k": 1})
+
+    assert retriever.invoke("axis:3")[0].page_content == "axis:3"
+
+
+def test_read_during_write(store, tmp_path):
+    store.add_texts(["axis:0"], ids=["x"])
+    writer = NumpyVectorStore("collection", AxisEmbeddings(), tmp_path)
+    reader = NumpyVectorStore("collection", AxisEmbeddings(), tmp_path)
+    load = np.load
+    writes = []
+
+    def load_after_write(*args, **kwargs):
+        # a write lands between the read of the chunks and of the vectors
+        if not writes:
+            writes.append(1)
+            writer.add_texts(["axis:1"], ids=["y"])
+        return load(*args, **kwargs)
+
+    with patch('app.services.vectorstores.numpy_vectorstore.np.load', load_after_write):
+        result = reader.get()
+
+    # the read is retried and sees the new write as a whole
+    assert sorted(result["ids"]) == ["x", "y"]
+    assert reader._load()[0].shape[0] == 2
+    assert len(list((tmp_path / "collection").glob("vectors*.npy"))) == 1
+
+
+def test_unversioned_collection(tmp_path):
+    path = tmp_path / "collection"
+    path.mkdir()
+    np.save(path / "vectors.npy", np.eye(4, dtype=np.float32)[:1])
+    (path / "chunks.json").write_text(json.dumps({"ids": ["x"], "documents": ["axis:0"], "metadatas": [{}]}))
+
+    store = NumpyVectorStore("collection", AxisEmbeddings(), tmp_path)
+    assert store.similarity_search("axis:0", k=1)[0].page_content == "axis:0"
+
+    # the next write moves the collection to a versioned vectors file
+    store.add_texts(["axis:1"], ids=["y"])
+    assert not (path / "vectors.npy").exists()
+    assert sorted(store.get(include=[])["ids"]) == ["x", "y"]
+
+
+def test_concurrent_writers(tmp_path):
+    # every write goes through its own handle, like load_vectorstore
+    def write(i):
+        store = NumpyVectorStore("collection", AxisEmbeddings(), tmp_path)
+        store.add_texts([f"axis:{i % 4}"], ids=[str(i)])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(write, range(40)))
+
+    store = NumpyVectorStore("collection", AxisEmbeddings(), tmp_path)
+    assert sorted(store.get(include=[])["ids"], key=int) == [str(i) for i in range(40)]
@@ -1,16 +1,36 @@
 import pytest
-from app.utils.parse_utils import generate_safe_key
+from app.utils.parse_utils import estimate_tokens, generate_safe_key, normalize_query
 
 def test_generate_safe_key():
     chat_id = "chat1234"
     user_query = "Hello, World! This is a test query with invalid chars @#$%&*"
-    
-    expected_key = "app:chat1234:Hello_World_This_is_a_test_query_with_invalid_chars_"
-    assert generate_safe_key(chat_id, user_query) == expected_key
 
-def test_generate_safe_key_trims_query_length():
+    key = generate_safe_key(chat_id, user_query)
+    prefix, key_chat_id, query_hash = key.split(":")
+    assert (prefix, key_chat_id) == ("app", chat_id)
+    assert len(query_hash) == 64
+
+def test_generate_safe_key_normalizes_query():
+    chat_id = "chat123"
+
+    assert normalize_query("  What IS the   deadline? ") == "what is the deadline"
+    assert generate_safe_key(chat_id, "What is the deadline?") == generate_safe_key(
+        chat_id, "what  is the DEADLINE"
+    )
+    assert generate_safe_key(chat_id, "What is the deadline?") != generate_safe_key(
+        "chat456", "What is the deadline?"
+    )
+
+def test_generate_safe_key_avoids_collisions():
     chat_id = "chat123"
-    user_query = "a" * 200
-    
-    expected_key = "app:chat123:" + "a" * 100  # Should trim to 100 chars
-    assert generate_safe_key(chat_id, user_query) == expected_key
+
+    # long queries sharing a prefix
+    assert generate_safe_key(chat_id, "a" * 100 + "b") != generate_safe_key(chat_id, "a" * 100 + "c")
+    # queries made of characters outside ASCII
+    assert generate_safe_key(chat_id, "Что такое налог?") != generate_safe_key(chat_id, "Что такое закон?")
+    assert generate_safe_key(chat_id, "税率は?") != generate_safe_key(chat_id, "期限は?")
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abc") == 1
+    assert estimate_tokens("a" * 400) == 100
@@ -1,50 +1,328 @@
+import asyncio
+import json
+import zlib
 import pytest
-from unittest.mock import AsyncMock, patch
-from app.services.qa_cache_service import save_qa, load_qa
+from unittest.mock import AsyncMock, MagicMock, patch
+from redis.exceptions import RedisError
+from app.services.qa_cache_service import (
+    invalidate_qa,
+    listen_invalidations,
+    local_qa_cache,
+    save_qa,
+    load_qa,
+    load_qa_stats,
+)
 from app.config import app_config
+from app.services import qa_cache_service
 
 # Test data
 pdf_id = "test_pdf"
 query = "What is the test?"
-formatted_query = "what_is_this_test"
 answer = "This is a test answer."
-expected_key = f"app:{pdf_id}:{formatted_query}"
+expected_key = f"app:{pdf_id}:0123abcd"
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    local_qa_cache.clear()
+    yield
+    local_qa_cache.clear()
+
+
+async def _recorded():
+    # the lookup counters are recorded in the background
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        *(task for task in qa_cache_service._pending_records if task.get_loop() is loop)
+    )
+
+
+def _redis_with_pipeline():
+    mock_redis = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    mock_redis.pipeline = MagicMock()
+    mock_redis.pipeline.return_value.__aenter__.return_value = pipe
+    return mock_redis, pipe
+
 
 @pytest.mark.asyncio
+@patch('app.services.qa_cache_service._semantic_entry', new_callable=AsyncMock)
 @patch('app.services.qa_cache_service.generate_safe_key')
-async def test_save_qa(mock_generate_safe_key):
+async def test_save_qa(mock_generate_safe_key, mock_semantic_entry):
     mock_generate_safe_key.return_value = expected_key
-    mock_redis = AsyncMock()
-    
+    mock_semantic_entry.return_value = None
+    mock_redis, pipe = _redis_with_pipeline()
+
     await save_qa(pdf_id, query, answer, redis_conn=mock_redis)
 
     mock_generate_safe_key.assert_called_once_with(pdf_id, query)
-    mock_redis.set.assert_called_once_with(expected_key, answer, ex=app_config.cache_expiry)
+    key, value = pipe.set.call_args.args
+    assert key == expected_key and zlib.decompress(value).decode() == answer
+    assert pipe.set.call_args.kwargs == {"ex": app_config.cache_expiry}
+    # the keys are tagged with the document for invalidation
+    pipe.sadd.assert_called_once_with(f"qa_index:{pdf_id}", expected_key, f"qa_semantic:{pdf_id}")
+    pipe.lpush.assert_not_called()
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@patch('app.services.qa_cache_service._semantic_entry', new_callable=AsyncMock)
+async def test_save_qa_document_set(mock_semantic_entry):
+    mock_semantic_entry.return_value = None
+    mock_redis, pipe = _redis_with_pipeline()
+
+    await save_qa("set_id", query, answer, redis_conn=mock_redis, pdf_ids=["a", "b"])
+
+    assert [c.args[0] for c in pipe.sadd.call_args_list] == ["qa_index:a", "qa_index:b"]
+
+
+@pytest.mark.asyncio
+@patch('app.services.qa_cache_service._semantic_entry', new_callable=AsyncMock)
+async def test_save_qa_redis_error(mock_semantic_entry):
+    mock_semantic_entry.return_value = None
+    mock_redis, pipe = _redis_with_pipeline()
+    pipe.execute.side_effect = RedisError("down")
+
+    # the answer is generated already, the chat does not fail
+    await save_qa(pdf_id, query, answer, redis_conn=mock_redis)
+
+    assert local_qa_cache.get(qa_cache_service.generate_safe_key(pdf_id, query))[0] == answer
+
 
 @pytest.mark.asyncio
 @patch('app.services.qa_cache_service.generate_safe_key')
 async def test_load_qa_hit(mock_generate_safe_key):
     mock_generate_safe_key.return_value = expected_key
     mock_redis = AsyncMock()
-    mock_redis.get.return_value = answer
-    
-    result = await load_qa(pdf_id, query, redis_conn=mock_redis)
+    mock_redis.getex.return_value = zlib.compress(answer.encode())
+    recorded = asyncio.Event()
+
+    async def hincrby(*args):
+        await recorded.wait()
+
+    mock_redis.hincrby.side_effect = hincrby
+
+    # the hit is returned without waiting for the counter round trip
+    result = await asyncio.wait_for(load_qa(pdf_id, query, redis_conn=mock_redis), 1)
+    assert not recorded.is_set()
+    recorded.set()
+    await _recorded()
+    mock_redis.hincrby.assert_awaited_once_with("qa_cache:stats", "exact_hits", 1)
 
     mock_generate_safe_key.assert_called_once_with(pdf_id, query)
-    mock_redis.get.assert_called_once_with(expected_key)
-    mock_redis.expire.assert_called_once_with(expected_key, app_config.cache_expiry)
+    # read and expiry prolonged in one round trip
+    mock_redis.getex.assert_awaited_once_with(expected_key, ex=app_config.cache_expiry)
+    mock_redis.get.assert_not_called()
+    mock_redis.expire.assert_not_called()
     assert result == answer
 
 @pytest.mark.asyncio
+@patch('app.services.qa_cache_service._load_similar', new_callable=AsyncMock)
 @patch('app.services.qa_cache_service.generate_safe_key')
-async def test_load_qa_miss(mock_generate_safe_key):
+async def test_load_qa_miss(mock_generate_safe_key, mock_load_similar):
     mock_generate_safe_key.return_value = expected_key
     mock_redis = AsyncMock()
-    mock_redis.get.return_value = None
-    
+    mock_redis.getex.return_value = None
+    mock_load_similar.return_value = None
+
     result = await load_qa(pdf_id, query, redis_conn=mock_redis)
 
     mock_generate_safe_key.assert_called_once_with(pdf_id, query)
-    mock_redis.get.assert_called_once_with(expected_key)
-    mock_redis.expire.assert_not_called()
+    mock_redis.getex.assert_awaited_once_with(expected_key, ex=app_config.cache_expiry)
+    mock_load_similar.assert_awaited_once_with(mock_redis, pdf_id, query)
+    await _recorded()
+    mock_redis.hincrby.assert_awaited_once_with("qa_cache:stats", "misses", 1)
     assert result is None
+
+
+def test_invalidate_qa():
+    mock_redis = MagicMock()
+    pipe = mock_redis.pipeline.return_value.__enter__.return_value
+    pipe.execute.return_value = [{b"app:test_pdf:1", b"qa_semantic:test_pdf"}, 1, 1]
+
+    invalidate_qa(pdf_id, redis_conn=mock_redis)
+
+    pipe.smembers.assert_called_once_with(f"qa_index:{pdf_id}")
+    pipe.delete.assert_called_once_with(f"qa_index:{pdf_id}")
+    pipe.publish.assert_called_once_with("qa_cache:invalidations", pdf_id)
+    assert set(mock_redis.unlink.call_args.args) == {b"app:test_pdf:1", b"qa_semantic:test_pdf"}
+
+
+@pytest.mark.asyncio
+@patch('app.services.qa_cache_service._semantic_entry', new_callable=AsyncMock)
+async def test_local_qa_cache(mock_semantic_entry):
+    mock_semantic_entry.return_value = None
+    mock_redis, _ = _redis_with_pipeline()
+    await save_qa("set_id", query, answer, redis_conn=mock_redis, pdf_ids=["a", "b"])
+
+    # a hot question is answered without a Redis round trip
+    assert await load_qa("set_id", query, redis_conn=mock_redis) == answer
+    mock_redis.getex.assert_not_called()
+    mock_redis.hgetall.return_value = {}
+    mock_redis.lrange.return_value = []
+    assert (await load_qa_stats(redis_conn=mock_redis)).local_hits == 1
+
+    # until one of its documents is re-ingested
+    sync_redis = MagicMock()
+    sync_redis.pipeline.return_value.__enter__.return_value.execute.return_value = [set(), 0, 1]
+    invalidate_qa("b", redis_conn=sync_redis)
+    mock_redis.getex.return_value = None
+    assert await load_qa("set_id", query, redis_conn=mock_redis) is None
+    mock_redis.getex.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_listen_invalidations():
+    # entries cached before the subscription may have missed invalidations
+    local_qa_cache.set("app:c:1", (answer, frozenset(["c"])))
+
+    async def listen():
+        yield {"type": "subscribe", "data": 1}
+        assert len(local_qa_cache) == 0
+        local_qa_cache.set("app:a:1", (answer, frozenset(["a"])))
+        local_qa_cache.set("app:b:1", (answer, frozenset(["b"])))
+        yield {"type": "message", "data": b"a"}
+        raise asyncio.CancelledError
+
+    pubsub = AsyncMock()
+    pubsub.listen = listen
+    mock_redis = MagicMock()
+    mock_redis.pubsub.return_value.__aenter__.return_value = pubsub
+
+    with pytest.raises(asyncio.CancelledError):
+        await listen_invalidations(redis_conn=mock_redis)
+
+    pubsub.subscribe.assert_awaited_once_with("qa_cache:invalidations")
+    assert "app:a:1" not in local_qa_cache
+    assert "app:b:1" in local_qa_cache
+
+
+@pytest.mark.asyncio
+async def test_listen_invalidations_drops_rag_chains():
+    from app.services.rag_service import invalidate_rag_chain, rag_chain_cache
+
+    rag_chain_cache.clear()
+    rag_chain_cache.set("stale", "chain")
+
+    async def listen():
+        yield {"type": "subscribe", "data": 1}
+        # chains cached before the subscription may have missed invalidations
+        assert "stale" not in rag_chain_cache
+        rag_chain_cache.set("a", "chain")
+        rag_chain_cache.set("b", "chain")
+        # published by the celery worker re-ingesting the document
+        yield {"type": "message", "data": b"a"}
+        raise asyncio.CancelledError
+
+    pubsub = AsyncMock()
+    pubsub.listen = listen
+    mock_redis = MagicMock()
+    mock_redis.pubsub.return_value.__aenter__.return_value = pubsub
+
+    with pytest.raises(asyncio.CancelledError):
+        await listen_invalidations(redis_conn=mock_redis, on_invalidate=invalidate_rag_chain)
+
+    assert rag_chain_cache.get("a") is None
+    assert rag_chain_cache.get("b") == "chain"
+    rag_chain_cache.clear()
+
+
+def test_invalidate_qa_redis_error():
+    mock_redis = MagicMock()
+    mock_redis.pipeline.side_effect = RedisError("down")
+
+    # best effort, the ingestion does not fail
+    invalidate_qa(pdf_id, redis_conn=mock_redis)
+    mock_redis.unlink.assert_not_called()
+
+
+@pytest.fixture
+def embeddings():
+    vectors = {
+        "What is the deadline?": [1.0, 0.0, 0.0],
+        "what's the deadline": [0.99, 0.1, 0.0],
+        "Who signed the contract?": [0.0, 0.0, 1.0],
+    }
+    embeddings = MagicMock()
+    embeddings.aembed_query = AsyncMock(side_effect=lambda text: vectors[text])
+    with patch('app.services.qa_cache_service.gemini_embeddings', embeddings):
+        yield embeddings
+
+
+@pytest.mark.asyncio
+async def test_semantic_qa(embeddings):
+    mock_redis, pipe = _redis_with_pipeline()
+    await save_qa(pdf_id, "What is the deadline?", "In May.", redis_conn=mock_redis)
+
+    semantic_key = f"qa_semantic:{pdf_id}"
+    exact_key = pipe.set.call_args.args[0]
+    entry = pipe.lpush.call_args.args[1]
+    pipe.ltrim.assert_called_once_with(semantic_key, 0, app_config.qa_semantic_cache_size - 1)
+    # the entry points to the answer instead of copying it
+    assert json.loads(entry)["key"] == exact_key
+
+    # a paraphrase misses the exact key, but hits the semantic index
+    mock_redis.getex.return_value = None
+    mock_redis.lrange.return_value = [entry.encode()]
+    pipe.execute.return_value = [pipe.set.call_args.args[1], True]
+    config = app_config.model_copy(update={"qa_semantic_cache_sample_rate": 1.0})
+    with patch('app.services.qa_cache_service.app_config', config):
+        assert await load_qa(pdf_id, "what's the deadline", redis_conn=mock_redis) == "In May."
+    mock_redis.lrange.assert_awaited_with(semantic_key, 0, -1)
+    pipe.getex.assert_called_once_with(exact_key, ex=app_config.cache_expiry)
+    await _recorded()
+    mock_redis.hincrby.assert_awaited_with("qa_cache:stats", "semantic_hits", 1)
+
+    # the hit is sampled for review
+    sample = json.loads(pipe.lpush.call_args.args[1])
+    assert pipe.lpush.call_args.args[0] == "qa_cache:samples"
+    assert (sample["query"], sample["cached_query"]) == ("what's the deadline", "What is the deadline?")
+    assert sample["similarity"] >= app_config.qa_semantic_cache_threshold
+
+    # an unrelated question does not
+    assert await load_qa(pdf_id, "Who signed the contract?", redis_conn=mock_redis) is None
+    await _recorded()
+    mock_redis.hincrby.assert_awaited_with("qa_cache:stats", "misses", 1)
+
+    # nor does a paraphrase once the answer expired
+    pipe.execute.return_value = [None, True]
+    assert await load_qa(pdf_id, "what's the deadline", redis_conn=mock_redis) is None
+    await _recorded()
+    mock_redis.hincrby.assert_awaited_with("qa_cache:stats", "misses", 1)
+
+
+@pytest.mark.asyncio
+async def test_semantic_qa_empty_index(embeddings):
+    mock_redis = AsyncMock()
+    mock_redis.getex.return_value = None
+    mock_redis.lrange.return_value = []
+
+    assert await load_qa(pdf_id, "What is the deadline?", redis_conn=mock_redis) is None
+    # nothing cached for the document, the query is not embedded
+    embeddings.aembed_query.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_load_qa_stats():
+    mock_redis = AsyncMock()
+    mock_redis.hgetall.return_value = {b"exact_hits": b"2", b"semantic_hits": b"1", b"misses": b"1"}
+    mock_redis.lrange.return_value = [
+        json.dumps({"chat_id": pdf_id, "query": "q", "cached_query": "Q", "similarity": 0.97, "time": 1.0})
+    ]
+
+    stats = await load_qa_stats(redis_conn=mock_redis)
+
+    assert (stats.exact_hits, stats.semantic_hits, stats.misses) == (2, 1, 1)
+    assert stats.hit_rate == 0.75
+    assert stats.samples[0].cached_query == "Q"
+
+
+@pytest.mark.asyncio
+async def test_load_qa_stats_redis_error():
+    mock_redis = AsyncMock()
+    mock_redis.hgetall.side_effect = RedisError("down")
+
+    stats = await load_qa_stats(redis_conn=mock_redis)
+
+    assert (stats.exact_hits, stats.misses, stats.hit_rate, stats.samples) == (0, 0, None, [])
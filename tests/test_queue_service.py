@@ -0,0 +1,77 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from redis.exceptions import ConnectionError
+from app.config import app_config
+from app.models import IngestionLane
+from app.services.queue_service import lane_queue, load_lane_stats, record_wait, select_lane
+
+
+def test_select_lane():
+    max_pages = app_config.ingestion_fast_lane_max_pages
+    max_bytes = app_config.ingestion_fast_lane_max_bytes
+
+    assert select_lane(1, 1024) == IngestionLane.FAST
+    assert select_lane(max_pages, max_bytes) == IngestionLane.FAST
+    assert select_lane(max_pages + 1, 1024) == IngestionLane.BULK
+    assert select_lane(1, max_bytes + 1) == IngestionLane.BULK
+
+
+def test_lane_queue():
+    assert lane_queue("parsing", IngestionLane.FAST) == "parsing.fast"
+    assert lane_queue("embedding", "bulk") == "embedding.bulk"
+
+
+def test_record_wait():
+    mock_redis = MagicMock()
+    pipe = mock_redis.pipeline.return_value.__enter__.return_value
+
+    record_wait(IngestionLane.BULK, 2.5, redis_conn=mock_redis)
+
+    pipe.lpush.assert_called_once_with("ingestion_wait:bulk", 2.5)
+    pipe.ltrim.assert_called_once_with("ingestion_wait:bulk", 0, app_config.ingestion_wait_samples - 1)
+    pipe.execute.assert_called_once()
+
+
+def test_record_wait_ignores_redis_errors():
+    mock_redis = MagicMock()
+    mock_redis.pipeline.side_effect = ConnectionError
+
+    record_wait(IngestionLane.FAST, 1.0, redis_conn=mock_redis)
+
+
+@pytest.mark.asyncio
+async def test_load_lane_stats():
+    mock_redis = MagicMock()
+    pipe = AsyncMock()
+    mock_redis.pipeline.return_value.__aenter__.return_value = pipe
+    pipe.llen = MagicMock()
+    pipe.lrange = MagicMock()
+    pipe.execute.side_effect = [
+        [2, 3, 1, [b"1.0", b"3.0", b"2.0"]],  # fast lane
+        [0, 0, 0, []],  # bulk lane
+    ]
+
+    fast, bulk = await load_lane_stats(redis_conn=mock_redis)
+
+    assert fast.lane == IngestionLane.FAST
+    assert fast.queued == 6
+    assert fast.wait_samples == 3
+    assert fast.wait_p50 == 2.0
+    assert fast.wait_max == 3.0
+    assert bulk.queued == 0
+    assert bulk.wait_p50 is None
+    pipe.llen.assert_any_call("parsing.fast")
+    pipe.llen.assert_any_call("embedding.fast")
+    pipe.llen.assert_any_call("storing.bulk")
+
+
+@pytest.mark.asyncio
+async def test_load_lane_stats_redis_unavailable():
+    mock_redis = MagicMock()
+    pipe = AsyncMock()
+    mock_redis.pipeline.return_value.__aenter__.return_value = pipe
+    pipe.llen = MagicMock()
+    pipe.lrange = MagicMock()
+    pipe.execute.side_effect = ConnectionError
+
+    assert await load_lane_stats(redis_conn=mock_redis) == []
@@ -0,0 +1,285 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.retrievers import BaseRetriever
+from langchain_chroma import Chroma
+from app.config import app_config
+from app.models import ContextMode
+from app.services.lexical import BM25Index
+from app.services.rag_service import (
+    HybridRetriever,
+    MultiDocumentRetriever,
+    _build_chain,
+    _build_query_planner,
+    _build_rag_components,
+    get_rag_components,
+    invalidate_rag_chain,
+    rag_chain_cache,
+)
+
+
+def _vectorstore(results):
+    vectorstore = MagicMock(spec=Chroma)
+    vectorstore.similarity_search_by_vector_with_relevance_scores.return_value = results
+    vectorstore._select_relevance_score_fn.return_value = lambda score: score
+    return vectorstore
+
+
+@pytest.fixture
+def retriever():
+    embeddings = MagicMock(spec=Embeddings)
+    embeddings.embed_query.return_value = [1.0, 0.0]
+
+    async def aembed_query(text):
+        return [1.0, 0.0]
+
+    embeddings.aembed_query.side_effect = aembed_query
+    vectorstores = [
+        _vectorstore([(Document("a1"), 0.9), (Document("a2"), 0.2)]),
+        _vectorstore([(Document("b1"), 0.8), (Document("b2"), 0.7)]),
+    ]
+    return MultiDocumentRetriever(vectorstores=vectorstores, embeddings=embeddings, k=3)
+
+
+def test_multi_document_retriever(retriever):
+    docs = retriever.invoke("query")
+
+    assert [doc.page_content for doc in docs] == ["a1", "b1", "b2"]
+    # the query is embedded once for every document
+    retriever.embeddings.embed_query.assert_called_once_with("query")
+    for vectorstore in retriever.vectorstores:
+        vectorstore.similarity_search_by_vector_with_relevance_scores.assert_called_once_with([1.0, 0.0], k=3)
+
+
+@pytest.mark.asyncio
+async def test_multi_document_retriever_async(retriever):
+    docs = await retriever.ainvoke("query")
+
+    assert [doc.page_content for doc in docs] == ["a1", "b1", "b2"]
+    retriever.embeddings.aembed_query.assert_called_once_with("query")
+
+
+def _chunk(text, page):
+    return Document(page_content=text, metadata={"page": page, "start_index": 0})
+
+
+@pytest.fixture
+def hybrid_retriever(tmp_path):
+    lexical_index = BM25Index("document", tmp_path)
+    lexical_index.add_documents(
+        [
+            _chunk("Clause 14.2 covers the termination of the agreement.", 1),
+            _chunk("Clause 3 covers payments under the agreement.", 2),
+            _chunk("The parties may terminate early.", 3),
+        ],
+        segment="1",
+    )
+    vectorstore = MagicMock(spec=Chroma)
+    vectorstore.similarity_search.return_value = [
+        _chunk("The parties may terminate early.", 3),
+        _chunk("Clause 3 covers payments under the agreement.", 2),
+    ]
+    return HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index, k=2)
+
+
+def test_hybrid_retriever_lexical_only(hybrid_retriever):
+    docs = hybrid_retriever.invoke("what is clause 14.2")
+
+    assert docs[0].metadata["page"] == 1
+    # exact lookups never embed the query
+    hybrid_retriever.vectorstore.similarity_search.assert_not_called()
+
+
+def test_hybrid_retriever_fusion(hybrid_retriever):
+    docs = hybrid_retriever.invoke("how can the agreement be terminated")
+
+    hybrid_retriever.vectorstore.similarity_search.assert_called_once_with(
+        "how can the agreement be terminated", k=2
+    )
+    # the chunk ranked by both searches comes first
+    assert [doc.metadata["page"] for doc in docs] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_hybrid_retriever_async(hybrid_retriever):
+    async def asimilarity_search(query, k):
+        return hybrid_retriever.vectorstore.similarity_search(query, k=k)
+
+    hybrid_retriever.vectorstore.asimilarity_search.side_effect = asimilarity_search
+
+    assert (await hybrid_retriever.ainvoke("what is clause 14.2"))[0].metadata["page"] == 1
+    hybrid_retriever.vectorstore.asimilarity_search.assert_not_called()
+
+    assert [doc.metadata["page"] for doc in await hybrid_retriever.ainvoke("terminated agreement")] == [2, 1]
+
+
+class RecordingRetriever(BaseRetriever):
+    queries: list = []
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.queries.append(query)
+        return [Document(query)]
+
+
+def _planner(*rewrites):
+    # a spare response, the model starts over after the last one
+    llm = FakeListChatModel(responses=[*rewrites, "unused"])
+    retriever = RecordingRetriever(queries=[])
+    prompt = ChatPromptTemplate.from_messages(
+        [MessagesPlaceholder("chat_history"), ("human", "{input}")]
+    )
+    return _build_query_planner(llm, retriever, prompt), llm, retriever
+
+
+greeting = [("ai", "Hello! How can I help you with your PDF file?")]
+history = greeting + [("human", "What is the lease term?"), ("ai", "Five years.")]
+
+
+@pytest.mark.asyncio
+async def test_query_planner_first_turn():
+    planner, llm, retriever = _planner()
+
+    docs = await planner.ainvoke({"input": "what about it?", "chat_history": greeting})
+
+    # nothing to resolve without history, the question is not rewritten
+    assert retriever.queries == ["what about it?"]
+    assert docs[0].page_content == "what about it?"
+    assert llm.i == 0
+
+
+@pytest.mark.asyncio
+async def test_query_planner_standalone_question():
+    planner, llm, retriever = _planner()
+
+    await planner.ainvoke({"input": "What is the monthly rent of the apartment?", "chat_history": history})
+
+    assert retriever.queries == ["What is the monthly rent of the apartment?"]
+    assert llm.i == 0
+
+
+@pytest.mark.asyncio
+async def test_query_planner_follow_up():
+    planner, llm, retriever = _planner("Can the lease term be extended?")
+
+    docs = await planner.ainvoke({"input": "Can it be extended?", "chat_history": history})
+
+    # the raw question is retrieved speculatively, then the rewritten one
+    assert retriever.queries == ["Can it be extended?", "Can the lease term be extended?"]
+    assert docs[0].page_content == "Can the lease term be extended?"
+    assert llm.i == 1
+
+
+@pytest.mark.asyncio
+async def test_query_planner_reuses_speculative_retrieval():
+    planner, llm, retriever = _planner("Who signed the lease?")
+
+    docs = await planner.ainvoke({"input": "who signed the lease", "chat_history": history + [("human", "and them?")]})
+
+    # the rewrite does not change the question, the raw retrieval is reused
+    assert retriever.queries == ["who signed the lease"]
+    assert docs[0].page_content == "who signed the lease"
+    assert llm.i == 1
+
+
+def test_query_planner_always_rewrites():
+    planner, llm, retriever = _planner("What is the monthly rent?")
+    config = app_config.model_copy(update={"query_rewrite_mode": "always"})
+
+    with patch('app.services.rag_service.app_config', config):
+        planner.invoke({"input": "What is the monthly rent?", "chat_history": greeting})
+
+    assert retriever.queries == ["What is the monthly rent?"]
+    assert llm.i == 1
+
+
+class ChunkRetriever(BaseRetriever):
+    chunks: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.chunks
+
+
+@pytest.mark.asyncio
+async def test_chain_compresses_context():
+    text = "The lease term is five years. " * 50
+    chunks = [
+        Document(text[start:start + 1000], metadata={"page": 1, "start_index": start})
+        for start in (0, 800)
+    ]
+    chain = _build_chain(
+        FakeListChatModel(responses=["Five years."]), ChunkRetriever(chunks=chunks)
+    )
+
+    output = await chain.ainvoke(
+        {"input": "What is the lease term?", "chat_history": greeting, "history_summary": ""}
+    )
+
+    assert output["answer"] == "Five years."
+    assert [doc.page_content for doc in output["context"]] == [text[:1500]]
+    assert output["context_compression"].tokens_saved == 50
+
+
+def _components(context_mode, text):
+    vectorstore = MagicMock(spec=Chroma)
+    vectorstore.get.return_value = {"ids": ["1"], "metadatas": [{"context_mode": context_mode}]}
+    config = app_config.model_copy(update={"retrieval_mode": "vector"})
+    with patch('app.services.rag_service.app_config', config), patch(
+        'app.services.rag_service.load_vectorstore', return_value=vectorstore
+    ), patch('app.services.rag_service.load_document_text', return_value=text), patch(
+        'app.services.rag_service.ChatGoogleGenerativeAI',
+        lambda **kwargs: FakeListChatModel(responses=["The rent is 500 euros.", "unused"]),
+    ):
+        return _build_rag_components("document")
+
+
+@pytest.mark.asyncio
+async def test_full_context_chain():
+    components = _components("full", "The monthly rent is 500 euros.")
+    assert components.context_mode == ContextMode.FULL
+
+    output = await components.chain.ainvoke(
+        {"input": "What is the rent?", "chat_history": history, "history_summary": ""}
+    )
+
+    # the whole document is the context, without rewrite or retrieval
+    assert output["answer"] == "The rent is 500 euros."
+    assert [doc.page_content for doc in output["context"]] == ["The monthly rent is 500 euros."]
+    assert components.llm.i == 1
+    components.vectorstore.similarity_search.assert_not_called()
+
+
+def test_full_context_missing_text():
+    # documents whose text is missing fall back to retrieval
+    assert _components("full", None).context_mode == ContextMode.RETRIEVAL
+    assert _components("retrieval", "text").context_mode == ContextMode.RETRIEVAL
+
+
+@pytest.mark.asyncio
+async def test_rag_chain_invalidated_during_build():
+    release = threading.Event()
+    builds = []
+
+    def build(pdf_id):
+        builds.append(pdf_id)
+        release.wait(timeout=5)
+        return f"chain {len(builds)}"
+
+    rag_chain_cache.clear()
+    with patch('app.services.rag_service._build_rag_components', side_effect=build):
+        stale = asyncio.create_task(get_rag_components("doc"))
+        await asyncio.sleep(0)
+        # the document is re-ingested while the chain is built from the old index
+        invalidate_rag_chain("doc")
+        release.set()
+
+        assert await stale == "chain 1"
+        assert rag_chain_cache.get("doc") is None
+        # the next request builds and caches a new chain
+        assert await get_rag_components("doc") == "chain 2"
+        assert rag_chain_cache.get("doc") == "chain 2"
+    rag_chain_cache.clear()
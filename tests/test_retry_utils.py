@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from app.utils.retry_utils import backoff_delay, is_retryable_error, retry_with_backoff
+
+
+class HTTPError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def test_is_retryable_error_status_codes():
+    assert is_retryable_error(HTTPError(429))
+    assert is_retryable_error(HTTPError(503))
+    assert not is_retryable_error(HTTPError(400))
+    assert not is_retryable_error(ValueError("bad input"))
+
+
+def test_is_retryable_error_wrapped_exception():
+    try:
+        try:
+            raise HTTPError(429)
+        except HTTPError as e:
+            raise RuntimeError("wrapped") from e
+    except RuntimeError as e:
+        assert is_retryable_error(e)
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base_delay=1.0, max_delay=5.0) <= 5.0
+
+
+@patch("app.utils.retry_utils.time.sleep")
+def test_retry_with_backoff_retries_until_success(mock_sleep):
+    func = MagicMock(side_effect=[HTTPError(429), HTTPError(500), "ok"])
+
+    result = retry_with_backoff(func, max_retries=3, base_delay=0.1, max_delay=1.0)
+
+    assert result == "ok"
+    assert func.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+@patch("app.utils.retry_utils.time.sleep")
+def test_retry_with_backoff_gives_up(mock_sleep):
+    func = MagicMock(side_effect=HTTPError(429))
+
+    with pytest.raises(HTTPError):
+        retry_with_backoff(func, max_retries=2, base_delay=0.1, max_delay=1.0)
+
+    assert func.call_count == 3
+
+
+@patch("app.utils.retry_utils.time.sleep")
+def test_retry_with_backoff_does_not_retry_client_errors(mock_sleep):
+    func = MagicMock(side_effect=HTTPError(400))
+
+    with pytest.raises(HTTPError):
+        retry_with_backoff(func, max_retries=5, base_delay=0.1, max_delay=1.0)
+
+    assert func.call_count == 1
+    mock_sleep.assert_not_called()
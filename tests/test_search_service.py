@@ -0,0 +1,88 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
+from langchain.schema import Document
+from app.services.search_service import (
+    ROUTER_COLLECTION,
+    remove_centroids,
+    route_query,
+    save_centroid,
+    search_library,
+)
+from app.config import app_config
+from app.services.vector_service import load_vectorstore
+
+
+def _chunks(pdf_id, pages):
+    return [
+        Document(
+            page_content=f"page {page}",
+            metadata={"document_id": pdf_id, "filename": f"{pdf_id}.pdf", "page": page},
+        )
+        for page in pages
+    ]
+
+
+@pytest.fixture
+def router_path(tmp_path):
+    # two windows of a document about [1, 0, 0], one about [0, 1, 0]
+    save_centroid("a", _chunks("a", [1, 2]), [[1.0, 0.1, 0.0], [1.0, -0.1, 0.0]], tmp_path)
+    save_centroid("a", _chunks("a", [3]), [[0.8, 0.0, 0.6]], tmp_path)
+    save_centroid("b", _chunks("b", [1]), [[0.0, 1.0, 0.0]], tmp_path)
+    return tmp_path
+
+
+def test_save_centroid(router_path):
+    router = load_vectorstore(ROUTER_COLLECTION, router_path, MagicMock())
+    assert len(router.get(where={"document_id": "a"}, include=[])["ids"]) == 2
+
+    # a retried window replaces its centroid
+    save_centroid("a", _chunks("a", [1, 2]), [[1.0, 0.0, 0.0], [1.0, 0.0, 0.0]], router_path)
+    assert len(router.get(where={"document_id": "a"}, include=[])["ids"]) == 2
+
+
+def test_route_query(router_path):
+    assert [pdf_id for pdf_id, _ in route_query([1.0, 0.0, 0.0], 2, router_path)] == ["a", "b"]
+    assert [pdf_id for pdf_id, _ in route_query([0.0, 1.0, 0.0], 1, router_path)] == ["b"]
+
+    remove_centroids("a", router_path)
+    assert [pdf_id for pdf_id, _ in route_query([1.0, 0.0, 0.0], 2, router_path)] == ["b"]
+
+
+def test_save_centroid_concurrently(tmp_path):
+    config = app_config.model_copy(update={"vector_backend": "numpy"})
+
+    def ingest(pdf_id):
+        for page in range(1, 11):
+            save_centroid(pdf_id, _chunks(pdf_id, [page]), [[1.0, 0.0, float(page)]], tmp_path)
+
+    with patch('app.services.vector_service.app_config', config):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(ingest, ["a", "b"]))
+
+        router = load_vectorstore(ROUTER_COLLECTION, tmp_path, MagicMock())
+        for pdf_id in ("a", "b"):
+            assert len(router.get(where={"document_id": pdf_id}, include=[])["ids"]) == 10
+
+
+@pytest.mark.asyncio
+async def test_search_library():
+    embeddings = MagicMock()
+    embeddings.aembed_query = AsyncMock(return_value=[1.0, 0.0])
+    results = {
+        "a": [(Document("a1"), 0.9)],
+        "b": [],
+    }
+
+    with patch("app.services.search_service.gemini_embeddings", embeddings), patch(
+        "app.services.search_service.route_query", return_value=[("a", 0.8), ("b", 0.5)]
+    ) as mock_route, patch(
+        "app.services.search_service._search_document",
+        side_effect=lambda pdf_id, embedding, k: results[pdf_id],
+    ) as mock_search:
+        assert await search_library("query", k=3, max_documents=2) == [results["a"]]
+
+    embeddings.aembed_query.assert_awaited_once_with("query")
+    mock_route.assert_called_once_with([1.0, 0.0], 2)
+    # only the routed documents are searched
+    assert sorted(c.args[0] for c in mock_search.call_args_list) == ["a", "b"]
@@ -0,0 +1,168 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from redis.exceptions import ConnectionError
+from app.models import IngestionState
+from app.services.status_service import complete_window, get_state, incr_progress, load_state, load_status, set_progress, set_state
+
+pdf_id = "test_pdf"
+expected_key = f"ingestion:{pdf_id}"
+
+
+def test_set_state():
+    mock_redis = MagicMock()
+    mock_redis.eval.return_value = 1
+
+    assert set_state(pdf_id, IngestionState.EMBEDDING, redis_conn=mock_redis, chunk_count=10, error=None)
+
+    _, key_count, key, state, *args = mock_redis.eval.call_args.args
+    mapping = dict(zip(args[::2], args[1::2]))
+    assert (key_count, key, state) == (1, expected_key, "embedding")
+    assert mapping["state"] == "embedding"
+    assert mapping["chunk_count"] == 10
+    assert "embedding_at" in mapping
+    assert "error" not in mapping
+
+
+def test_set_state_final():
+    mock_redis = MagicMock()
+    # the script refuses to leave the failed or ready state
+    mock_redis.eval.return_value = 0
+
+    assert not set_state(pdf_id, IngestionState.PARTIAL, redis_conn=mock_redis)
+
+
+def test_set_state_ignores_redis_errors():
+    mock_redis = MagicMock()
+    mock_redis.eval.side_effect = ConnectionError
+
+    assert not set_state(pdf_id, IngestionState.PARSING, redis_conn=mock_redis)
+
+
+def test_get_state():
+    mock_redis = MagicMock()
+    mock_redis.hget.return_value = b"failed"
+
+    assert get_state(pdf_id, redis_conn=mock_redis) == IngestionState.FAILED
+
+    mock_redis.hget.side_effect = ConnectionError
+    assert get_state(pdf_id, redis_conn=mock_redis) is None
+
+
+def test_complete_window():
+    mock_redis = MagicMock()
+    mock_redis.eval.return_value = 0
+
+    assert not complete_window(pdf_id, redis_conn=mock_redis)
+    assert mock_redis.eval.call_args.args[1:] == (1, expected_key, 1, "")
+
+    # the parsing task sets the number of windows, completing the last one
+    mock_redis.eval.return_value = 1
+    assert complete_window(pdf_id, window_count=4, redis_conn=mock_redis)
+    assert mock_redis.eval.call_args.args[1:] == (1, expected_key, 0, 4)
+
+    mock_redis.eval.side_effect = ConnectionError
+    assert not complete_window(pdf_id, redis_conn=mock_redis)
+
+
+def test_set_progress():
+    mock_redis = MagicMock()
+
+    set_progress(pdf_id, redis_conn=mock_redis, embedded_chunks=5)
+
+    mock_redis.hset.assert_called_once_with(expected_key, mapping={"embedded_chunks": 5})
+
+
+def test_incr_progress():
+    mock_redis = MagicMock()
+    mock_redis.hincrby.return_value = 5
+
+    assert incr_progress(pdf_id, "embedded_chunks", 3, redis_conn=mock_redis) == 5
+
+    mock_redis.hincrby.assert_called_once_with(expected_key, "embedded_chunks", 3)
+
+
+@pytest.mark.asyncio
+async def test_load_state():
+    mock_redis = AsyncMock()
+    mock_redis.hget.return_value = b"ready"
+
+    state = await load_state(pdf_id, redis_conn=mock_redis)
+
+    mock_redis.hget.assert_called_once_with(expected_key, "state")
+    assert state == IngestionState.READY
+
+
+@pytest.mark.asyncio
+async def test_load_state_missing():
+    mock_redis = AsyncMock()
+    mock_redis.hget.return_value = None
+
+    assert await load_state(pdf_id, redis_conn=mock_redis) is None
+
+
+@pytest.mark.asyncio
+async def test_load_state_redis_unavailable():
+    mock_redis = AsyncMock()
+    mock_redis.hget.side_effect = ConnectionError
+
+    assert await load_state(pdf_id, redis_conn=mock_redis) is None
+
+
+@pytest.mark.asyncio
+async def test_load_status():
+    now = time.time()
+    mock_redis = AsyncMock()
+    mock_redis.hgetall.return_value = {
+        b"state": b"ready",
+        b"task_id": b"task",
+        b"page_count": b"3",
+        b"chunk_count": b"10",
+        b"embedded_chunks": b"10",
+        b"queued_at": str(now - 6).encode(),
+        b"parsing_at": str(now - 5).encode(),
+        b"embedding_at": str(now - 3).encode(),
+        b"ready_at": str(now).encode(),
+    }
+
+    status = await load_status(pdf_id, redis_conn=mock_redis)
+
+    assert status.state == IngestionState.READY
+    assert status.page_count == 3
+    assert status.embedded_chunks == 10
+    assert status.timings == {"queued": 1.0, "parsing": 2.0, "embedding": 3.0}
+
+
+@pytest.mark.asyncio
+async def test_load_status_partial():
+    now = time.time()
+    mock_redis = AsyncMock()
+    mock_redis.hgetall.return_value = {
+        b"state": b"ready",
+        b"indexed_pages": b"30",
+        b"embedding_at": str(now - 5).encode(),
+        b"partial_at": str(now - 3).encode(),
+        b"ready_at": str(now).encode(),
+    }
+
+    status = await load_status(pdf_id, redis_conn=mock_redis)
+
+    assert status.indexed_pages == 30
+    # time to the first queryable pages, then to the whole document
+    assert status.timings == {"embedding": 2.0, "partial": 3.0}
+
+
+@pytest.mark.asyncio
+async def test_load_status_missing():
+    mock_redis = AsyncMock()
+    mock_redis.hgetall.return_value = {}
+
+    assert await load_status(pdf_id, redis_conn=mock_redis) is None
+
+
+@pytest.mark.asyncio
+async def test_load_status_redis_unavailable():
+    mock_redis = AsyncMock()
+    mock_redis.hgetall.side_effect = ConnectionError
+
+    assert await load_status(pdf_id, redis_conn=mock_redis) is None
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import shutil
+import pytest
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from app.config import app_config
+from app.services.history_service import append_turn, load_summary
+from app.services.summary_service import (
+    format_summary,
+    load_compacted_history,
+    refresh_summary,
+    schedule_summary_refresh,
+)
+
+history_id = "test_history"
+
+
+@pytest.fixture
+def config():
+    os.makedirs(app_config.history_path, exist_ok=True)
+    config = app_config.model_copy(
+        update={"history_max_turns": 3, "history_token_budget": 1000}
+    )
+    with patch('app.services.summary_service.app_config', config):
+        yield config
+    if os.path.exists(app_config.data_path):
+        shutil.rmtree(app_config.data_path)
+
+
+def test_load_compacted_history(config):
+    for i in range(2):
+        append_turn(history_id, f"question {i}", f"answer {i}")
+
+    compacted = load_compacted_history(history_id)
+    assert compacted.window_turns == 2
+    assert (compacted.window_start, compacted.stale, compacted.truncated) == (0, False, False)
+
+    for i in range(2, 5):
+        append_turn(history_id, f"question {i}", f"answer {i}")
+
+    # only the last turns are passed verbatim, the older ones are not summarized yet
+    compacted = load_compacted_history(history_id)
+    assert compacted.history[2] == ("human", "question 2")
+    assert compacted.window_turns == 3
+    assert (compacted.window_start, compacted.stale, compacted.truncated) == (2, True, True)
+
+
+def test_refresh_summary(config):
+    for i in range(5):
+        append_turn(history_id, f"question {i}", f"answer {i}")
+    llm = FakeListChatModel(responses=["The user asked questions 0 and 1."])
+
+    assert asyncio.run(refresh_summary(history_id, llm)) is True
+    assert load_summary(history_id) == ("The user asked questions 0 and 1.", 2)
+
+    compacted = load_compacted_history(history_id)
+    assert compacted.summary == "The user asked questions 0 and 1."
+    assert not compacted.stale
+    # nothing left to summarize
+    assert asyncio.run(refresh_summary(history_id, llm)) is False
+
+
+def test_schedule_summary_refresh(config):
+    for i in range(5):
+        append_turn(history_id, f"question {i}", f"answer {i}")
+    llm = FakeListChatModel(responses=["summary"])
+
+    async def schedule():
+        # concurrent turns share a single refresh
+        first = schedule_summary_refresh(history_id, llm)
+        second = schedule_summary_refresh(history_id, llm)
+        assert first is second
+        return await first
+
+    assert asyncio.run(schedule()) is True
+
+
+def test_refresh_summary_error(config):
+    for i in range(5):
+        append_turn(history_id, f"question {i}", f"answer {i}")
+
+    class FailingLLM(FakeListChatModel):
+        async def _agenerate(self, *args, **kwargs):
+            raise RuntimeError("quota exceeded")
+
+    # best effort, the summary is left as is
+    assert asyncio.run(refresh_summary(history_id, FailingLLM(responses=[]))) is False
+    assert load_summary(history_id) == ("", 0)
+
+
+def test_format_summary():
+    assert format_summary("") == ""
+    assert format_summary("The user asked about fees.").endswith("\nThe user asked about fees.")
@@ -2,9 +2,24 @@ import os
 import shutil
 import pytest
 from unittest.mock import patch
-from app.tasks import process_pdf_task
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app import tasks
+from app.tasks import (
+    finish_ingestion_task,
+    parse_pdf_task,
+    process_pdf,
+    process_pdf_task,
+    store_vectors_task,
+    _chunks_path,
+)
 from app.config import app_config
 from app.main import init_dirs
+from app.models import IngestionState
+from app.services.document_service import load_document_text
+from app.services.lexical import load_lexical_index
+from app.services.search_service import ROUTER_COLLECTION
+from app.services.vector_service import load_vectorstore
 
 @pytest.fixture(scope="function")
 def setup_pdf_file(valid_pdf_path):
@@ -51,3 +66,218 @@ class TestCeleryTasks:
             result.wait()
 
             assert not result.successful()
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+
+class TestIngestionPipeline:
+
+    @pytest.fixture(autouse=True)
+    def state(self):
+        with patch('app.tasks.get_state', return_value=None) as mock_get_state:
+            yield mock_get_state
+
+    @pytest.fixture(autouse=True)
+    def windows(self):
+        counts = {"stored": 0, "total": None}
+
+        def complete_window(pdf_id, window_count=None):
+            if window_count is None:
+                counts["stored"] += 1
+            else:
+                counts["total"] = window_count
+            return counts["stored"] == counts["total"]
+
+        with patch('app.tasks.complete_window', side_effect=complete_window), patch(
+            'app.tasks.reset_windows'
+        ):
+            yield counts
+
+    @pytest.fixture
+    def embeddings(self):
+        return CountingEmbeddings(size=16)
+
+    @pytest.fixture
+    def pipeline_config(self):
+        # small embedding tasks to fan out over several subtasks
+        config = app_config.model_copy(update={"ingestion_embedding_task_size": 2})
+        with patch('app.tasks.app_config', config):
+            yield config
+
+    @pytest.fixture
+    def progress(self):
+        counts = {}
+
+        def incr_progress(pdf_id, field, amount):
+            counts[field] = counts.get(field, 0) + amount
+            return counts[field]
+
+        with patch('app.tasks.incr_progress', side_effect=incr_progress):
+            yield counts
+
+    def test_pipeline(self, embeddings, pipeline_config, progress, valid_pdf_id, setup_pdf_file):
+        with patch('app.tasks.gemini_embeddings', embeddings), patch(
+            'app.tasks.set_state'
+        ) as mock_set_state:
+            result = parse_pdf_task.apply(args=[valid_pdf_id], kwargs={'lane': 'bulk', 'enqueued_at': 0.0})
+
+        assert result.successful()
+        states = [c.args[1] for c in mock_set_state.call_args_list]
+        assert states == [IngestionState.PARSING, IngestionState.EMBEDDING, IngestionState.READY]
+
+        chunk_count = mock_set_state.call_args.kwargs["chunk_count"]
+        assert embeddings.calls > 1  # one call per window
+        assert progress == {"embedded_chunks": chunk_count, "indexed_pages": 3}
+
+        vectorstore = load_vectorstore(valid_pdf_id, app_config.vectorstore_path, embeddings)
+        assert len(vectorstore.get(include=[])["ids"]) == chunk_count
+
+        # a router centroid per window, so library-wide searches reach the document
+        router = load_vectorstore(ROUTER_COLLECTION, app_config.vectorstore_path, embeddings)
+        centroids = router.get(where={"document_id": valid_pdf_id}, include=[])["ids"]
+        assert len(centroids) == embeddings.calls
+        assert len(load_lexical_index(valid_pdf_id)) == chunk_count
+        assert not os.path.exists(_chunks_path(valid_pdf_id))
+
+    def test_pipeline_stores_while_parsing(self, embeddings, pipeline_config, progress, valid_pdf_id, setup_pdf_file):
+        events = []
+
+        def iter_chunk_windows(*args):
+            for window in real_iter_chunk_windows(*args):
+                events.append("parsed")
+                yield window
+
+        real_iter_chunk_windows = tasks.iter_chunk_windows
+        with patch('app.tasks.gemini_embeddings', embeddings), patch(
+            'app.tasks.iter_chunk_windows', side_effect=iter_chunk_windows
+        ), patch('app.tasks._upsert', side_effect=lambda *args: events.append("stored")), patch(
+            'app.tasks.set_state'
+        ):
+            result = parse_pdf_task.apply(args=[valid_pdf_id])
+
+        assert result.successful()
+        # each window is stored before the next pages are parsed
+        assert len(events) > 2
+        assert events == ["parsed", "stored"] * (len(events) // 2)
+
+    def test_pipeline_lane_queues(self, pipeline_config, valid_pdf_id):
+        def save_chunks(file_uuid, task_str, on_window):
+            on_window(0, 10, 2, 3)
+            on_window(10, 15, 1, 3)
+            return [(0, 10, 2), (10, 15, 1)]
+
+        with patch('app.tasks._save_chunks', side_effect=save_chunks), patch(
+            'app.tasks.chain'
+        ) as mock_chain, patch.object(finish_ingestion_task, 'apply_async') as mock_finish:
+            parse_pdf_task.apply(args=[valid_pdf_id], kwargs={'lane': 'bulk'})
+
+        assert mock_chain.call_count == 2
+        for window in mock_chain.call_args_list:
+            embed, store = window.args
+            assert embed.options["queue"] == "embedding.bulk"
+            assert store.options["queue"] == "storing.bulk"
+        # no window is stored yet, the last store task queues the finish
+        mock_finish.assert_not_called()
+
+    def test_pipeline_partial(self, embeddings, pipeline_config, progress, valid_pdf_id, setup_pdf_file):
+        config = pipeline_config.model_copy(update={"ingestion_partial_min_pages": 1})
+        with patch('app.tasks.gemini_embeddings', embeddings), patch(
+            'app.tasks.app_config', config
+        ), patch('app.tasks.save_vectorstore'), patch('app.tasks.save_centroid'), patch(
+            'app.tasks.set_state'
+        ) as mock_set_state:
+            result = parse_pdf_task.apply(args=[valid_pdf_id])
+
+        assert result.successful()
+        states = [c.args[1] for c in mock_set_state.call_args_list]
+        assert states == [
+            IngestionState.PARSING,
+            IngestionState.EMBEDDING,
+            IngestionState.PARTIAL,
+            IngestionState.READY,
+        ]
+
+    def test_process_pdf(self, embeddings, pipeline_config, progress, valid_pdf_id, setup_pdf_file):
+        config = pipeline_config.model_copy(update={"ingestion_partial_min_pages": 1})
+        with patch('app.tasks.gemini_embeddings', embeddings), patch(
+            'app.tasks.app_config', config
+        ), patch('app.tasks.save_vectorstore') as mock_save, patch(
+            'app.tasks.save_centroid'
+        ) as mock_save_centroid, patch('app.tasks.set_state') as mock_set_state:
+            process_pdf(valid_pdf_id)
+
+        # every window is upserted before the next pages are read
+        windows = [c.kwargs["documents"] for c in mock_save.call_args_list]
+        assert len(windows) == embeddings.calls > 1
+        # a router centroid per window
+        assert [c.args[1] for c in mock_save_centroid.call_args_list] == windows
+        assert [c.metadata["page"] for w in windows for c in w] == sorted(
+            c.metadata["page"] for w in windows for c in w
+        )
+        states = [c.args[1] for c in mock_set_state.call_args_list]
+        assert states == [
+            IngestionState.PARSING,
+            IngestionState.EMBEDDING,
+            IngestionState.PARTIAL,
+            IngestionState.READY,
+        ]
+        chunk_count = sum(len(w) for w in windows)
+        assert mock_set_state.call_args.kwargs["chunk_count"] == chunk_count
+        assert progress == {"embedded_chunks": chunk_count, "indexed_pages": 3}
+
+    def test_pipeline_full_context(self, embeddings, progress, valid_pdf_id, setup_pdf_file):
+        with patch('app.tasks.gemini_embeddings', embeddings), patch(
+            'app.tasks.save_vectorstore'
+        ) as mock_save, patch('app.tasks.save_centroid'), patch('app.tasks.set_state'):
+            result = parse_pdf_task.apply(args=[valid_pdf_id])
+
+        assert result.successful()
+        # the document fits a single window, its text is passed as a whole
+        (chunks,) = [c.kwargs["documents"] for c in mock_save.call_args_list]
+        assert {c.metadata["context_mode"] for c in chunks} == {"full"}
+        text = load_document_text(valid_pdf_id)
+        assert all(chunk.page_content in text for chunk in chunks)
+
+    def test_pipeline_embedding_failure(self, embeddings, pipeline_config, valid_pdf_id, setup_pdf_file):
+        with patch('app.tasks.gemini_embeddings', embeddings), patch(
+            'app.tasks.set_state'
+        ) as mock_set_state, patch.object(
+            CountingEmbeddings, 'embed_documents', side_effect=ValueError("bad input")
+        ):
+            with pytest.raises(ValueError):
+                parse_pdf_task.apply(args=[valid_pdf_id])
+
+        assert mock_set_state.call_args.args[1] == IngestionState.FAILED
+        assert not os.path.exists(setup_pdf_file)
+        assert not os.path.exists(_chunks_path(valid_pdf_id))
+
+    def test_store_skipped_after_failure(self, state, valid_pdf_id):
+        state.return_value = IngestionState.FAILED
+        with patch('app.tasks._upsert') as mock_upsert, patch('app.tasks._mark_indexed') as mock_mark:
+            result = store_vectors_task.apply(args=[None, valid_pdf_id, 0, 2, 1, 3])
+
+        assert result.successful()
+        mock_upsert.assert_not_called()
+        mock_mark.assert_not_called()
+
+    def test_store_failed_during_upsert(self, state, embeddings, valid_pdf_id):
+        # a sibling window fails the document while this one is upserting
+        state.side_effect = [IngestionState.EMBEDDING, IngestionState.FAILED]
+        chunks = [Document(page_content="text", metadata={"page": 1})]
+        with patch('app.tasks.gemini_embeddings', embeddings), patch(
+            'app.tasks._load_chunks', return_value=chunks
+        ), patch('app.tasks._upsert') as mock_upsert, patch(
+            'app.tasks._remove_indexes'
+        ) as mock_remove, patch('app.tasks._mark_indexed') as mock_mark:
+            result = store_vectors_task.apply(args=[None, valid_pdf_id, 0, 1, 1, 3])
+
+        assert result.successful()
+        mock_upsert.assert_called_once()
+        mock_remove.assert_called_once_with(valid_pdf_id)
+        mock_mark.assert_not_called()
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from langchain.schema import Document
-from app.services.vector_service import save_vectorstore, load_vectorstore
+from app.services.vector_service import save_vectorstore, load_vectorstore, search_by_vector
 
 @pytest.fixture
 def mock_embeddings():
@@ -53,3 +53,71 @@ def test_load_vectorstore(mock_chroma, mock_embeddings):
         persist_directory=str(from_dir),
     )
     assert result == mock_instance
+
+def test_save_vectorstore_with_vectors(mock_chroma, mock_embeddings):
+    """Test that precomputed vectors are upserted without embedding again."""
+    documents = [
+        Document(page_content="first", metadata={"page": 1, "start_index": 0}),
+        Document(page_content="second", metadata={"page": 1, "start_index": 5}),
+    ]
+    vectors = [[0.1, 0.2], [0.3, 0.4]]
+
+    mock_instance = MagicMock()
+    mock_instance._client.get_max_batch_size.return_value = 1
+    mock_chroma.return_value = mock_instance
+
+    result = save_vectorstore("test_collection", documents, mock_embeddings, "dir", vectors=vectors)
+
+    mock_chroma.from_documents.assert_not_called()
+    mock_embeddings.embed_documents.assert_not_called()
+    calls = mock_instance._collection.upsert.call_args_list
+    assert len(calls) == 2
+    assert calls[0].kwargs["embeddings"] == [[0.1, 0.2]]
+    assert calls[1].kwargs["documents"] == ["second"]
+    assert calls[0].kwargs["ids"] != calls[1].kwargs["ids"]
+    assert result == mock_instance
+
+    # ids are deterministic, re-ingesting overwrites the same chunks
+    save_vectorstore("test_collection", documents, mock_embeddings, "dir", vectors=vectors)
+    assert calls[0].kwargs["ids"] == mock_instance._collection.upsert.call_args_list[2].kwargs["ids"]
+
+def test_save_vectorstore_with_mismatched_vectors(mock_chroma, mock_embeddings, mock_documents):
+    with pytest.raises(ValueError):
+        save_vectorstore("test_collection", mock_documents, mock_embeddings, "dir", vectors=[])
+
+def test_numpy_backend(tmp_path, mock_embeddings):
+    """Test saving and loading with the numpy backend."""
+    documents = [
+        Document(page_content="first", metadata={"page": 1, "start_index": 0}),
+        Document(page_content="second", metadata={"page": 2, "start_index": 0}),
+    ]
+    mock_embeddings.embed_documents.return_value = [[1.0, 0.0], [0.0, 1.0]]
+
+    save_vectorstore("collection", documents, mock_embeddings, tmp_path, backend="numpy")
+    vectorstore = load_vectorstore("collection", tmp_path, mock_embeddings, backend="numpy")
+
+    assert len(vectorstore.get(include=[])["ids"]) == 2
+    result = vectorstore.similarity_search_by_vector([0.0, 1.0], k=1)
+    assert result[0].page_content == "second"
+
+def test_unknown_backend(mock_embeddings, mock_documents):
+    with pytest.raises(ValueError):
+        load_vectorstore("collection", "dir", mock_embeddings, backend="unknown")
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_search_by_vector(tmp_path, mock_embeddings, backend):
+    """Test that both backends score by relevance, higher is more relevant."""
+    documents = [
+        Document(page_content="first", metadata={"page": 1, "start_index": 0}),
+        Document(page_content="second", metadata={"page": 2, "start_index": 0}),
+    ]
+    save_vectorstore(
+        "collection", documents, mock_embeddings, tmp_path,
+        vectors=[[1.0, 0.0], [0.6, 0.8]], backend=backend,
+    )
+    vectorstore = load_vectorstore("collection", tmp_path, mock_embeddings, backend=backend)
+
+    results = search_by_vector(vectorstore, [0.0, 1.0], k=2)
+
+    assert [doc.page_content for doc, _ in results] == ["second", "first"]
+    assert results[0][1] > results[1][1]